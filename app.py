@@ -1,12 +1,15 @@
-from flask import Flask, request, jsonify, render_template_string, redirect, url_for, session
+from flask import Flask, request, jsonify, render_template_string, redirect, url_for, session, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 import pandas as pd
+from pandas.api.types import union_categoricals
 import numpy as np
 from sklearn.ensemble import IsolationForest
 from sklearn.cluster import DBSCAN
 from sklearn.preprocessing import StandardScaler
+from sklearn.neighbors import BallTree
+from scipy import sparse
 import networkx as nx
-from collections import defaultdict, deque
+from collections import defaultdict, deque, OrderedDict
 import json
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
@@ -16,8 +19,23 @@ import re
 import os
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
 import uuid
 import time
+import threading
+import itertools
+import operator
+import hashlib
+import joblib
+from concurrent.futures import ThreadPoolExecutor
+import click
+
+# Parquet upload storage is optional; uploads fall back to CSV without pyarrow
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
   
 app = Flask(__name__)
 # Database configuration - use environment variable if available
@@ -41,10 +59,10 @@ db = SQLAlchemy(app)
 # -------------------------
 class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    case_id = db.Column(db.String(50), index=True)
+    case_id = db.Column(db.String(50))
     transaction_id = db.Column(db.String(50))
-    from_account = db.Column(db.String(50), index=True)
-    to_account = db.Column(db.String(50), index=True)
+    from_account = db.Column(db.String(50))
+    to_account = db.Column(db.String(50))
     amount = db.Column(db.Float)
     date = db.Column(db.String(20))
     time = db.Column(db.String(10))
@@ -52,50 +70,640 @@ class Transaction(db.Model):
     phone = db.Column(db.String(20), index=True)
     email = db.Column(db.String(100), index=True)
     transaction_type = db.Column(db.String(20), default='transfer')
+    # Typed copies of date/time and amount, filled on insert and by backfill_transaction_columns
+    timestamp = db.Column(db.DateTime, index=True)
+    amount_cents = db.Column(db.BigInteger)
+    # IngestCheckpoint that loaded the row, so `ingest --restart` can remove it; null for other inserts
+    ingest_id = db.Column(db.Integer)
+
+    # Composite indexes backing the /api/filter predicates; their leading column also serves
+    # plain case_id / account lookups, so those columns carry no index of their own
+    __table_args__ = (
+        db.Index('ix_transaction_case_timestamp', 'case_id', 'timestamp'),
+        db.Index('ix_transaction_from_timestamp', 'from_account', 'timestamp'),
+        db.Index('ix_transaction_to_timestamp', 'to_account', 'timestamp'),
+    )
+
+# -------------------------
+# Ingest Checkpoint Model
+# -------------------------
+class IngestCheckpoint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(500), unique=True, nullable=False)
+    rows_done = db.Column(db.Integer, default=0)
+    next_txn_id = db.Column(db.Integer, default=1)
+    completed = db.Column(db.Boolean, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# -------------------------
+# Transaction Generation Model
+# -------------------------
+class DataGeneration(db.Model):
+    """Counter bumped whenever rows of a table are deleted, so cached copies notice reused ids"""
+    name = db.Column(db.String(50), primary_key=True)
+    generation = db.Column(db.Integer, default=0)
+
+# -------------------------
+# Background Job Model
+# -------------------------
+class BackgroundJob(db.Model):
+    """Status and result of a JobQueue job, shared by every worker process that may serve its polls"""
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50))
+    owner = db.Column(db.String(32), index=True)
+    status = db.Column(db.String(20), default='queued')
+    progress = db.Column(db.Float, default=0.0)
+    message = db.Column(db.String(200))
+    error = db.Column(db.Text)
+    # JSON-encoded return value of the job function
+    result = db.Column(db.Text)
+    created_at = db.Column(db.Float)
+    started_at = db.Column(db.Float)
+    finished_at = db.Column(db.Float)
+
+# -------------------------
+# Online Scoring Models
+# -------------------------
+class AccountStats(db.Model):
+    """Running per-account statistics, updated by online scoring as new transactions arrive"""
+    account = db.Column(db.String(50), primary_key=True)
+    txn_count = db.Column(db.Integer, default=0)
+    total_amount = db.Column(db.Float, default=0.0)
+    max_amount = db.Column(db.Float)
+    received_count = db.Column(db.Integer, default=0)
+    received_amount = db.Column(db.Float, default=0.0)
+    # Distinct counts, kept from the AccountLink rows of each kind
+    unique_recipients = db.Column(db.Integer, default=0)
+    unique_senders = db.Column(db.Integer, default=0)
+    active_days = db.Column(db.Integer, default=0)
+    unique_ips = db.Column(db.Integer, default=0)
+    unique_phones = db.Column(db.Integer, default=0)
+    unique_emails = db.Column(db.Integer, default=0)
+    first_seen = db.Column(db.DateTime)
+    last_seen = db.Column(db.DateTime)
+
+class AccountLink(db.Model):
+    """Distinct facts about an account: a recipient, sender, active day, ip, phone or email value"""
+    account = db.Column(db.String(50), primary_key=True)
+    kind = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.String(100), primary_key=True)
+
+    # Accounts sharing an identity value, for the reuse features
+    __table_args__ = (db.Index('ix_account_link_kind_value', 'kind', 'value'),)
+
+class TransactionScore(db.Model):
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), primary_key=True)
+    model_id = db.Column(db.String(40), index=True)
+    anomaly_score = db.Column(db.Float, index=True)
+    is_anomaly = db.Column(db.Boolean, default=False)
+    scored_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ScoringCheckpoint(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    last_transaction_id = db.Column(db.Integer, default=0)
+    rows_scored = db.Column(db.Integer, default=0)
+    model_id = db.Column(db.String(40))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# -------------------------
+# Schema Upkeep
+# -------------------------
+app.config['MIGRATION_BATCH_SIZE'] = int(os.environ.get('MIGRATION_BATCH_SIZE', 10000))
+# Indexes from earlier schema versions: superseded by the (column, timestamp) composites, or on
+# amounts, where id-ordered filter pages never chose them
+OBSOLETE_TRANSACTION_INDEXES = [
+    'ix_transaction_case_date', 'ix_transaction_from_date', 'ix_transaction_to_date', 'ix_transaction_amount',
+    'ix_transaction_amount_cents', 'ix_transaction_case_id', 'ix_transaction_from_account', 'ix_transaction_to_account'
+]
+
+def ensure_transaction_schema():
+    """Bring an existing transaction table up to the model: add new columns, swap indexes"""
+    table = Transaction.__table__
+    inspector = db.inspect(db.engine)
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    with db.engine.begin() as conn:
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.exec_driver_sql(
+                    f'ALTER TABLE {conn.dialect.identifier_preparer.quote(table.name)} '
+                    f'ADD COLUMN {conn.dialect.identifier_preparer.quote(column.name)} {column_type}'
+                )
+                print(f"Added column {table.name}.{column.name}")
+    obsolete = {index['name'] for index in inspector.get_indexes(table.name)} & set(OBSOLETE_TRANSACTION_INDEXES)
+    if obsolete:
+        reflected = db.Table(table.name, db.MetaData(), autoload_with=db.engine)
+        for index in reflected.indexes:
+            if index.name in obsolete:
+                index.drop(db.engine)
+    for index in table.indexes:
+        index.create(db.engine, checkfirst=True)
+
+def amount_to_cents(amount):
+    """Amounts as nullable integer cents"""
+    return pd.to_numeric(amount, errors='coerce').mul(100).round().astype('Int64')
+
+def typed_transaction_values(frame):
+    """timestamp and amount_cents column values for a frame of Transaction rows, None where missing"""
+    timestamps = transaction_timestamps(frame)
+    cents = amount_to_cents(frame['amount'])
+    return (
+        timestamps.astype(object).where(timestamps.notna(), None).to_numpy(),
+        cents.astype(object).where(cents.notna(), None).to_numpy()
+    )
+
+def backfill_transaction_columns(batch_size=None):
+    """Fill timestamp and amount_cents for rows written before those columns existed, in id batches"""
+    batch_size = batch_size or app.config['MIGRATION_BATCH_SIZE']
+    table = Transaction.__table__
+    update = table.update().where(table.c.id == db.bindparam('row_id')).values(
+        timestamp=db.bindparam('row_timestamp'), amount_cents=db.bindparam('row_cents')
+    )
+    last_id = 0
+    updated = 0
+    while True:
+        query = (
+            db.select(table.c.id, table.c.date, table.c.time, table.c.amount)
+            .where(table.c.id > last_id, db.or_(table.c.timestamp.is_(None), table.c.amount_cents.is_(None)))
+            .order_by(table.c.id).limit(batch_size)
+        )
+        with db.engine.connect() as conn:
+            rows = conn.execute(query).fetchall()
+        if not rows:
+            break
+        frame = pd.DataFrame(rows, columns=['id', 'date', 'time', 'amount'])
+        timestamps, cents = typed_transaction_values(frame)
+        records = [
+            {'row_id': int(row_id), 'row_timestamp': stamp, 'row_cents': None if cent is None else int(cent)}
+            for row_id, stamp, cent in zip(frame['id'], timestamps, cents)
+        ]
+        with db.engine.begin() as conn:
+            conn.execute(update, records)
+        last_id = int(frame['id'].iloc[-1])
+        updated += len(records)
+        print(f"Backfilled {updated} transactions (through id {last_id})")
+    return updated
+
+# -------------------------
+# Account Feature Table
+# -------------------------
+FEATURE_TABLE_COLUMNS = [
+    'txn_count', 'total_amount', 'avg_amount', 'max_amount', 'unique_recipients',
+    'unique_ips', 'unique_phones', 'unique_emails', 'max_daily_amount', 'ip', 'phone', 'email'
+]
+
+class AccountFeatures:
+    """Per-account feature table shared by every AMLEngine detection layer"""
+
+    def __init__(self, table, amounts, daily_amounts, edges, summary, daily=None, identity_accounts=None):
+        self.table = table                  # one row per sending account
+        self.amounts = amounts              # transaction amounts (or a reservoir sample of them)
+        self.daily_amounts = daily_amounts  # per account-day totals
+        self.edges = edges                  # from_account/to_account pairs with summed amount and count
+        self.summary = summary              # dataset-wide counts for the statistics endpoint
+        self.daily = daily if daily is not None else pd.Series(dtype='float64')  # daily totals by (account, day)
+        self.identity_accounts = identity_accounts or {}  # ip/phone/email -> distinct sending accounts per value
+        self.derived = {}                   # results computed from this table, e.g. cycle members
+
+    @property
+    def rows(self):
+        return self.summary['rows']
+
+    def amount_quantile(self, q):
+        return float(np.quantile(self.amounts, q)) if len(self.amounts) else 0.0
+
+    def daily_quantile(self, q):
+        return float(np.quantile(self.daily_amounts, q)) if len(self.daily_amounts) else 0.0
+
+def build_account_features(df):
+    """Compute every per-account detector input in one grouped pass over an in-memory frame"""
+    df = df.dropna(subset=['from_account', 'to_account', 'amount', 'date'], how='any')
+    source = df['from_account'].astype(object).to_numpy()
+    grouped = df.groupby(source)
+    table = grouped.agg(
+        txn_count=('amount', 'size'),
+        total_amount=('amount', 'sum'),
+        avg_amount=('amount', 'mean'),
+        max_amount=('amount', 'max'),
+        unique_recipients=('to_account', 'nunique'),
+        unique_ips=('ip', 'nunique'),
+        unique_phones=('phone', 'nunique'),
+        unique_emails=('email', 'nunique'),
+        ip=('ip', 'first'),
+        phone=('phone', 'first'),
+        email=('email', 'first')
+    )
+    daily = df['amount'].groupby([source, transaction_days(df)]).sum()
+    table['max_daily_amount'] = daily.groupby(level=0).max()
+    table = table[FEATURE_TABLE_COLUMNS]
+    edges = df['amount'].groupby([source, df['to_account'].astype(object).to_numpy()]).agg(['sum', 'count'])
+    summary = {
+        'rows': len(df),
+        'total_amount': float(df['amount'].sum()),
+        'cases': df['case_id'].nunique(),
+        'accounts': len(pd.unique(np.concatenate([source, df['to_account'].astype(object).to_numpy()]))),
+        'ips': df['ip'].nunique(),
+        'phones': df['phone'].nunique(),
+        'emails': df['email'].nunique()
+    }
+    identity_accounts = {
+        col: df['from_account'].astype(object).groupby(df[col].astype(object).to_numpy()).nunique()
+        for col in ['ip', 'phone', 'email']
+    }
+    return AccountFeatures(table, df['amount'].to_numpy(), daily.to_numpy(), edges, summary, daily, identity_accounts)
+
+# -------------------------
+# Transaction Graph Builder
+# -------------------------
+def transaction_timestamps(df):
+    """Transaction times as a datetime64 Series, parsed from date/time when no timestamp column exists"""
+    if 'timestamp' in df.columns and pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+        return df['timestamp']
+    return pd.to_datetime(
+        df['date'].astype(str) + ' ' + df['time'].astype(str), errors='coerce', format='mixed'
+    )
+
+def transaction_days(df):
+    """Calendar day of each transaction as YYYY-MM-DD, keeping the raw date where it cannot be parsed"""
+    timestamps = transaction_timestamps(df)
+    days = np.datetime_as_string(timestamps.to_numpy().astype('datetime64[D]')).astype(object)
+    missing = timestamps.isna().to_numpy()
+    if missing.any():
+        days[missing] = df['date'].astype(str).to_numpy()[missing]
+    return days
+
+def node_identity_table(df):
+    """Per-account node attributes taken from the last transaction that touches the account"""
+    positions = pd.Series(np.arange(len(df)))
+    last_sent = positions.groupby(df['from_account'].astype(object).to_numpy()).max()
+    last_received = positions.groupby(df['to_account'].astype(object).to_numpy()).max()
+    last = pd.concat([last_sent.rename('sent'), last_received.rename('received')], axis=1).fillna(-1)
+    is_destination = last['received'].to_numpy() >= last['sent'].to_numpy()
+    rows = np.where(is_destination, last['received'], last['sent']).astype('int64')
+    return pd.DataFrame({
+        'account_type': np.where(is_destination, 'destination', 'source'),
+        'ip': df['ip'].astype(object).to_numpy()[rows],
+        'phone': df['phone'].astype(object).to_numpy()[rows],
+        'email': df['email'].astype(object).to_numpy()[rows]
+    }, index=last.index)
+
+def aggregate_edges(df):
+    """Collapse parallel transfers into one row per account pair with summed amount and count"""
+    source = df['from_account'].astype(object).to_numpy()
+    target = df['to_account'].astype(object).to_numpy()
+    grouped = df.groupby([source, target], sort=False)
+    edges = grouped.agg(
+        weight=('amount', 'sum'),
+        count=('amount', 'size'),
+        date=('date', 'last'),
+        time=('time', 'last'),
+        transaction_id=('transaction_id', 'last')
+    )
+    edges.index.names = ['source', 'target']
+    return edges.reset_index()
+
+def build_transaction_graph(df, multi=True, node_attributes=True):
+    """Build a transaction graph from column arrays in bulk.
+
+    multi=True keeps every transfer as its own edge (MultiDiGraph). multi=False collapses parallel
+    transfers into one DiGraph edge whose weight is the summed amount, with a transfer count.
+    """
+    df = df.dropna(subset=['from_account', 'to_account'], how='any')
+    G = nx.MultiDiGraph() if multi else nx.DiGraph()
+    if df.empty:
+        return G
+    if node_attributes:
+        G.add_nodes_from(node_identity_table(df).to_dict('index').items())
+    if multi:
+        G.add_edges_from(
+            (source, target, {'weight': amount, 'date': date, 'time': time_, 'transaction_id': txn_id})
+            for source, target, amount, date, time_, txn_id in zip(
+                df['from_account'].astype(object).to_numpy(),
+                df['to_account'].astype(object).to_numpy(),
+                df['amount'].astype('float64').to_numpy(),
+                df['date'].to_numpy(),
+                df['time'].to_numpy(),
+                df['transaction_id'].to_numpy()
+            )
+        )
+    else:
+        edges = aggregate_edges(df)
+        attributes = edges.drop(columns=['source', 'target']).to_dict('records')
+        G.add_edges_from(zip(edges['source'], edges['target'], attributes))
+    return G
+
+# -------------------------
+# Compact Transaction Graph
+# -------------------------
+def _csr_offsets(codes, size):
+    offsets = np.zeros(size + 1, dtype='int64')
+    np.cumsum(np.bincount(codes, minlength=size), out=offsets[1:])
+    return offsets
+
+class TransactionGraph:
+    """Compact transaction graph: integer account codes, CSR/CSC offsets and parallel edge arrays.
+
+    Transfers are stored once in amount/timestamp/transaction_id arrays. out_edges lists transfer
+    indices grouped by sender (then receiver, then time) with out_offsets marking each sender's
+    slice; in_edges/in_offsets do the same by receiver. Parallel transfers between the same pair
+    form a "pair" - pair_offsets/pair_target/pair_weight give the collapsed adjacency used for
+    traversal, and pair_start/pair_end point back into out_edges for the individual transfers.
+    """
+
+    def __init__(self, accounts, source, target, amount, timestamp, transaction_id):
+        self.accounts = np.asarray(accounts, dtype=object)
+        self.source = np.asarray(source, dtype='int32')
+        self.target = np.asarray(target, dtype='int32')
+        self.amount = np.asarray(amount, dtype='float64')
+        self.timestamp = np.asarray(timestamp, dtype='float64')
+        self.transaction_id = np.asarray(transaction_id, dtype=object)
+        n = len(self.accounts)
+
+        self.out_edges = np.lexsort((self.timestamp, self.target, self.source))
+        self.out_offsets = _csr_offsets(self.source, n)
+        self.in_edges = np.lexsort((self.timestamp, self.source, self.target))
+        self.in_offsets = _csr_offsets(self.target, n)
+
+        sorted_source = self.source[self.out_edges]
+        sorted_target = self.target[self.out_edges]
+        first_of_pair = np.ones(len(self.out_edges), dtype=bool)
+        first_of_pair[1:] = (sorted_source[1:] != sorted_source[:-1]) | (sorted_target[1:] != sorted_target[:-1])
+        self.pair_start = np.flatnonzero(first_of_pair)
+        self.pair_end = np.append(self.pair_start[1:], len(self.out_edges)).astype('int64')
+        self.pair_target = sorted_target[self.pair_start]
+        self.pair_offsets = _csr_offsets(sorted_source[self.pair_start], n)
+        if len(self.pair_start):
+            self.pair_weight = np.add.reduceat(self.amount[self.out_edges], self.pair_start)
+        else:
+            self.pair_weight = np.zeros(0)
+        self._index = None
+
+    @classmethod
+    def from_frame(cls, df):
+        """Encode a transaction frame - one edge per transfer"""
+        df = df.dropna(subset=['from_account', 'to_account'], how='any')
+        labels = np.concatenate([
+            df['from_account'].astype(object).to_numpy(),
+            df['to_account'].astype(object).to_numpy()
+        ])
+        codes, accounts = pd.factorize(labels)
+        timestamps = transaction_timestamps(df)
+        seconds = timestamps.to_numpy().astype('datetime64[s]').astype('int64').astype('float64')
+        seconds[timestamps.isna().to_numpy()] = np.nan
+        return cls(
+            accounts, codes[:len(df)], codes[len(df):],
+            df['amount'].astype('float64').fillna(0).to_numpy(), seconds, df['transaction_id'].to_numpy()
+        )
+
+    @classmethod
+    def from_edge_table(cls, edges):
+        """Encode an aggregated AccountFeatures edge table - one edge per account pair"""
+        labels = np.concatenate([
+            np.asarray(edges.index.get_level_values(0), dtype=object),
+            np.asarray(edges.index.get_level_values(1), dtype=object)
+        ])
+        codes, accounts = pd.factorize(labels)
+        count = len(edges)
+        return cls(
+            accounts, codes[:count], codes[count:], edges['sum'].to_numpy(dtype='float64'),
+            np.full(count, np.nan), np.full(count, None, dtype=object)
+        )
+
+    @property
+    def num_nodes(self):
+        return len(self.accounts)
+
+    @property
+    def num_edges(self):
+        return len(self.amount)
+
+    def code(self, account):
+        """Integer code for an account label, or None when it is not in the graph"""
+        if self._index is None:
+            self._index = {label: code for code, label in enumerate(self.accounts)}
+        return self._index.get(account)
+
+    def successors(self, code):
+        return self.pair_target[self.pair_offsets[code]:self.pair_offsets[code + 1]]
+
+    def pair_transfers(self, pair):
+        """Transfer indices for one account pair, in time order"""
+        return self.out_edges[self.pair_start[pair]:self.pair_end[pair]]
+
+    def pair_attributes(self, pair):
+        return {'weight': self.pair_weight[pair], 'times': self.timestamp[self.pair_transfers(pair)]}
+
+    def node_metrics(self):
+        """Per-account degree and money flow from grouped array operations"""
+        n = self.num_nodes
+        in_amount = np.bincount(self.target, weights=self.amount, minlength=n)
+        out_amount = np.bincount(self.source, weights=self.amount, minlength=n)
+        in_degree = np.bincount(self.pair_target, minlength=n)
+        out_degree = np.diff(self.pair_offsets)
+        return pd.DataFrame({
+            'in_degree': in_degree,
+            'out_degree': out_degree,
+            'total_degree': in_degree + out_degree,
+            'in_transfers': np.diff(self.in_offsets),
+            'out_transfers': np.diff(self.out_offsets),
+            'in_amount': in_amount,
+            'out_amount': out_amount,
+            'net_flow': out_amount - in_amount
+        }, index=pd.Index(self.accounts, name='account'))
+
+    def strong_components(self):
+        """Strongly connected components as arrays of account codes"""
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import connected_components
+        n = self.num_nodes
+        adjacency = csr_matrix((np.ones(len(self.pair_target), dtype='int8'), self.pair_target, self.pair_offsets), shape=(n, n))
+        count, labels = connected_components(adjacency, directed=True, connection='strong')
+        order = np.argsort(labels, kind='stable')
+        boundaries = np.searchsorted(labels[order], np.arange(count + 1))
+        return [order[boundaries[i]:boundaries[i + 1]] for i in range(count)]
+
+# -------------------------
+# Bounded Cycle Detection
+# -------------------------
+app.config['CYCLE_MAX_LENGTH'] = int(os.environ.get('CYCLE_MAX_LENGTH', 5))
+app.config['CYCLE_MAX_COUNT'] = int(os.environ.get('CYCLE_MAX_COUNT', 10000))
+app.config['CYCLE_TIME_BUDGET'] = float(os.environ.get('CYCLE_TIME_BUDGET', 2.0))
+
+class BoundedCycleFinder:
+    """Streams simple cycles of at most max_length hops, one strongly connected component at a time.
+
+    Each cycle is reported once. With time_ordered=True every hop must happen after the previous one
+    (edges need a sorted 'times' array); with amount_tolerance set, consecutive hop amounts ('weight')
+    may differ by at most that fraction. The search stops early - and sets truncated - once
+    max_cycles cycles were found or time_budget seconds passed.
+    """
+
+    def __init__(self, max_length=5, max_cycles=10000, time_budget=2.0, time_ordered=False, amount_tolerance=None):
+        self.max_length = max_length
+        self.max_cycles = max_cycles
+        self.time_budget = time_budget
+        self.time_ordered = time_ordered
+        self.amount_tolerance = amount_tolerance
+        self.truncated = False
+        self.found = 0
+
+    def _extend(self, state, edge):
+        """State after taking an edge, or None when the hop breaks the time/amount rules"""
+        last_time, last_amount = state
+        if self.time_ordered:
+            times = edge['times']
+            position = 0 if last_time is None else int(np.searchsorted(times, last_time, side='right'))
+            if position >= len(times):
+                return None
+            last_time = times[position]
+        amount = edge.get('weight', 0.0)
+        if self.amount_tolerance is not None and last_amount is not None:
+            if abs(amount - last_amount) > self.amount_tolerance * max(abs(last_amount), abs(amount)):
+                return None
+        return (last_time, amount)
+
+    def cycles(self, G):
+        """Yield each cycle as a list of nodes - accepts a TransactionGraph or a networkx DiGraph"""
+        if isinstance(G, TransactionGraph):
+            def neighbors(node):
+                for pair in range(G.pair_offsets[node], G.pair_offsets[node + 1]):
+                    yield int(G.pair_target[pair]), G.pair_attributes(pair)
+
+            def has_self_loop(node):
+                return node in G.successors(node)
+
+            components = ([int(node) for node in component] for component in G.strong_components())
+            for cycle in self._search(components, neighbors, has_self_loop):
+                yield [G.accounts[node] for node in cycle]
+        else:
+            components = nx.strongly_connected_components(G)
+            yield from self._search(components, lambda node: G[node].items(), lambda node: G.has_edge(node, node))
+
+    def _search(self, components, neighbors, has_self_loop):
+        self.truncated = False
+        self.found = 0
+        started = time.perf_counter()
+        steps = 0
+        for component in components:
+            if len(component) == 1:
+                node = next(iter(component))
+                if not has_self_loop(node):
+                    continue
+            rank = {node: index for index, node in enumerate(component)}
+            # Unconstrained cycles are only searched from their lowest-ranked node. Time and amount
+            # rules depend on where the cycle starts, so then every rotation is tried and deduplicated.
+            constrained = self.time_ordered or self.amount_tolerance is not None
+            seen = set()
+            for start in component:
+                path = [start]
+                on_path = {start}
+                stack = [(start, iter(neighbors(start)), (None, None))]
+                while stack:
+                    node, candidates, state = stack[-1]
+                    advanced = False
+                    for neighbor, edge in candidates:
+                        if neighbor not in rank or (not constrained and rank[neighbor] < rank[start]):
+                            continue
+                        steps += 1
+                        if steps % 1000 == 0 and time.perf_counter() - started > self.time_budget:
+                            self.truncated = True
+                            return
+                        next_state = self._extend(state, edge)
+                        if next_state is None:
+                            continue
+                        if neighbor == start:
+                            if constrained:
+                                lowest = min(range(len(path)), key=lambda i: rank[path[i]])
+                                key = tuple(path[lowest:] + path[:lowest])
+                                if key in seen:
+                                    continue
+                                seen.add(key)
+                            yield list(path)
+                            self.found += 1
+                            if self.found >= self.max_cycles:
+                                self.truncated = True
+                                return
+                            continue
+                        if neighbor in on_path or len(path) >= self.max_length:
+                            continue
+                        path.append(neighbor)
+                        on_path.add(neighbor)
+                        stack.append((neighbor, iter(neighbors(neighbor)), next_state))
+                        advanced = True
+                        break
+                    if not advanced:
+                        stack.pop()
+                        on_path.discard(path.pop())
 
 # -------------------------
 # AML Detection Engine
 # -------------------------
 class AMLEngine:
-    def __init__(self):
+    def __init__(self, feature_cache_size=8):
         self.suspicious_patterns = []
         self.layered_graphs = {}
+        self.feature_cache = OrderedDict()
+        self.feature_cache_size = feature_cache_size
+        self.graph_cache = OrderedDict()
+
+    def account_features(self, df=None, version=None, builder=None):
+        """Feature table for a dataset, reused while the dataset version is unchanged"""
+        if version is not None and version in self.feature_cache:
+            self.feature_cache.move_to_end(version)
+            return self.feature_cache[version]
+        features = builder() if builder is not None else build_account_features(df)
+        if version is not None:
+            self.feature_cache[version] = features
+            while len(self.feature_cache) > self.feature_cache_size:
+                self.feature_cache.popitem(last=False)
+        return features
+
+    def transaction_graph(self, df=None, version=None, loader=None):
+        """Compact TransactionGraph for a dataset, reused while the dataset version is unchanged"""
+        if version is not None and version in self.graph_cache:
+            self.graph_cache.move_to_end(version)
+            return self.graph_cache[version]
+        graph = TransactionGraph.from_frame(loader() if loader is not None else df)
+        if version is not None:
+            self.graph_cache[version] = graph
+            while len(self.graph_cache) > self.feature_cache_size:
+                self.graph_cache.popitem(last=False)
+        return graph
+
+    def forget_file(self, path):
+        """Drop cached features and graphs of an uploaded dataset, including its mapped feature matrix"""
+        for cache in (self.feature_cache, self.graph_cache):
+            for version in [v for v in cache if v[:2] == ('file', path)]:
+                del cache[version]
         
-    def detect_suspicious_accounts(self, df):
+    def detect_suspicious_accounts(self, df, version=None):
         """Detect suspicious accounts using multiple algorithms"""
+        features = self.account_features(df, version=version)
         suspicious_accounts = set()
-        
-        # Layer 1: High-frequency transactions
-        freq_suspicious = self._detect_high_frequency(df)
-        suspicious_accounts.update(freq_suspicious)
-        
-        # Layer 2: Large amount transactions
-        amount_suspicious = self._detect_large_amounts(df)
-        suspicious_accounts.update(amount_suspicious)
-        
-        # Layer 3: Multiple IP/Phone/Email usage
-        multi_suspicious = self._detect_multi_identity(df)
-        suspicious_accounts.update(multi_suspicious)
-        
-        # Layer 4: Circular transactions
-        circular_suspicious = self._detect_circular_transactions(df)
-        suspicious_accounts.update(circular_suspicious)
-        
-        # Layer 5: Rapid money movement
-        rapid_suspicious = self._detect_rapid_movement(df)
-        suspicious_accounts.update(rapid_suspicious)
-        
+        for accounts in self.detect_layers(features).values():
+            suspicious_accounts.update(accounts)
         return list(suspicious_accounts)
+
+    def detect_layers(self, features, circular=True):
+        """Run every detection layer against a shared AccountFeatures table"""
+        return {
+            # Layer 1: High-frequency transactions
+            'layer1_high_frequency': self._detect_high_frequency(features),
+            # Layer 2: Large amount transactions
+            'layer2_large_amounts': self._detect_large_amounts(features),
+            # Layer 3: Multiple IP/Phone/Email usage
+            'layer3_multi_identity': self._detect_multi_identity(features),
+            # Layer 4: Circular transactions
+            'layer4_circular': self._detect_circular_transactions(features) if circular else [],
+            # Layer 5: Rapid money movement
+            'layer5_rapid_movement': self._detect_rapid_movement(features)
+        }
     
-    def _detect_high_frequency(self, df):
+    def _detect_high_frequency(self, features):
         """Detect accounts with unusually high transaction frequency"""
-        account_stats = df.groupby('from_account').agg({
-            'transaction_id': 'count',
-            'amount': ['sum', 'mean'],
-            'to_account': 'nunique'
-        }).reset_index()
-        
-        account_stats.columns = ['account', 'txn_count', 'total_amount', 'avg_amount', 'unique_recipients']
+        account_stats = features.table
+        if account_stats.empty:
+            return []
         
         # Detect outliers using IQR method
         Q1 = account_stats['txn_count'].quantile(0.25)
@@ -103,204 +711,557 @@ class AMLEngine:
         IQR = Q3 - Q1
         high_freq_threshold = Q3 + 1.5 * IQR
         
-        suspicious = account_stats[account_stats['txn_count'] > high_freq_threshold]['account'].tolist()
+        suspicious = account_stats.index[account_stats['txn_count'] > high_freq_threshold].tolist()
         return suspicious
     
-    def _detect_large_amounts(self, df):
+    def _detect_large_amounts(self, features):
         """Detect accounts with unusually large transaction amounts"""
-        # Calculate amount percentiles
-        amount_95th = df['amount'].quantile(0.95)
-        amount_99th = df['amount'].quantile(0.99)
-        
         # Accounts with transactions above 99th percentile
-        large_amount_accounts = df[df['amount'] > amount_99th]['from_account'].unique().tolist()
-        
-        return large_amount_accounts
+        amount_99th = features.amount_quantile(0.99)
+        table = features.table
+        return table.index[table['max_amount'] > amount_99th].tolist()
     
-    def _detect_multi_identity(self, df):
+    def _detect_multi_identity(self, features):
         """Detect accounts using multiple IPs, phones, or emails"""
-        suspicious_accounts = set()
-        
-        # Check for accounts with multiple IPs
-        multi_ip = df.groupby('from_account')['ip'].nunique()
-        multi_ip_suspicious = multi_ip[multi_ip > 3].index.tolist()
-        suspicious_accounts.update(multi_ip_suspicious)
-        
-        # Check for accounts with multiple phones
-        multi_phone = df.groupby('from_account')['phone'].nunique()
-        multi_phone_suspicious = multi_phone[multi_phone > 2].index.tolist()
-        suspicious_accounts.update(multi_phone_suspicious)
-        
-        # Check for accounts with multiple emails
-        multi_email = df.groupby('from_account')['email'].nunique()
-        multi_email_suspicious = multi_email[multi_email > 2].index.tolist()
-        suspicious_accounts.update(multi_email_suspicious)
-        
-        return suspicious_accounts
+        table = features.table
+        multi_identity = (table['unique_ips'] > 3) | (table['unique_phones'] > 2) | (table['unique_emails'] > 2)
+        return table.index[multi_identity].tolist()
     
-    def _detect_circular_transactions(self, df):
+    def _detect_circular_transactions(self, features):
         """Detect circular transaction patterns"""
+        if 'circular' in features.derived:
+            return features.derived['circular']
         suspicious_accounts = set()
         
-        # Create directed graph
-        G = nx.DiGraph()
-        for _, row in df.iterrows():
-            G.add_edge(row['from_account'], row['to_account'], weight=row['amount'])
+        # Compact graph over the aggregated transfer pairs
+        graph = TransactionGraph.from_edge_table(features.edges)
         
-        # Find cycles in the graph
-        try:
-            cycles = list(nx.simple_cycles(G))
-            for cycle in cycles:
-                if len(cycle) <= 5:  # Focus on short cycles
-                    suspicious_accounts.update(cycle)
-        except:
-            pass
-        
-        return suspicious_accounts
+        # Enumerate short cycles only, within a time and count budget
+        finder = BoundedCycleFinder(
+            max_length=app.config['CYCLE_MAX_LENGTH'],
+            max_cycles=app.config['CYCLE_MAX_COUNT'],
+            time_budget=app.config['CYCLE_TIME_BUDGET']
+        )
+        for cycle in finder.cycles(graph):
+            suspicious_accounts.update(cycle)
+        if finder.truncated:
+            print(f"Cycle search stopped early after {finder.found} cycles")
+        
+        features.derived['circular'] = list(suspicious_accounts)
+        features.derived['circular_truncated'] = finder.truncated
+        return features.derived['circular']
     
-    def _detect_rapid_movement(self, df):
+    def _detect_rapid_movement(self, features):
         """Detect rapid money movement patterns"""
-        suspicious_accounts = set()
-        
-        # Group by account and date
-        df['datetime'] = pd.to_datetime(df['date'] + ' ' + df['time'])
-        account_daily = df.groupby(['from_account', 'date']).agg({
-            'amount': 'sum',
-            'transaction_id': 'count'
-        }).reset_index()
-        
         # Find accounts with high daily transaction volumes
-        high_volume = account_daily[account_daily['amount'] > account_daily['amount'].quantile(0.95)]
-        suspicious_accounts.update(high_volume['from_account'].unique().tolist())
-        
-        return suspicious_accounts
+        daily_95th = features.daily_quantile(0.95)
+        table = features.table
+        return table.index[table['max_daily_amount'] > daily_95th].tolist()
     
     def build_layered_graph(self, df, case_id=None):
-        """Build layered transaction graph"""
+        """Build layered transaction graph - one edge per transfer"""
         if case_id:
             df = df[df['case_id'] == case_id]
-        
-        G = nx.DiGraph()
-        
-        # Add nodes and edges
-        for _, row in df.iterrows():
-            G.add_node(row['from_account'], 
-                      account_type='source',
-                      ip=row['ip'],
-                      phone=row['phone'],
-                      email=row['email'])
-            G.add_node(row['to_account'], 
-                      account_type='destination',
-                      ip=row['ip'],
-                      phone=row['phone'],
-                      email=row['email'])
-            G.add_edge(row['from_account'], row['to_account'], 
-                      weight=row['amount'],
-                      date=row['date'],
-                      time=row['time'],
-                      transaction_id=row['transaction_id'])
-        
-        return G
+        return build_transaction_graph(df, multi=True)
     
-    def find_money_trail(self, df, start_account, max_depth=3):
-        """Find money trail from a specific account"""
-        G = self.build_layered_graph(df)
-        
-        if start_account not in G.nodes():
+    def find_money_trail(self, df, start_account, max_depth=3, max_fanout=None, time_ordered=False,
+                         max_paths=1000, graph=None):
+        """Find money trails from a specific account.
+
+        Runs an iterative depth-first search of at most max_depth hops and returns every maximal
+        trail (one that hits the depth limit or cannot be extended further), so trails ending early
+        at a sink are kept. max_fanout follows only the largest outgoing flows of each account;
+        time_ordered only follows transfers made after the previous hop.
+        """
+        graph = graph if graph is not None else TransactionGraph.from_frame(df)
+        start = graph.code(start_account)
+        if start is None:
             return []
         
         trails = []
-        visited = set()
-        
-        def dfs_trail(node, path, depth):
-            if depth > max_depth or node in visited:
-                return
-            
-            visited.add(node)
-            path.append(node)
-            
-            if depth == max_depth:
-                trails.append(path.copy())
-            else:
-                for neighbor in G.successors(node):
-                    dfs_trail(neighbor, path, depth + 1)
-            
-            path.pop()
-            visited.remove(node)
-        
-        dfs_trail(start_account, [], 0)
+        path = [start]
+        hops = []
+        on_path = {start}
+        # Each frame: candidate hops out of the node at that depth, and whether any was followed
+        frames = [[self._trail_hops(graph, start, None, max_fanout, time_ordered), False]]
+        while frames and len(trails) < max_paths:
+            frame = frames[-1]
+            step = next(frame[0], None)
+            if step is None:
+                if not frame[1] and hops:
+                    trails.append(self._trail_record(graph, path, hops))
+                frames.pop()
+                on_path.discard(path.pop())
+                if hops:
+                    hops.pop()
+                continue
+            neighbor, hop, arrival = step
+            if neighbor in on_path:
+                continue
+            frame[1] = True
+            if len(hops) + 1 == max_depth:
+                trails.append(self._trail_record(graph, path + [neighbor], hops + [hop]))
+                continue
+            path.append(neighbor)
+            hops.append(hop)
+            on_path.add(neighbor)
+            frames.append([self._trail_hops(graph, neighbor, arrival, max_fanout, time_ordered), False])
         return trails
 
-def is_valid_number(val):
-    try:
-        if val is None or pd.isna(val):
-            return False
-        float(str(val).replace(',', ''))
-        return True
-    except Exception:
-        return False
+    @staticmethod
+    def _trail_hops(graph, node, arrival, max_fanout, time_ordered):
+        """Candidate next hops out of node as (neighbor, hop details, arrival time)"""
+        pairs = np.arange(graph.pair_offsets[node], graph.pair_offsets[node + 1])
+        if time_ordered:
+            # Earliest transfer on each pair that happens after we arrived at this node
+            chosen = []
+            for pair in pairs:
+                transfers = graph.pair_transfers(pair)
+                times = graph.timestamp[transfers]
+                position = 0 if arrival is None else int(np.searchsorted(times, arrival, side='right'))
+                if position < len(times) and not np.isnan(times[position]):
+                    chosen.append((pair, transfers[position]))
+            if max_fanout is not None and len(chosen) > max_fanout:
+                chosen.sort(key=lambda item: -graph.pair_weight[item[0]])
+                chosen = chosen[:max_fanout]
+            for pair, transfer in chosen:
+                neighbor = int(graph.pair_target[pair])
+                stamp = graph.timestamp[transfer]
+                yield neighbor, {
+                    'from': graph.accounts[node],
+                    'to': graph.accounts[neighbor],
+                    'amount': float(graph.amount[transfer]),
+                    'transaction_id': graph.transaction_id[transfer],
+                    'timestamp': pd.Timestamp(stamp, unit='s').isoformat()
+                }, stamp
+            return
+        if max_fanout is not None and len(pairs) > max_fanout:
+            pairs = pairs[np.argsort(-graph.pair_weight[pairs], kind='stable')[:max_fanout]]
+        for pair in pairs:
+            neighbor = int(graph.pair_target[pair])
+            yield neighbor, {
+                'from': graph.accounts[node],
+                'to': graph.accounts[neighbor],
+                'amount': float(graph.pair_weight[pair]),
+                'transfers': int(graph.pair_end[pair] - graph.pair_start[pair])
+            }, None
+
+    @staticmethod
+    def _trail_record(graph, path, hops):
+        amounts = [hop['amount'] for hop in hops]
+        return {
+            'path': [graph.accounts[node] for node in path],
+            'hops': list(hops),
+            'length': len(hops),
+            'flow_amount': min(amounts),
+            'total_amount': sum(amounts)
+        }
 
 # -------------------------
-# Load Data from CSV on First Request
+# Schema Mapping
 # -------------------------
-@app.before_request
-def load_data():
-    # Skip data loading for health checks and static files
-    if request.path in ['/', '/static', '/ping', '/health', '/status']:
-        return
-        
-    if Transaction.query.count() == 0:
-        try:
-            print("Loading transaction data from Excel...")
-            # Check if the Excel file exists before trying to read it
-            excel_path = '../archive/bank.xlsx'
-            if not os.path.exists(excel_path):
-                print(f"Excel file not found at {excel_path}, skipping data load")
-                return
-                
-            df = pd.read_excel(excel_path)
-            txn_id = 1
-            for _, row in df.iterrows():
-                deposit_amt = row.get('DEPOSIT AMT')
-                withdrawal_amt = row.get('WITHDRAWAL AMT')
-                amount = None
-                transaction_type = None
-                if is_valid_number(deposit_amt) and float(str(deposit_amt).replace(',', '')) != 0.0:
-                    amount = float(str(deposit_amt).replace(',', ''))
-                    transaction_type = 'deposit'
-                elif is_valid_number(withdrawal_amt) and float(str(withdrawal_amt).replace(',', '')) != 0.0:
-                    amount = -float(str(withdrawal_amt).replace(',', ''))
-                    transaction_type = 'withdrawal'
+# Optional JSON file of extra mapping profiles, same shape as SCHEMA_PROFILES
+app.config['SCHEMA_PROFILES_FILE'] = os.environ.get('SCHEMA_PROFILES_FILE', '')
+
+def normalize_column_name(name):
+    """'From Account', ' FROM-ACCOUNT' and 'from_account' all become 'from_account'"""
+    return re.sub(r'[^0-9a-z]+', '_', str(name).strip().lower()).strip('_')
+
+# Header spellings seen in exports for each transaction column, as normalize_column_name leaves them
+COLUMN_ALIASES = {
+    'case_id': ['case', 'case_no', 'case_number', 'case_ref', 'investigation_id'],
+    'transaction_id': ['txn_id', 'trans_id', 'txn_no', 'transaction_no', 'transaction_ref', 'reference', 'ref_no', 'utr'],
+    'from_account': [
+        'sender', 'sender_account', 'source_account', 'debit_account', 'debit_a_c', 'payer', 'payer_account',
+        'from_acct', 'from_account_no', 'account_from', 'originator_account', 'remitter_account'
+    ],
+    'to_account': [
+        'receiver', 'receiver_account', 'destination_account', 'credit_account', 'credit_a_c', 'payee', 'payee_account',
+        'to_acct', 'to_account_no', 'account_to', 'beneficiary', 'beneficiary_account', 'beneficiary_a_c'
+    ],
+    'amount': ['amt', 'txn_amount', 'transaction_amount', 'transfer_amount', 'value', 'amount_inr', 'amount_usd'],
+    'date': ['txn_date', 'transaction_date', 'value_date', 'posting_date', 'date_of_transaction'],
+    'time': ['txn_time', 'transaction_time', 'time_of_transaction'],
+    'ip': ['ip_address', 'ipaddress', 'client_ip', 'device_ip', 'login_ip'],
+    'phone': ['phone_no', 'phone_number', 'mobile', 'mobile_no', 'mobile_number', 'msisdn', 'contact_number'],
+    'email': ['email_id', 'email_address', 'e_mail', 'mail'],
+    'transaction_type': ['type', 'txn_type', 'transaction_mode', 'channel'],
+    # Combined date and time, split into date/time by the mapper
+    'datetime': ['timestamp', 'date_time', 'txn_datetime', 'transaction_datetime', 'transaction_timestamp'],
+}
+
+# Account statement workbooks are converted by prepare_bank_statement, which expects these headers
+BANK_STATEMENT_COLUMNS = {
+    'account_no': 'Account No',
+    'transaction_details': 'TRANSACTION DETAILS',
+    'value_date': 'VALUE DATE',
+    'withdrawal_amt': 'WITHDRAWAL AMT',
+    'deposit_amt': 'DEPOSIT AMT',
+}
+
+# Mapping profiles per export format:
+#   columns    - source header -> transaction column, checked before COLUMN_ALIASES
+#   date_format, dayfirst - how dates are written (parsed by pandas when no format is given)
+#   decimal    - ',' for amounts written like 1.234,50
+#   dtypes     - 'float' or 'text' for extra columns that should not be inferred
+#   case_id    - case for files without a case column
+# A named profile is picked automatically when a file has all of its source columns.
+SCHEMA_PROFILES = {
+    'standard': {},
+    'bank_statement': {'statement': True},
+}
+
+SCHEMA_DTYPES = ('float', 'text')
+
+def load_schema_profiles():
+    """Built-in profiles plus those in SCHEMA_PROFILES_FILE, with source headers normalized"""
+    profiles = dict(SCHEMA_PROFILES)
+    if app.config['SCHEMA_PROFILES_FILE']:
+        with open(app.config['SCHEMA_PROFILES_FILE']) as f:
+            profiles.update(json.load(f))
+    loaded = {}
+    for name, spec in profiles.items():
+        dtypes = {normalize_column_name(col): kind for col, kind in spec.get('dtypes', {}).items()}
+        unknown = sorted(set(dtypes.values()) - set(SCHEMA_DTYPES))
+        if unknown:
+            raise ValueError(f"Schema profile '{name}' has unknown dtypes {unknown}, use one of {list(SCHEMA_DTYPES)}")
+        loaded[name] = dict(
+            spec,
+            columns={normalize_column_name(src): dst for src, dst in spec.get('columns', {}).items()},
+            dtypes=dtypes
+        )
+    return loaded
+
+def coerce_text_column(values):
+    """Identifiers as text; whole floats lose the '.0' pandas adds to numeric columns with gaps"""
+    if pd.api.types.is_float_dtype(values):
+        finite = values.where(np.isfinite(values), 0.0).fillna(0.0)
+        whole = (finite % 1 == 0).to_numpy()
+        text = np.where(whole, finite.astype('int64').astype(str), values.astype(str))
+        return pd.Series(text, index=values.index, dtype=object).where(values.notna())
+    if pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+        return values.astype(str).str.strip().where(values.notna())
+    return values.astype(str).astype(object).where(values.notna())
+
+def coerce_amount_column(values, decimal='.'):
+    """Amounts as float64, also reading '$ 1,200', 'INR 500', '-$20' and '(75.00)'"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype('float64')
+    text = values.astype(str).str.strip()
+    if decimal == ',':
+        text = text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    amounts = parse_amount_column(text)
+    messy = amounts.isna() & values.notna()
+    if messy.any():
+        raw = text[messy].str.replace(',', '', regex=False)
+        number = pd.to_numeric(raw.str.extract(r'(\d+(?:\.\d+)?)', expand=False), errors='coerce')
+        negative = raw.str.startswith('-') | (raw.str.startswith('(') & raw.str.endswith(')'))
+        amounts[messy] = number.where(~negative, -number)
+    return amounts
+
+def coerce_date_column(values, date_format=None, dayfirst=False):
+    """Dates as YYYY-MM-DD text; values that do not parse are kept as written"""
+    parsed = pd.to_datetime(values, errors='coerce', format=date_format, dayfirst=dayfirst)
+    text = coerce_text_column(values) if not pd.api.types.is_datetime64_any_dtype(values) else values.astype(object)
+    return parsed.dt.strftime('%Y-%m-%d').where(parsed.notna(), text)
+
+class SchemaMapper:
+    """Maps the chunks of one uploaded or ingested file onto the transaction columns.
+
+    The first chunk's header picks the profile (unless one is named) and fixes which source column
+    becomes which transaction column, so every later chunk is mapped the same way. Values are
+    coerced here, once: amounts to float64, dates to YYYY-MM-DD and identifiers to text.
+    """
+
+    def __init__(self, profile=None):
+        self.profiles = load_schema_profiles()
+        if profile is not None and profile not in self.profiles:
+            raise ValueError(f"Unknown schema profile '{profile}', expected one of {sorted(self.profiles)}")
+        self.profile = profile
+        self.positions = None
+        self.targets = None
+        self.report = None
+
+    @property
+    def spec(self):
+        return self.profiles[self.profile]
+
+    @property
+    def statement(self):
+        return bool(self.spec.get('statement'))
+
+    def detect(self, names):
+        """Statement layout, else the named profile with the most source columns all present, else 'standard'"""
+        present = set(names)
+        if present & {'deposit_amt', 'withdrawal_amt'}:
+            return 'bank_statement'
+        best, best_size = 'standard', 0
+        for name, spec in self.profiles.items():
+            sources = set(spec['columns'])
+            if sources and sources <= present and len(sources) > best_size:
+                best, best_size = name, len(sources)
+        return best
+
+    def plan(self, columns):
+        """Decide the target of every source column from the header of the first chunk"""
+        names = [normalize_column_name(col) for col in columns]
+        if self.profile is None:
+            self.profile = self.detect(names)
+        if self.statement:
+            candidates = [(0, BANK_STATEMENT_COLUMNS.get(name, name)) for name in names]
+        else:
+            aliases = {alias: column for column, spellings in COLUMN_ALIASES.items() for alias in spellings}
+            candidates = []
+            for name in names:
+                if name in self.spec['columns']:
+                    candidates.append((0, self.spec['columns'][name]))
+                elif name in COLUMN_ALIASES:
+                    candidates.append((1, name))
+                elif name in aliases:
+                    candidates.append((2, aliases[name]))
                 else:
-                    continue  # skip rows with no amount
-                from_account = str(row.get('Account No', ''))
-                details = str(row.get('TRANSACTION DETAILS', ''))
-                to_account = 'UNKNOWN'
-                match = re.search(r'\b\d{9,}\b', details)
-                if match:
-                    to_account = match.group(0)
-                txn = Transaction(
-                    **{
-                        'case_id': 'CASE001',
-                        'transaction_id': f'TXN{txn_id:06d}',
-                        'from_account': from_account,
-                        'to_account': to_account,
-                        'amount': amount,
-                        'date': str(row.get('VALUE DATE', '')),
-                        'time': '12:00:00',
-                        'ip': '192.168.1.1',
-                        'phone': '+1234567890',
-                        'email': 'user@example.com',
-                        'transaction_type': 'transfer'
-                    }
-                )
-                db.session.add(txn)
-                txn_id += 1
-            db.session.commit()
-            print(f"Loaded {txn_id-1} transactions from Excel")
-        except Exception as e:
-            print(f"Error loading Excel data: {e}")
-            # Continue without loading data - don't block the app
+                    # 'id' is the row position in the dataset store
+                    candidates.append((3, 'source_id' if name == 'id' else name))
+
+        # Profile columns beat exact names, which beat aliases; the first source wins a tie
+        order = sorted(range(len(names)), key=lambda i: candidates[i][0])
+        taken, positions = set(), []
+        for i in order:
+            target = candidates[i][1]
+            if target and target not in taken:
+                taken.add(target)
+                positions.append(i)
+        positions.sort()
+        self.positions = positions
+        self.targets = [candidates[i][1] for i in positions]
+        if 'datetime' in taken:
+            taken |= {'date', 'time'}
+        self.report = {
+            'profile': self.profile,
+            'columns': {str(columns[i]): candidates[i][1] for i in positions},
+            'dropped': [str(columns[i]) for i in range(len(columns)) if i not in set(positions)],
+            'defaulted': [] if self.statement else [col for col in TRANSACTION_COLUMNS if col not in taken]
+        }
+
+    def map(self, chunk, start_txn_id=1):
+        """One chunk with transaction column names and coerced values"""
+        if self.positions is None:
+            self.plan(list(chunk.columns))
+        chunk = chunk.iloc[:, self.positions].set_axis(self.targets, axis=1)
+        if self.statement:
+            return prepare_bank_statement(chunk, start_txn_id=start_txn_id)
+
+        spec = self.spec
+        date_format, dayfirst = spec.get('date_format'), spec.get('dayfirst', False)
+        if 'datetime' in chunk.columns:
+            stamps = pd.to_datetime(chunk.pop('datetime'), errors='coerce', format=date_format, dayfirst=dayfirst)
+            if 'date' not in chunk.columns:
+                chunk['date'] = stamps.dt.strftime('%Y-%m-%d')
+            if 'time' not in chunk.columns:
+                chunk['time'] = stamps.dt.strftime('%H:%M:%S')
+        for col in chunk.columns:
+            kind = spec['dtypes'].get(col)
+            if col == 'amount':
+                chunk[col] = coerce_amount_column(chunk[col], decimal=spec.get('decimal', '.'))
+            elif col == 'date':
+                chunk[col] = coerce_date_column(chunk[col], date_format=date_format, dayfirst=dayfirst)
+            elif col in TRANSACTION_COLUMNS or kind == 'text':
+                chunk[col] = coerce_text_column(chunk[col])
+            elif kind == 'float':
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype('float64')
+        if 'case_id' not in chunk.columns and spec.get('case_id'):
+            chunk['case_id'] = spec['case_id']
+        return chunk
+
+# -------------------------
+# Bulk Ingestion Pipeline
+# -------------------------
+app.config['INGEST_BATCH_SIZE'] = int(os.environ.get('INGEST_BATCH_SIZE', 5000))
+
+def parse_amount_column(values):
+    """Parse a whole column of amount strings at once - invalid values become NaN"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype('float64')
+    cleaned = values.astype(str).str.replace(',', '', regex=False).str.strip()
+    return pd.to_numeric(cleaned, errors='coerce')
+
+def extract_counterparty_accounts(details):
+    """Pull the first 9+ digit account number out of each transaction description"""
+    return details.astype(str).str.extract(r'\b(\d{9,})\b', expand=False).fillna('UNKNOWN')
+
+def prepare_bank_statement(df, start_txn_id=1):
+    """Convert a bank statement export into Transaction rows using column operations"""
+    missing = pd.Series(np.nan, index=df.index)
+    deposit = parse_amount_column(df['DEPOSIT AMT']) if 'DEPOSIT AMT' in df.columns else missing
+    withdrawal = parse_amount_column(df['WITHDRAWAL AMT']) if 'WITHDRAWAL AMT' in df.columns else missing
+
+    # Deposits win over withdrawals, rows with neither are skipped
+    is_deposit = deposit.notna() & (deposit != 0.0)
+    is_withdrawal = ~is_deposit & withdrawal.notna() & (withdrawal != 0.0)
+    keep = is_deposit | is_withdrawal
+    df = df[keep]
+    amount = np.where(is_deposit[keep], deposit[keep], -withdrawal[keep])
+
+    def text_column(name):
+        if name in df.columns:
+            return df[name].astype(str).to_numpy()
+        return np.full(len(df), '', dtype=object)
+
+    details = df['TRANSACTION DETAILS'] if 'TRANSACTION DETAILS' in df.columns else pd.Series('', index=df.index)
+    txn_numbers = pd.Series(np.arange(start_txn_id, start_txn_id + len(df)))
+
+    return pd.DataFrame({
+        'case_id': 'CASE001',
+        'transaction_id': ('TXN' + txn_numbers.astype(str).str.zfill(6)).to_numpy(),
+        'from_account': text_column('Account No'),
+        'to_account': extract_counterparty_accounts(details).to_numpy(),
+        'amount': amount,
+        'date': text_column('VALUE DATE'),
+        'time': '12:00:00',
+        'ip': '192.168.1.1',
+        'phone': '+1234567890',
+        'email': 'user@example.com',
+        'transaction_type': 'transfer'
+    })
+
+def bulk_insert_transactions(frame, batch_size=None, commit=True):
+    """Insert prepared Transaction rows with one executemany per batch"""
+    batch_size = batch_size or app.config['INGEST_BATCH_SIZE']
+    table = Transaction.__table__
+    started = time.perf_counter()
+    inserted = 0
+    for start in range(0, len(frame), batch_size):
+        batch = frame.iloc[start:start + batch_size]
+        timestamps, cents = typed_transaction_values(batch)
+        # Object Series keep the missing values as None; a bare array would turn back into NaT
+        records = batch.assign(
+            timestamp=pd.Series(timestamps, index=batch.index, dtype=object),
+            amount_cents=pd.Series(cents, index=batch.index, dtype=object)
+        ).to_dict(orient='records')
+        if records:
+            db.session.execute(table.insert(), records)
+            inserted += len(records)
+    if commit:
+        db.session.commit()
+    elapsed = time.perf_counter() - started
+    rate = inserted / elapsed if elapsed > 0 else float(inserted)
+    print(f"Inserted {inserted} transactions in {elapsed:.2f}s ({rate:,.0f} rows/sec, batch size {batch_size})")
+    return {'rows': inserted, 'seconds': elapsed, 'rows_per_second': rate}
+
+TRANSACTION_COLUMNS = [
+    'case_id', 'transaction_id', 'from_account', 'to_account', 'amount', 'date', 'time',
+    'ip', 'phone', 'email', 'transaction_type'
+]
+
+def fill_transaction_defaults(df, case_id='UPLOADED'):
+    """Add any missing transaction columns with their default values"""
+    for col in TRANSACTION_COLUMNS:
+        if col not in df.columns:
+            if col == 'case_id':
+                df[col] = case_id
+            elif col == 'time':
+                df[col] = '12:00:00'
+            else:
+                df[col] = ''
+    return df
+
+def prepare_transaction_chunk(df, start_txn_id=1, mapper=None):
+    """Turn one chunk of a workbook or CSV export into Transaction rows"""
+    mapper = mapper or SchemaMapper()
+    df = mapper.map(df, start_txn_id=start_txn_id)
+    if mapper.statement:
+        return df
+
+    df = fill_transaction_defaults(df, case_id='CASE001')
+    frame = df[TRANSACTION_COLUMNS].copy()
+    frame['amount'] = parse_amount_column(frame['amount'])
+    frame = frame[frame['amount'].notna()]
+    text_cols = [col for col in TRANSACTION_COLUMNS if col != 'amount']
+    frame[text_cols] = frame[text_cols].fillna('').astype(str)
+    frame.loc[frame['transaction_type'] == '', 'transaction_type'] = 'transfer'
+    missing_ids = frame['transaction_id'] == ''
+    if missing_ids.any():
+        txn_numbers = pd.Series(np.arange(start_txn_id, start_txn_id + len(frame)), index=frame.index)
+        frame.loc[missing_ids, 'transaction_id'] = 'TXN' + txn_numbers[missing_ids].astype(str).str.zfill(6)
+    return frame
+
+def iter_source_chunks(path, chunk_size, skip_rows=0):
+    """Yield raw DataFrame chunks from an Excel workbook or CSV, skipping rows already ingested"""
+    if path.lower().endswith('.csv'):
+        reader = pd.read_csv(path, chunksize=chunk_size, skiprows=range(1, skip_rows + 1))
+        for chunk in reader:
+            yield chunk
+        return
+
+    # Stream the workbook row by row instead of loading the whole sheet
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(col).strip() if col is not None else '' for col in next(rows, [])]
+        buffer = []
+        for index, row in enumerate(rows):
+            if index < skip_rows:
+                continue
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=header)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header)
+    finally:
+        workbook.close()
+
+def ingest_source(path, batch_size=None, restart=False, profile=None):
+    """Load a workbook or CSV into the Transaction table in committed, resumable chunks"""
+    batch_size = batch_size or app.config['INGEST_BATCH_SIZE']
+    mapper = SchemaMapper(profile)
+    source = os.path.abspath(path)
+    checkpoint = IngestCheckpoint.query.filter_by(source=source).first()
+    if checkpoint is None:
+        checkpoint = IngestCheckpoint(source=source, rows_done=0, next_txn_id=1, completed=False)
+        db.session.add(checkpoint)
+        db.session.commit()
+    elif restart:
+        # The earlier load goes in the same transaction as the reset, so a reload never doubles rows
+        removed = db.session.execute(db.delete(Transaction).where(Transaction.ingest_id == checkpoint.id)).rowcount
+        # Reloaded rows may reuse the deleted ids, so cached frames and graphs must see a new version
+        bump_transaction_generation()
+        checkpoint.rows_done = 0
+        checkpoint.next_txn_id = 1
+        checkpoint.completed = False
+        db.session.commit()
+        transaction_cache.invalidate()
+        print(f"Removed {removed} transactions from the earlier load of {source}")
+    elif checkpoint.completed:
+        print(f"{source} already ingested ({checkpoint.rows_done} rows), use --restart to load it again")
+        return {'rows': 0, 'source_rows': checkpoint.rows_done, 'seconds': 0.0, 'rows_per_second': 0.0}
+
+    if checkpoint.rows_done:
+        print(f"Resuming {source} after {checkpoint.rows_done} rows")
+
+    started = time.perf_counter()
+    inserted = 0
+    for chunk in iter_source_chunks(source, batch_size, skip_rows=checkpoint.rows_done):
+        frame = prepare_transaction_chunk(chunk, start_txn_id=checkpoint.next_txn_id, mapper=mapper)
+        report = bulk_insert_transactions(frame.assign(ingest_id=checkpoint.id), batch_size=batch_size, commit=False)
+        # The checkpoint moves in the same transaction as the rows it describes
+        checkpoint.rows_done += len(chunk)
+        checkpoint.next_txn_id += len(frame)
+        checkpoint.updated_at = datetime.utcnow()
+        db.session.commit()
+        inserted += report['rows']
+        elapsed = time.perf_counter() - started
+        rate = inserted / elapsed if elapsed > 0 else float(inserted)
+        print(f"  {checkpoint.rows_done} source rows read, {inserted} transactions inserted ({rate:,.0f} rows/sec)")
+
+    checkpoint.completed = True
+    checkpoint.updated_at = datetime.utcnow()
+    db.session.commit()
+    elapsed = time.perf_counter() - started
+    rate = inserted / elapsed if elapsed > 0 else float(inserted)
+    print(f"Ingested {inserted} transactions from {source} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return {'rows': inserted, 'source_rows': checkpoint.rows_done, 'seconds': elapsed, 'rows_per_second': rate}
 
 def login_required(f):
     @wraps(f)
@@ -364,54 +1325,717 @@ def protected_api_route(rule, **options):
         return f
     return decorator
 
+# -------------------------
+# Transaction Frame Cache
+# -------------------------
+app.config['TRANSACTION_CACHE_MAX_BYTES'] = int(os.environ.get('TRANSACTION_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+app.config['READ_CHUNK_SIZE'] = int(os.environ.get('READ_CHUNK_SIZE', 50000))
+
+def parse_time_range(date_from=None, date_to=None):
+    """(start, stop) datetimes for a date filter, stop exclusive; None when neither bound is given.
+
+    A date-only date_to covers that whole day; a date_to with a time is inclusive to the second.
+    Raises ValueError for values that are not dates.
+    """
+    if not date_from and not date_to:
+        return None
+    start = stop = None
+    if date_from:
+        start = pd.Timestamp(date_from).to_pydatetime()
+    if date_to:
+        end = pd.Timestamp(date_to)
+        date_only = end == end.normalize() and len(str(date_to).strip()) <= 10
+        stop = (end + (pd.Timedelta(days=1) if date_only else pd.Timedelta(seconds=1))).to_pydatetime()
+    return start, stop
+
+def request_time_range():
+    """parse_time_range for the date_from/date_to query parameters"""
+    return parse_time_range(request.args.get('date_from'), request.args.get('date_to'))
+
+def timestamp_conditions(column, time_range):
+    """SQL conditions restricting a timestamp column to a parse_time_range window"""
+    if time_range is None:
+        return []
+    start, stop = time_range
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if stop is not None:
+        conditions.append(column < stop)
+    return conditions
+
+def iso_bound_text(value):
+    """A window bound as ISO text without trailing zero time parts, so it compares as text with
+    'YYYY-MM-DD HH:MM[:SS]' values the way the datetimes compare"""
+    if value is None:
+        return None
+    if value.time() == datetime.min.time():
+        return value.strftime('%Y-%m-%d')
+    if value.second == 0 and not value.microsecond:
+        return value.strftime('%Y-%m-%d %H:%M')
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def transaction_time_conditions(table, time_range):
+    """timestamp_conditions for the Transaction table that also keep rows not yet backfilled.
+
+    Until `migrate-schema` fills it, timestamp is null for older rows; those are matched on their
+    date/time text instead, which works for ISO dates (other formats need the backfill).
+    """
+    conditions = timestamp_conditions(table.c.timestamp, time_range)
+    if not conditions:
+        return []
+    start, stop = time_range
+    text = table.c.date + ' ' + db.func.coalesce(table.c.time, '')
+    legacy = timestamp_conditions(text, (iso_bound_text(start), iso_bound_text(stop)))
+    return [db.or_(
+        db.and_(*conditions),
+        db.and_(table.c.timestamp.is_(None), table.c.date.like('____-__-__%'), *legacy)
+    )]
+
+def timestamp_mask(timestamps, time_range):
+    """Boolean mask of datetime values inside a parse_time_range window"""
+    mask = timestamps.notna()
+    if time_range is not None:
+        start, stop = time_range
+        if start is not None:
+            mask &= timestamps >= start
+        if stop is not None:
+            mask &= timestamps < stop
+    return mask
+
+TRANSACTION_CATEGORY_COLUMNS = ['case_id', 'from_account', 'to_account', 'ip', 'phone', 'email', 'transaction_type']
+
+def build_transaction_frame(columns):
+    """Turn raw column sequences from a SELECT into a typed DataFrame"""
+    frame = pd.DataFrame({
+        'id': np.array(columns['id'], dtype='int64'),
+        'case_id': pd.Categorical(columns['case_id']),
+        'transaction_id': np.array(columns['transaction_id'], dtype=object),
+        'from_account': pd.Categorical(columns['from_account']),
+        'to_account': pd.Categorical(columns['to_account']),
+        'amount': np.array(columns['amount'], dtype='float64'),
+        'date': np.array(columns['date'], dtype=object),
+        'time': np.array(columns['time'], dtype=object),
+        'ip': pd.Categorical(columns['ip']),
+        'phone': pd.Categorical(columns['phone']),
+        'email': pd.Categorical(columns['email']),
+        'transaction_type': pd.Categorical(columns['transaction_type'])
+    })
+    stored = pd.to_datetime(pd.Series(columns.get('timestamp', [None] * len(frame)), dtype=object), errors='coerce')
+    missing = stored.isna().to_numpy()
+    if missing.any():
+        # Rows written before the timestamp column existed and not yet backfilled
+        stored[missing] = pd.to_datetime(
+            frame['date'][missing].fillna('') + ' ' + frame['time'][missing].fillna(''), errors='coerce', format='mixed'
+        )
+    frame['timestamp'] = stored.astype('datetime64[ns]').to_numpy()
+    return frame
+
+def concat_transaction_frames(frames):
+    """Concatenate typed chunks, unioning categories so columns stay categorical"""
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return build_transaction_frame({col: [] for col in ['id'] + TRANSACTION_COLUMNS})
+    if len(frames) == 1:
+        return frames[0]
+    combined = pd.concat(frames, ignore_index=True)
+    for col in TRANSACTION_CATEGORY_COLUMNS:
+        combined[col] = union_categoricals([frame[col] for frame in frames])
+    return combined
+
+def iter_transaction_chunks(after_id=0, chunk_size=None, case_id=None, time_range=None):
+    """Stream the transaction table with a raw SELECT, yielding typed frames of chunk_size rows.
+
+    `time_range` is a (start, stop) pair from parse_time_range and becomes a timestamp range scan.
+    """
+    chunk_size = chunk_size or app.config['READ_CHUNK_SIZE']
+    table = Transaction.__table__
+    names = ['id'] + TRANSACTION_COLUMNS + ['timestamp']
+    query = db.select(*[table.c[name] for name in names]).where(table.c.id > after_id)
+    if case_id is not None:
+        query = query.where(table.c.case_id == case_id)
+    query = query.where(*transaction_time_conditions(table, time_range))
+    query = query.order_by(table.c.id)
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield build_transaction_frame(dict(zip(names, zip(*rows))))
+
+def read_transaction_frame(after_id=0, chunk_size=None):
+    """Read every transaction above after_id into one typed DataFrame"""
+    return concat_transaction_frames(list(iter_transaction_chunks(after_id=after_id, chunk_size=chunk_size)))
+
+def iso_datetime_columns(df):
+    """Shallow copy of df with datetime columns as ISO strings (None where missing)"""
+    df = df.copy(deep=False)
+    for col in df.select_dtypes(include=['datetime64[ns]']).columns:
+        df[col] = df[col].dt.strftime('%Y-%m-%dT%H:%M:%S').astype(object).where(df[col].notna(), None)
+    return df
+
+def frame_to_records(df):
+    """DataFrame rows as JSON-safe dicts (datetimes as ISO strings)"""
+    return iso_datetime_columns(df).to_dict(orient='records')
+
+# -------------------------
+# Uploaded Dataset Store
+# -------------------------
+app.config['UPLOAD_STORE_FORMAT'] = os.environ.get('UPLOAD_STORE_FORMAT', 'parquet' if pq is not None else 'csv')
+app.config['UPLOAD_ROW_GROUP_SIZE'] = int(os.environ.get('UPLOAD_ROW_GROUP_SIZE', 50000))
+
+def is_parquet_upload(path):
+    return path.lower().endswith('.parquet')
+
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 50000))
+# Transaction columns are identifiers and stay text whatever a chunk happens to look like
+UPLOAD_TEXT_COLUMNS = [col for col in TRANSACTION_COLUMNS if col != 'amount']
+
+def prepare_upload_chunk(df, mapper=None, start_txn_id=1):
+    """Map one chunk of an upload onto the transaction columns and add default columns.
+
+    `start_txn_id` numbers generated transaction ids (bank statements), so it has to run on across
+    the chunks of one upload.
+    """
+    mapper = mapper or SchemaMapper()
+    return fill_transaction_defaults(mapper.map(df, start_txn_id=start_txn_id))
+
+class UploadWriter:
+    """Writes an uploaded dataset chunk by chunk, so memory stays at one chunk plus a row group.
+
+    The first chunk fixes the column set and types: transaction identifiers are text, amount and
+    other numeric columns are float64, and a typed timestamp is derived from date/time. Later
+    chunks are conformed to that schema (unknown columns dropped, unparseable numbers null).
+    Parquet output is buffered into UPLOAD_ROW_GROUP_SIZE row groups with min/max statistics.
+    """
+
+    def __init__(self):
+        self.use_parquet = app.config['UPLOAD_STORE_FORMAT'] == 'parquet' and pq is not None
+        self.path = os.path.join('instance', f"uploaded_{uuid.uuid4().hex}_{int(time.time())}.{'parquet' if self.use_parquet else 'csv'}")
+        self.columns = None
+        self.numeric = None
+        self.schema = None
+        self.writer = None
+        self.pending = []
+        self.pending_rows = 0
+        self.rows = 0
+
+    def conform(self, chunk):
+        """A chunk with the writer's columns and types"""
+        chunk = chunk.copy()
+        if 'amount' in chunk.columns:
+            chunk['amount'] = parse_amount_column(chunk['amount'])
+        if 'date' in chunk.columns and 'time' in chunk.columns:
+            chunk['timestamp'] = transaction_timestamps(chunk)
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self.numeric = [
+                col for col in self.columns
+                if col not in UPLOAD_TEXT_COLUMNS and col != 'timestamp'
+                and pd.api.types.is_numeric_dtype(chunk[col]) and not pd.api.types.is_bool_dtype(chunk[col])
+            ]
+        chunk = chunk.reindex(columns=self.columns)
+        for col in self.columns:
+            values = chunk[col]
+            if col in self.numeric:
+                chunk[col] = pd.to_numeric(values, errors='coerce').astype('float64')
+            elif col == 'timestamp':
+                chunk[col] = pd.to_datetime(values, errors='coerce')
+            else:
+                chunk[col] = values.astype(str).where(values.notna(), None)
+        return chunk
+
+    def write(self, chunk):
+        """Append one chunk and return it as written"""
+        chunk = self.conform(chunk)
+        if self.use_parquet:
+            if self.schema is None:
+                self.schema = pa.schema([
+                    (col, pa.float64() if col in self.numeric else pa.timestamp('ns') if col == 'timestamp' else pa.string())
+                    for col in self.columns
+                ])
+            self.pending.append(pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False))
+            self.pending_rows += len(chunk)
+            if self.pending_rows >= app.config['UPLOAD_ROW_GROUP_SIZE']:
+                self._flush(full_groups_only=True)
+        else:
+            chunk.to_csv(self.path, mode='a', header=self.rows == 0, index=False)
+        self.rows += len(chunk)
+        return chunk
+
+    def _flush(self, full_groups_only=False):
+        """Write buffered rows as row groups; a short remainder stays buffered unless this is the end"""
+        if not self.pending:
+            return
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, self.schema, write_statistics=True)
+        size = app.config['UPLOAD_ROW_GROUP_SIZE']
+        table = pa.concat_tables(self.pending)
+        while table.num_rows >= size or (table.num_rows and not full_groups_only):
+            self.writer.write_table(table.slice(0, size), row_group_size=size)
+            table = table.slice(size)
+        self.pending = [table] if table.num_rows else []
+        self.pending_rows = table.num_rows
+
+    def close(self):
+        """Finish the file and return its path"""
+        if self.use_parquet:
+            self._flush()
+            if self.writer is None and self.schema is not None:
+                self.writer = pq.ParquetWriter(self.path, self.schema, write_statistics=True)
+            if self.writer is not None:
+                self.writer.close()
+        return self.path
+
+    def abort(self):
+        """Close and delete a partially written file"""
+        try:
+            if self.writer is not None:
+                self.writer.close()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+def read_upload_frame(path, columns=None):
+    """Load an uploaded dataset, optionally only some of its columns"""
+    if is_parquet_upload(path):
+        present = None if columns is None else [col for col in columns if col in pq.read_schema(path).names]
+        return pq.read_table(path, columns=present, memory_map=True).to_pandas()
+    usecols = None if columns is None else (lambda col: col in columns)
+    return pd.read_csv(path, usecols=usecols)
+
+def row_group_may_match(row_group, names, case_id=None, time_range=None):
+    """False when a row group's min/max statistics rule out the case_id / time window"""
+    def bounds(name):
+        if name not in names:
+            return None
+        stats = row_group.column(names.index(name)).statistics
+        if stats is None or not stats.has_min_max:
+            return None
+        return stats.min, stats.max
+
+    if case_id is not None:
+        case_bounds = bounds('case_id')
+        if case_bounds is not None and not (case_bounds[0] <= case_id <= case_bounds[1]):
+            return False
+    if time_range is not None:
+        time_bounds = bounds('timestamp')
+        start, stop = time_range
+        if time_bounds is not None:
+            if start is not None and time_bounds[1] < start:
+                return False
+            if stop is not None and time_bounds[0] >= stop:
+                return False
+    return True
+
+def iter_upload_frames(path, chunk_size, columns=None, case_id=None, time_range=None):
+    """Raw (first_row, frame) pieces of an uploaded dataset; first_row is the 0-based file position"""
+    if not is_parquet_upload(path):
+        usecols = None if columns is None else (lambda col: col in columns)
+        position = 0
+        for chunk in pd.read_csv(path, chunksize=chunk_size, usecols=usecols):
+            yield position, chunk
+            position += len(chunk)
+        return
+    parquet = pq.ParquetFile(path, memory_map=True)
+    names = parquet.schema_arrow.names
+    present = None if columns is None else [col for col in columns if col in names]
+    position = 0
+    for group in range(parquet.metadata.num_row_groups):
+        row_group = parquet.metadata.row_group(group)
+        if row_group_may_match(row_group, names, case_id, time_range):
+            frame = parquet.read_row_group(group, columns=present).to_pandas()
+            for start in range(0, len(frame), chunk_size):
+                yield position + start, frame.iloc[start:start + chunk_size]
+        position += row_group.num_rows
+
+def iter_upload_chunks(path, chunk_size, after_id=0, columns=None, case_id=None, time_range=None):
+    """Uploaded rows numbered from 1 in file order (as `id`), filtered by cursor, case and time window"""
+    if columns is not None:
+        columns = list(dict.fromkeys(list(columns) + ['id', 'case_id', 'date', 'time', 'timestamp']))
+    for first_row, chunk in iter_upload_frames(path, chunk_size, columns, case_id, time_range):
+        if first_row + len(chunk) <= after_id:
+            continue
+        if 'id' not in chunk.columns:
+            chunk = chunk.copy()
+            chunk.insert(0, 'id', np.arange(first_row + 1, first_row + len(chunk) + 1))
+        chunk = chunk[chunk['id'] > after_id]
+        if case_id is not None:
+            chunk = chunk[chunk['case_id'].astype(str) == case_id]
+        if time_range is not None:
+            chunk = chunk[timestamp_mask(transaction_timestamps(chunk), time_range).to_numpy()]
+        yield chunk
+
+data_generation_lock = threading.Lock()
+data_generation_ready = set()
+
+def ensure_data_generation_table():
+    # Created on first use since web workers do not run create_all
+    engine = db.engine
+    with data_generation_lock:
+        if str(engine.url) not in data_generation_ready:
+            DataGeneration.__table__.create(engine, checkfirst=True)
+            data_generation_ready.add(str(engine.url))
+
+def bump_transaction_generation():
+    """Record a delete of Transaction rows; commits with the caller's session"""
+    ensure_data_generation_table()
+    row = db.session.get(DataGeneration, 'transaction')
+    if row is None:
+        db.session.add(DataGeneration(name='transaction', generation=1))
+    else:
+        row.generation += 1
+
+def transaction_table_version():
+    """(delete generation, row count, max id) of the Transaction table.
+
+    Appends move the count and max id; deletes bump the generation, so a reload that reuses the
+    deleted ids (SQLite hands out max(id) + 1 again) still reads as a change.
+    """
+    ensure_data_generation_table()
+    generation = db.session.query(DataGeneration.generation).filter_by(name='transaction').scalar() or 0
+    count, max_id = db.session.query(db.func.count(Transaction.id), db.func.max(Transaction.id)).one()
+    return (generation, count, max_id or 0)
+
+class TransactionCache:
+    """Process-wide cache of transaction frames keyed by data source, evicted LRU by memory"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get_database_frame(self):
+        """Return all DB transactions, appending only rows newer than the cached max id.
+
+        Any delete (a new generation, or fewer rows than cache plus appended) forces a full reload.
+        """
+        key = ('db',)
+        version = transaction_table_version()
+        generation, count, max_id = version
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry['version'] == version:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry['frame']
+            frame = None
+            if entry is not None:
+                cached_generation, cached_count, cached_max_id = entry['version']
+                if cached_generation == generation and cached_max_id < max_id:
+                    new_rows = read_transaction_frame(after_id=cached_max_id)
+                    if cached_count + len(new_rows) == count:
+                        self.refreshes += 1
+                        frame = concat_transaction_frames([entry['frame'], new_rows])
+            if frame is None:
+                # First load, or rows were deleted underneath us
+                self.misses += 1
+                frame = read_transaction_frame()
+            self._store(key, frame, version)
+            return frame
+
+    def get_file_frame(self, path):
+        """Return an uploaded dataset, re-reading it only when the file changes"""
+        key = ('file', path)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry['version'] == version:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry['frame']
+            self.misses += 1
+            frame = read_upload_frame(path)
+            self._store(key, frame, version)
+            return frame
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': int(sum(entry['bytes'] for entry in self.entries.values())),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'evictions': self.evictions
+            }
+
+    def _store(self, key, frame, version):
+        self.entries[key] = {
+            'frame': frame,
+            'version': version,
+            'bytes': int(frame.memory_usage(deep=True).sum())
+        }
+        self.entries.move_to_end(key)
+        # Evict least recently used sources, but always keep the one just loaded
+        total = sum(entry['bytes'] for entry in self.entries.values())
+        while total > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            total -= evicted['bytes']
+            self.evictions += 1
+
+transaction_cache = TransactionCache(app.config['TRANSACTION_CACHE_MAX_BYTES'])
+
 def get_data(limit=5000):
-    """Get data with memory optimization - load progressively"""
+    """Get data from the shared transaction cache - the first `limit` rows, or all of them for None"""
     if 'uploaded_data_file' in session:
         try:
-            # Read limited rows to save memory
-            df = pd.read_csv(session['uploaded_data_file'], nrows=limit)
-            print(f"Loaded {len(df)} rows from uploaded file (limited for memory)")
-            return df
+            df = transaction_cache.get_file_frame(session['uploaded_data_file'])
+            return df if limit is None else df.head(limit)
         except Exception:
             pass  # fallback to DB if file missing/corrupt
     
     try:
-        # Use SQLAlchemy query with LIMIT to prevent memory overflow
         with app.app_context():
-            # Query only limited transactions to save memory
-            transactions = Transaction.query.limit(limit).all()
-            if not transactions:
-                return pd.DataFrame()
-            
-            print(f"Loaded {len(transactions)} transactions from database (limited for memory)")
-            
-            # Convert to list of dictionaries
-            data = []
-            for txn in transactions:
-                data.append({
-                    'case_id': txn.case_id,
-                    'transaction_id': txn.transaction_id,
-                    'from_account': txn.from_account,
-                    'to_account': txn.to_account,
-                    'amount': txn.amount,
-                    'date': txn.date,
-                    'time': txn.time,
-                    'ip': txn.ip,
-                    'phone': txn.phone,
-                    'email': txn.email,
-                    'transaction_type': txn.transaction_type
-                })
-            
-            return pd.DataFrame(data)
+            df = transaction_cache.get_database_frame()
+            return df if limit is None else df.head(limit)
     except Exception as e:
         print(f"Database read error: {e}")
         # Return empty DataFrame if database fails
         return pd.DataFrame()
 
+# -------------------------
+# Full-Dataset Analysis
+# -------------------------
+app.config['FULL_DATASET_ANALYSIS'] = os.environ.get('FULL_DATASET_ANALYSIS', '1') == '1'
+app.config['AMOUNT_SAMPLE_SIZE'] = int(os.environ.get('AMOUNT_SAMPLE_SIZE', 200000))
+
+def use_full_dataset():
+    """Full-dataset mode unless the request asks for the quick sample with ?full=0"""
+    value = request.args.get('full')
+    if value is None:
+        return app.config['FULL_DATASET_ANALYSIS']
+    return value.lower() in ('1', 'true', 'yes')
+
+def iter_dataset_chunks(case_id=None, chunk_size=None, after_id=0, time_range=None, columns=None):
+    """Stream the active dataset (uploaded file or database) chunk by chunk.
+
+    Rows of an uploaded file without an id column are numbered from 1 in file order, so
+    `after_id` works as a cursor for both sources. `time_range` limits rows to a
+    parse_time_range window - an index range scan for the database. `columns` lets
+    uploaded files load only the columns the caller uses.
+    """
+    chunk_size = chunk_size or app.config['READ_CHUNK_SIZE']
+    path = session.get('uploaded_data_file')
+    if path and os.path.exists(path):
+        for chunk in iter_upload_chunks(path, chunk_size, after_id, columns, case_id, time_range):
+            yield chunk
+        return
+    for chunk in iter_transaction_chunks(after_id=after_id, chunk_size=chunk_size, case_id=case_id, time_range=time_range):
+        yield chunk
+
+class StreamingAccountAggregator:
+    """Per-account statistics accumulated chunk by chunk - memory grows with distinct accounts, not rows"""
+
+    IDENTITY_COLUMNS = ['ip', 'phone', 'email']
+
+    def __init__(self, sample_size=None, seed=42):
+        self.rows = 0
+        self.source_rows = 0  # including rows the detectors skip, e.g. without an amount
+        self.total_amount = 0.0
+        self.accounts = None
+        self.first_identity = None
+        self.identity_pairs = {col: None for col in self.IDENTITY_COLUMNS}
+        self.daily = None
+        self.edges = None
+        self.distinct = {col: set() for col in ['case_id'] + self.IDENTITY_COLUMNS}
+        self.all_accounts = set()
+        # Reservoir of amounts for percentile thresholds (exact until the reservoir fills)
+        self.sample = np.empty(sample_size or app.config['AMOUNT_SAMPLE_SIZE'])
+        self.sample_fill = 0
+        self.rng = np.random.default_rng(seed)
+
+    @staticmethod
+    def _combine(current, new, how):
+        if current is None:
+            return new
+        levels = list(range(new.index.nlevels))
+        return pd.concat([current, new]).groupby(level=levels).agg(how)
+
+    def _sample_amounts(self, values):
+        capacity = len(self.sample)
+        free = min(capacity - min(self.sample_fill, capacity), len(values))
+        if free:
+            self.sample[self.sample_fill:self.sample_fill + free] = values[:free]
+        rest = values[free:]
+        seen = self.sample_fill + free
+        if len(rest):
+            positions = seen + np.arange(1, len(rest) + 1)
+            accepted = self.rng.random(len(rest)) < capacity / positions
+            slots = self.rng.integers(0, capacity, int(accepted.sum()))
+            self.sample[slots] = rest[accepted]
+        self.sample_fill = seen + len(rest)
+
+    def update(self, chunk):
+        self.source_rows += len(chunk)
+        chunk = chunk.dropna(subset=['from_account', 'to_account', 'amount', 'date'], how='any')
+        if chunk.empty:
+            return
+        source = chunk['from_account'].astype(object).to_numpy()
+        target = chunk['to_account'].astype(object).to_numpy()
+        amount = chunk['amount'].astype('float64')
+        self.rows += len(chunk)
+        self.total_amount += float(amount.sum())
+        self._sample_amounts(amount.to_numpy())
+
+        stats = amount.groupby(source).agg(['count', 'sum', 'max'])
+        self.accounts = self._combine(self.accounts, stats, {'count': 'sum', 'sum': 'sum', 'max': 'max'})
+
+        identities = chunk[self.IDENTITY_COLUMNS].astype(object)
+        first = identities.groupby(source).first()
+        self.first_identity = first if self.first_identity is None else self.first_identity.combine_first(first)
+        for col in self.IDENTITY_COLUMNS:
+            pairs = pd.DataFrame({'account': source, 'value': identities[col].to_numpy()}).dropna().drop_duplicates()
+            current = self.identity_pairs[col]
+            self.identity_pairs[col] = pairs if current is None else pd.concat([current, pairs]).drop_duplicates()
+            self.distinct[col].update(pairs['value'].unique())
+        self.distinct['case_id'].update(chunk['case_id'].dropna().astype(object).unique())
+        self.all_accounts.update(np.unique(source))
+        self.all_accounts.update(np.unique(target))
+
+        daily = amount.groupby([source, transaction_days(chunk)]).sum()
+        self.daily = self._combine(self.daily, daily, 'sum')
+        edges = amount.groupby([source, target]).agg(['sum', 'count'])
+        self.edges = self._combine(self.edges, edges, {'sum': 'sum', 'count': 'sum'})
+
+    def consume(self, chunks):
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+    def identity_counts(self, col):
+        pairs = self.identity_pairs[col]
+        if pairs is None:
+            return pd.Series(dtype='int64')
+        return pairs.groupby('account')['value'].nunique()
+
+    def features(self):
+        """AccountFeatures for everything consumed so far"""
+        if self.accounts is None:
+            table = pd.DataFrame(columns=FEATURE_TABLE_COLUMNS)
+            edges = pd.DataFrame(columns=['sum', 'count'], index=pd.MultiIndex.from_tuples([], names=[None, None]))
+            daily = pd.Series(dtype='float64')
+        else:
+            table = self.accounts.rename(columns={'count': 'txn_count', 'sum': 'total_amount', 'max': 'max_amount'})
+            table['avg_amount'] = table['total_amount'] / table['txn_count']
+            table['unique_recipients'] = self.edges.groupby(level=0).size()
+            for col in self.IDENTITY_COLUMNS:
+                table[f'unique_{col}s'] = self.identity_counts(col).reindex(table.index, fill_value=0)
+            table['max_daily_amount'] = self.daily.groupby(level=0).max()
+            table = table.fillna(0).join(self.first_identity)
+            edges = self.edges
+            daily = self.daily
+        summary = {
+            'rows': self.rows,
+            'total_amount': self.total_amount,
+            'cases': len(self.distinct['case_id']),
+            'accounts': len(self.all_accounts),
+            'ips': len(self.distinct['ip']),
+            'phones': len(self.distinct['phone']),
+            'emails': len(self.distinct['email'])
+        }
+        amounts = self.sample[:min(self.sample_fill, len(self.sample))]
+        identity_accounts = {
+            col: pairs.groupby('value')['account'].nunique()
+            for col, pairs in self.identity_pairs.items() if pairs is not None
+        }
+        features = AccountFeatures(table[FEATURE_TABLE_COLUMNS], amounts, daily.to_numpy(), edges, summary, daily, identity_accounts)
+        features.derived['source_rows'] = self.source_rows
+        return features
+
+aml_engine = AMLEngine()
+
+def get_dataset_version(case_id=None, time_range=None):
+    """Identifies the active dataset so derived results can be cached until it changes"""
+    path = session.get('uploaded_data_file')
+    if path and os.path.exists(path):
+        stat = os.stat(path)
+        return ('file', path, stat.st_mtime_ns, stat.st_size, case_id, time_range)
+    return ('db', transaction_table_version(), case_id, time_range)
+
+ACCOUNT_FEATURE_SOURCE_COLUMNS = [
+    'case_id', 'from_account', 'to_account', 'amount', 'date', 'time', 'timestamp', 'ip', 'phone', 'email'
+]
+
+def get_account_features(case_id=None, time_range=None):
+    """Streamed AccountFeatures for the active dataset, cached per dataset version and time window"""
+    def builder():
+        chunks = iter_dataset_chunks(case_id=case_id, time_range=time_range, columns=ACCOUNT_FEATURE_SOURCE_COLUMNS)
+        return StreamingAccountAggregator().consume(chunks).features()
+    return aml_engine.account_features(version=get_dataset_version(case_id, time_range), builder=builder)
+
+def full_suspicious_accounts(case_id=None, time_range=None):
+    """Suspicious account details computed over every row of the dataset"""
+    features = get_account_features(case_id, time_range)
+    table = features.table
+    suspicious_accounts = []
+    if not table.empty:
+        by_count = table[table['txn_count'] > 5].sort_values('txn_count', ascending=False)
+        suspicious_accounts.extend(by_count.index[:20])
+        high_amount = table[table['max_amount'] > features.amount_quantile(0.95)]
+        suspicious_accounts.extend(account for account in high_amount.index[:20] if account not in suspicious_accounts)
+
+    suspicious_details = []
+    for account in suspicious_accounts[:30]:
+        row = table.loc[account]
+        suspicious_details.append({
+            'account': account,
+            'ip': '' if pd.isna(row['ip']) else row['ip'],
+            'phone': '' if pd.isna(row['phone']) else row['phone'],
+            'email': '' if pd.isna(row['email']) else row['email'],
+            'total_transactions': int(row['txn_count']),
+            'total_amount': float(row['total_amount'])
+        })
+    response = jsonify(suspicious_details)
+    response.headers['X-Rows-Analyzed'] = str(features.rows)
+    return response
+
+def full_layered_analysis(case_id=None, time_range=None):
+    """All detection layers computed over every row of the dataset"""
+    features = get_account_features(case_id, time_range)
+    layers = aml_engine.detect_layers(features)
+    layers['layer4_truncated'] = features.derived.get('circular_truncated', False)
+    layers['rows_analyzed'] = features.rows
+    return jsonify(layers)
+
+def full_statistics(case_id=None, time_range=None):
+    """Overall statistics computed over every row of the dataset"""
+    features = get_account_features(case_id, time_range)
+    summary = features.summary
+    return jsonify({
+        'total_transactions': summary['rows'],
+        'total_cases': summary['cases'],
+        'total_accounts': summary['accounts'],
+        'total_amount': summary['total_amount'],
+        'avg_amount': summary['total_amount'] / summary['rows'] if summary['rows'] else 0,
+        'unique_ips': summary['ips'],
+        'unique_phones': summary['phones'],
+        'unique_emails': summary['emails'],
+        'rows_analyzed': summary['rows']
+    })
+
 @protected_api_route('/api/suspicious')
 def suspicious_accounts():
     try:
-        # Load limited data for memory efficiency
+        if use_full_dataset():
+            return full_suspicious_accounts(request.args.get('case_id'), request_time_range())
+
+        # Quick sample of the first rows only
         df = get_data(limit=3000)  # Reduced limit for suspicious accounts
         print(f"Debug: DataFrame shape: {df.shape}")
         
@@ -457,7 +2081,9 @@ def suspicious_accounts():
             })
         
         print(f"Debug: Found {len(suspicious_details)} suspicious accounts")
-        return jsonify(suspicious_details)
+        response = jsonify(suspicious_details)
+        response.headers['X-Rows-Analyzed'] = str(len(df))
+        return response
     except Exception as e:
         print(f"Error in suspicious_accounts: {e}")
         import traceback
@@ -467,7 +2093,10 @@ def suspicious_accounts():
 @protected_api_route('/api/layered-analysis')
 def layered_analysis():
     try:
-        # Load limited data for memory efficiency
+        if use_full_dataset():
+            return full_layered_analysis(request.args.get('case_id'), request_time_range())
+
+        # Quick sample of the first rows only
         df = get_data(limit=4000)  # Reduced limit for layered analysis
         
         # Clean data: drop rows with missing critical columns
@@ -478,7 +2107,8 @@ def layered_analysis():
                 'layer2_large_amounts': [],
                 'layer3_multi_identity': [],
                 'layer4_circular': [],
-                'layer5_rapid_movement': []
+                'layer5_rapid_movement': [],
+                'rows_analyzed': 0
             })
         
         # Use simpler detection methods for memory efficiency
@@ -505,7 +2135,8 @@ def layered_analysis():
             'layer3_multi_identity': multi_identity_accounts,
             'layer4_circular': [],  # Simplified - skip complex detection
             'layer5_rapid_movement': [],  # Simplified - skip complex detection
-            'note': 'Simplified analysis for memory optimization'
+            'rows_analyzed': len(df),
+            'note': 'Sampled analysis - request without full=0 to analyze every row'
         })
     except Exception as e:
         print(f"Error in layered_analysis: {e}")
@@ -518,126 +2149,378 @@ def layered_analysis():
             'error': str(e)
         })
 
+# -------------------------
+# Spider Map Construction
+# -------------------------
+app.config['SPIDER_MAP_MAX_NODES'] = int(os.environ.get('SPIDER_MAP_MAX_NODES', 2000))
+app.config['SPIDER_LAYOUT_ITERATIONS'] = int(os.environ.get('SPIDER_LAYOUT_ITERATIONS', 60))
+app.config['SPIDER_LAYOUT_CACHE_SIZE'] = int(os.environ.get('SPIDER_LAYOUT_CACHE_SIZE', 32))
+SPIDER_LAYOUT_METHODS = ('force', 'hierarchical')
+spider_layout_cache = OrderedDict()
+spider_layout_lock = threading.Lock()
+
+def classify_map_nodes(metrics):
+    """Vectorized node_type and suspicious flags for spider map nodes"""
+    node_type = np.select(
+        [
+            metrics['total_degree'] > 5,
+            metrics['out_amount'] > 10000,
+            metrics['in_degree'] == 0,
+            metrics['out_degree'] == 0
+        ],
+        ['hub', 'high_value', 'source', 'sink'],
+        default='normal'
+    )
+    suspicious = (
+        (metrics['total_degree'] > 8) |
+        (metrics['out_amount'] > 50000) |
+        ((metrics['in_degree'] == 0) & (metrics['out_degree'] > 3))
+    )
+    return node_type, suspicious.to_numpy()
+
+def spider_map_elements(graph, df, keep, active=None):
+    """Cytoscape nodes and edges for the accounts selected by the boolean mask `keep`.
+
+    `df` must be the frame the graph was built from, so transfer indices line up with its rows.
+    `active` optionally restricts edges to a boolean mask over the graph's account pairs.
+    """
+    metrics = graph.node_metrics()
+    node_type, suspicious = classify_map_nodes(metrics)
+    identities = node_identity_table(df).reindex(graph.accounts)
+    codes = np.flatnonzero(keep)
+
+    columns = {col: metrics[col].to_numpy()[codes].tolist() for col in metrics.columns}
+    ids = graph.accounts[codes]
+    account_type = identities['account_type'].to_numpy()[codes]
+    ip = identities['ip'].to_numpy()[codes]
+    phone = identities['phone'].to_numpy()[codes]
+    email = identities['email'].to_numpy()[codes]
+    nodes = [
+        {
+            'data': {
+                'id': str(ids[i]),
+                'account_type': account_type[i],
+                'node_type': node_type[code],
+                'ip': str(ip[i]),
+                'phone': str(phone[i]),
+                'email': str(email[i]),
+                'in_degree': columns['in_degree'][i],
+                'out_degree': columns['out_degree'][i],
+                'total_degree': columns['total_degree'][i],
+                'in_amount': columns['in_amount'][i],
+                'out_amount': columns['out_amount'][i],
+                'net_flow': columns['net_flow'][i]
+            }
+        }
+        for i, code in enumerate(codes.tolist())
+    ]
+
+    # One edge per account pair, labelled with its most recent transfer
+    pair_source = np.repeat(np.arange(graph.num_nodes), np.diff(graph.pair_offsets))
+    selected = keep[pair_source] & keep[graph.pair_target]
+    if active is not None:
+        selected &= active
+    pairs = np.flatnonzero(selected)
+    latest = graph.out_edges[graph.pair_end[pairs] - 1]
+    sources = graph.accounts[pair_source[pairs]]
+    targets = graph.accounts[graph.pair_target[pairs]]
+    weights = graph.pair_weight[pairs].tolist()
+    counts = (graph.pair_end[pairs] - graph.pair_start[pairs]).tolist()
+    dates = df['date'].to_numpy()[latest]
+    times = df['time'].to_numpy()[latest]
+    txn_ids = df['transaction_id'].to_numpy()[latest]
+    edges = [
+        {
+            'data': {
+                'source': str(sources[i]),
+                'target': str(targets[i]),
+                'weight': weights[i],
+                'transaction_count': counts[i],
+                'date': str(dates[i]),
+                'time': str(times[i]),
+                'transaction_id': str(txn_ids[i])
+            }
+        }
+        for i in range(len(pairs))
+    ]
+    suspicious_nodes = [str(account) for account in graph.accounts[codes[suspicious[codes]]]]
+    return nodes, edges, suspicious_nodes
+
+def map_neighbourhood(graph, active, focus, radius):
+    """Accounts within `radius` hops of `focus` (either direction) over the active account pairs"""
+    pair_source = np.repeat(np.arange(graph.num_nodes), np.diff(graph.pair_offsets))
+    reached = np.zeros(graph.num_nodes, dtype=bool)
+    reached[focus] = True
+    frontier = reached.copy()
+    for _ in range(radius):
+        step = np.zeros(graph.num_nodes, dtype=bool)
+        step[graph.pair_target[active & frontier[pair_source]]] = True
+        step[pair_source[active & frontier[graph.pair_target]]] = True
+        frontier = step & ~reached
+        if not frontier.any():
+            break
+        reached |= frontier
+    return reached
+
+def map_link_counts(graph, active, scope):
+    """Number of active account pairs each account has inside `scope`"""
+    pair_source = np.repeat(np.arange(graph.num_nodes), np.diff(graph.pair_offsets))
+    inside = active & scope[pair_source] & scope[graph.pair_target]
+    return (
+        np.bincount(pair_source[inside], minlength=graph.num_nodes) +
+        np.bincount(graph.pair_target[inside], minlength=graph.num_nodes)
+    )
+
+def map_core(graph, active, scope, k):
+    """Peel `scope` down to its k-core: accounts with at least k active links to other members"""
+    core = scope.copy()
+    while k > 0:
+        weak = core & (map_link_counts(graph, active, core) < k)
+        if not weak.any():
+            break
+        core &= ~weak
+    return core
+
+def select_map_view(graph, metrics, focus=None, radius=2, max_nodes=None, min_amount=0, min_core=0):
+    """Choose the accounts and account pairs to draw for one level of detail.
+
+    Pairs moving less than `min_amount` in total are pruned first. The scope is the whole graph,
+    or the `radius`-hop neighbourhood of `focus`. Within the scope, accounts outside the
+    `min_core`-core are dropped and the `max_nodes` highest-flow accounts are kept. Returns
+    (keep, active, scope) boolean masks; the focus account is always kept.
+    """
+    max_nodes = max_nodes or app.config['SPIDER_MAP_MAX_NODES']
+    active = graph.pair_weight >= min_amount
+    scope = map_link_counts(graph, active, np.ones(graph.num_nodes, dtype=bool)) > 0
+    if focus is not None:
+        scope = map_neighbourhood(graph, active, focus, radius)
+    core = map_core(graph, active, scope, min_core)
+    if focus is not None:
+        core[focus] = True
+
+    keep = core
+    if core.sum() > max_nodes:
+        flow = (metrics['in_amount'] + metrics['out_amount']).to_numpy()
+        flow = np.where(core, flow, -np.inf)
+        if focus is not None:
+            flow[focus] = np.inf
+        keep = np.zeros(graph.num_nodes, dtype=bool)
+        keep[np.argsort(-flow, kind='stable')[:max_nodes]] = True
+    return keep, active, scope
+
+def collapse_map_leaves(graph, keep, active, scope):
+    """Aggregate nodes and edges for hidden leaf accounts hanging off drawn accounts.
+
+    A leaf is an account in scope with a single active link. Leaves sending to the same drawn
+    account become one "senders" node, leaves receiving from it one "receivers" node.
+    """
+    pair_source = np.repeat(np.arange(graph.num_nodes), np.diff(graph.pair_offsets))
+    leaf = scope & ~keep & (map_link_counts(graph, active, scope) == 1)
+    transfers = graph.pair_end - graph.pair_start
+    nodes, edges = [], []
+    collapsed = 0
+    for direction, leaves, anchors in (
+        ('senders', pair_source, graph.pair_target),
+        ('receivers', graph.pair_target, pair_source)
+    ):
+        pairs = active & leaf[leaves] & keep[anchors]
+        if not pairs.any():
+            continue
+        members = np.bincount(anchors[pairs], minlength=graph.num_nodes)
+        weight = np.bincount(anchors[pairs], weights=graph.pair_weight[pairs], minlength=graph.num_nodes)
+        count = np.bincount(anchors[pairs], weights=transfers[pairs], minlength=graph.num_nodes)
+        collapsed += int(pairs.sum())
+        for code in np.flatnonzero(members).tolist():
+            account = str(graph.accounts[code])
+            node_id = f'{account}::{direction}'
+            amount = float(weight[code])
+            nodes.append({
+                'data': {
+                    'id': node_id,
+                    'label': f'{int(members[code])} {direction}',
+                    'node_type': 'aggregate',
+                    'account_type': direction,
+                    'member_count': int(members[code]),
+                    'ip': '', 'phone': '', 'email': '',
+                    'in_degree': int(members[code]) if direction == 'receivers' else 0,
+                    'out_degree': int(members[code]) if direction == 'senders' else 0,
+                    'total_degree': int(members[code]),
+                    'in_amount': amount if direction == 'receivers' else 0.0,
+                    'out_amount': amount if direction == 'senders' else 0.0,
+                    'net_flow': amount if direction == 'senders' else -amount
+                }
+            })
+            source, target = (node_id, account) if direction == 'senders' else (account, node_id)
+            edges.append({
+                'data': {
+                    'source': source,
+                    'target': target,
+                    'weight': amount,
+                    'transaction_count': int(count[code]),
+                    'aggregate': True
+                }
+            })
+    return nodes, edges, collapsed
+
+def force_directed_positions(count, source, target, weight, iterations=None, seed=42):
+    """Fruchterman-Reingold layout with vectorized forces; repulsion is computed in row blocks"""
+    iterations = iterations or app.config['SPIDER_LAYOUT_ITERATIONS']
+    rng = np.random.default_rng(seed)
+    pos = rng.random((count, 2))
+    if count < 2:
+        return pos
+    k = np.sqrt(1.0 / count)
+    # Heavier pairs pull harder, on a log scale so a few large transfers don't dominate
+    pull = np.log1p(np.asarray(weight, dtype='float64'))
+    pull = 0.5 + pull / pull.max() if len(pull) and pull.max() > 0 else np.ones(len(source))
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    block = 512
+    for _ in range(iterations):
+        displacement = np.zeros((count, 2))
+        # Repulsion is the O(n^2) part; float32 halves its memory traffic
+        x, y = pos[:, 0].astype('float32'), pos[:, 1].astype('float32')
+        for start in range(0, count, block):
+            dx = x[start:start + block, None] - x[None, :]
+            dy = y[start:start + block, None] - y[None, :]
+            repulsion = np.float32(k * k) / np.maximum(dx * dx + dy * dy, np.float32(1e-4))
+            displacement[start:start + block, 0] = (dx * repulsion).sum(axis=1)
+            displacement[start:start + block, 1] = (dy * repulsion).sum(axis=1)
+        delta = pos[source] - pos[target]
+        distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 0.01)
+        force = delta * (distance * pull / k)[:, None]
+        for axis in range(2):
+            displacement[:, axis] -= np.bincount(source, weights=force[:, axis], minlength=count)
+            displacement[:, axis] += np.bincount(target, weights=force[:, axis], minlength=count)
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 0.01)
+        pos += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+    return pos
+
+def hierarchical_positions(count, source, target):
+    """Layered layout: strongly connected groups share a layer, layers follow the money downstream"""
+    G = nx.DiGraph()
+    G.add_nodes_from(range(count))
+    G.add_edges_from(zip(source.tolist(), target.tolist()))
+    condensed = nx.condensation(G)
+    members = condensed.graph['mapping']
+    layer = {}
+    for depth, generation in enumerate(nx.topological_generations(condensed)):
+        for component in generation:
+            layer[component] = depth
+    pos = np.zeros((count, 2))
+    order = {}
+    levels = {}
+    for node in range(count):
+        levels.setdefault(layer[members[node]], []).append(node)
+    for depth in sorted(levels):
+        # Barycentre ordering: place each node under the average slot of its upstream neighbours
+        def barycentre(node):
+            slots = [order[p] for p in G.predecessors(node) if p in order]
+            return sum(slots) / len(slots) if slots else float('inf')
+        row = sorted(levels[depth], key=lambda node: (barycentre(node), node))
+        for slot, node in enumerate(row):
+            order[node] = slot - (len(row) - 1) / 2
+            pos[node] = (order[node], depth)
+    return pos
+
+def map_layout_positions(nodes, edges, method):
+    """Positions in Cytoscape pixel coordinates for the given map elements"""
+    ids = [node['data']['id'] for node in nodes]
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    source = np.array([index[edge['data']['source']] for edge in edges], dtype='int64')
+    target = np.array([index[edge['data']['target']] for edge in edges], dtype='int64')
+    weight = np.array([edge['data']['weight'] for edge in edges], dtype='float64')
+    if method == 'hierarchical':
+        pos = hierarchical_positions(len(ids), source, target) * np.array([90.0, 140.0])
+    else:
+        pos = force_directed_positions(len(ids), source, target, weight)
+        span = np.ptp(pos, axis=0) if len(ids) else np.ones(2)
+        size = max(800.0, 60.0 * np.sqrt(len(ids)))
+        pos = (pos - pos.min(axis=0)) / np.where(span > 0, span, 1) * size if len(ids) else pos
+    return {node_id: {'x': round(float(x), 1), 'y': round(float(y), 1)} for node_id, (x, y) in zip(ids, pos)}
+
+def cached_map_layout(key, nodes, edges, method):
+    """Layout positions reused for the same dataset version, view parameters and method"""
+    with spider_layout_lock:
+        if key in spider_layout_cache:
+            spider_layout_cache.move_to_end(key)
+            return spider_layout_cache[key]
+    positions = map_layout_positions(nodes, edges, method)
+    with spider_layout_lock:
+        spider_layout_cache[key] = positions
+        while len(spider_layout_cache) > app.config['SPIDER_LAYOUT_CACHE_SIZE']:
+            spider_layout_cache.popitem(last=False)
+    return positions
+
 @protected_api_route('/api/spider-map')
 def spider_map():
     """Get spider map data for visualization with enhanced interpretation"""
     try:
-        df = get_data()
+        max_nodes = max(1, request.args.get('max_nodes', app.config['SPIDER_MAP_MAX_NODES'], type=int))
+        case_id = request.args.get('case_id')
+        focus_account = request.args.get('focus')
+        radius = min(max(request.args.get('radius', 2, type=int), 1), 6)
+        min_amount = request.args.get('min_amount', 0, type=float)
+        min_core = max(request.args.get('min_core', 0, type=int), 0)
+        collapse_leaves = request.args.get('collapse_leaves', '1') != '0'
+        layout = request.args.get('layout')
+        if layout is not None and layout not in SPIDER_LAYOUT_METHODS:
+            return jsonify({'nodes': [], 'edges': [], 'error': f'Unknown layout {layout}; use one of {", ".join(SPIDER_LAYOUT_METHODS)}.'}), 400
+        df = get_data(limit=None)
+        if df.empty:
+            return jsonify({'nodes': [], 'edges': [], 'error': 'No valid transactions to display.'})
+        if case_id is not None:
+            df = df[df['case_id'].astype(str) == case_id]
         # Filter out transactions with UNKNOWN from_account or to_account
+        df = df.dropna(subset=['from_account', 'to_account'], how='any')
         df = df[(df['from_account'] != 'UNKNOWN') & (df['to_account'] != 'UNKNOWN')]
+        df = df.assign(amount=df['amount'].fillna(0)).reset_index(drop=True)
         
         if len(df) == 0:
             return jsonify({'nodes': [], 'edges': [], 'error': 'No valid transactions to display.'})
-        
-        # Use much smaller sample for memory efficiency
-        df_sample = df.head(200)  # Reduced from 500 to 200 for memory
-        print(f"Debug: Using {len(df_sample)} transactions for spider map")
-        
-        # Simple graph building without complex AMLEngine
-        G = nx.DiGraph()
-        
-        # Add nodes and edges
-        for _, row in df_sample.iterrows():
-            G.add_node(row['from_account'], account_type='source')
-            G.add_node(row['to_account'], account_type='destination')
-            G.add_edge(row['from_account'], row['to_account'], 
-                      weight=float(row['amount']) if pd.notna(row['amount']) else 0,
-                      date=str(row['date']),
-                      time=str(row['time']),
-                      transaction_id=str(row['transaction_id']))
-
-        if len(G) == 0:
-            return jsonify({'nodes': [], 'edges': [], 'error': 'No valid transactions to display.'})
 
-        # Calculate node metrics for interpretation
-        node_metrics = {}
-        for node in G.nodes():
-            in_degree = len(list(G.in_edges(node)))
-            out_degree = len(list(G.out_edges(node)))
-            total_degree = in_degree + out_degree
-            
-            # Calculate total money flow through this node
-            in_amount = sum(data.get('weight', 0) for _, _, data in G.in_edges(node, data=True))
-            out_amount = sum(data.get('weight', 0) for _, _, data in G.out_edges(node, data=True))
-            
-            node_metrics[node] = {
-                'in_degree': in_degree,
-                'out_degree': out_degree,
-                'total_degree': total_degree,
-                'in_amount': in_amount,
-                'out_amount': out_amount,
-                'net_flow': out_amount - in_amount
-            }
-
-        # Build node and edge lists for Cytoscape with enhanced data
-        nodes = []
-        for node in G.nodes():
-            node_data = G.nodes[node]
-            metrics = node_metrics[node]
-            
-            # Determine node type for visualization
-            node_type = 'normal'
-            if metrics['total_degree'] > 5:
-                node_type = 'hub'
-            elif metrics['out_amount'] > 10000:
-                node_type = 'high_value'
-            elif metrics['in_degree'] == 0:
-                node_type = 'source'
-            elif metrics['out_degree'] == 0:
-                node_type = 'sink'
-            
-            nodes.append({
-                'data': {
-                    'id': str(node),
-                    'account_type': node_data.get('account_type', 'unknown'),
-                    'node_type': node_type,
-                    'ip': str(node_data.get('ip', '')),
-                    'phone': str(node_data.get('phone', '')),
-                    'email': str(node_data.get('email', '')),
-                    'in_degree': metrics['in_degree'],
-                    'out_degree': metrics['out_degree'],
-                    'total_degree': metrics['total_degree'],
-                    'in_amount': metrics['in_amount'],
-                    'out_amount': metrics['out_amount'],
-                    'net_flow': metrics['net_flow']
-                }
-            })
+        graph = TransactionGraph.from_frame(df)
+        metrics = graph.node_metrics()
+        focus = None
+        if focus_account:
+            focus = graph.code(focus_account)
+            if focus is None:
+                return jsonify({'nodes': [], 'edges': [], 'error': f'Account {focus_account} not found.'}), 404
+        keep, active, scope = select_map_view(
+            graph, metrics, focus=focus, radius=radius, max_nodes=max_nodes,
+            min_amount=min_amount, min_core=min_core
+        )
+        print(f"Debug: Using {len(df)} transactions ({int(keep.sum())} of {graph.num_nodes} accounts) for spider map")
 
-        edges = []
-        for source, target, data in G.edges(data=True):
-            edges.append({
-                'data': {
-                    'source': str(source),
-                    'target': str(target),
-                    'weight': float(data.get('weight', 0)),
-                    'date': str(data.get('date', '')),
-                    'time': str(data.get('time', '')),
-                    'transaction_id': str(data.get('transaction_id', ''))
-                }
-            })
+        nodes, edges, suspicious_nodes = spider_map_elements(graph, df, keep, active)
+        drawn_amount = float(sum(edge['data']['weight'] for edge in edges))
+        collapsed = 0
+        if collapse_leaves:
+            aggregate_nodes, aggregate_edges, collapsed = collapse_map_leaves(graph, keep, active, scope)
+            nodes.extend(aggregate_nodes)
+            edges.extend(aggregate_edges)
 
-        # Calculate graph statistics for interpretation
-        total_nodes = len(nodes)
-        total_edges = len(edges)
-        total_amount = sum(edge['data']['weight'] for edge in edges)
-        
-        # Find suspicious patterns
-        suspicious_nodes = []
-        for node in nodes:
-            node_data = node['data']
-            if (node_data['total_degree'] > 8 or 
-                node_data['out_amount'] > 50000 or 
-                node_data['in_degree'] == 0 and node_data['out_degree'] > 3):
-                suspicious_nodes.append(node_data['id'])
+        if layout is not None:
+            view = (case_id, focus_account, radius, max_nodes, min_amount, min_core, collapse_leaves)
+            positions = cached_map_layout((get_dataset_version(case_id), view, layout), nodes, edges, layout)
+            for node in nodes:
+                node['position'] = positions[node['data']['id']]
 
         return jsonify({
             'nodes': nodes, 
             'edges': edges,
+            'layout': 'preset' if layout is not None else None,
             'statistics': {
-                'total_nodes': total_nodes,
-                'total_edges': total_edges,
-                'total_amount': total_amount,
-                'suspicious_nodes': suspicious_nodes
+                'total_nodes': len(nodes),
+                'total_edges': len(edges),
+                'total_amount': drawn_amount,
+                'suspicious_nodes': suspicious_nodes,
+                'accounts_in_dataset': graph.num_nodes,
+                'accounts_in_view': int(scope.sum()),
+                'collapsed_accounts': collapsed,
+                'hidden_accounts': int(scope.sum() - keep.sum()) - collapsed,
+                'rows_analyzed': len(df)
             }
         })
     except Exception as e:
@@ -647,32 +2530,57 @@ def spider_map():
 @protected_api_route('/api/money-trail/<account>')
 def money_trail(account):
     """Find money trail from a specific account"""
-    df = get_data()
-    aml_engine = AMLEngine()
-    trails = aml_engine.find_money_trail(df, account, max_depth=3)
+    max_depth = max(1, min(request.args.get('max_depth', 3, type=int), 10))
+    max_fanout = request.args.get('max_fanout', 20, type=int)
+    max_paths = request.args.get('max_paths', 1000, type=int)
+    if max_paths < 1:
+        return jsonify({'error': 'max_paths must be at least 1'}), 400
+    time_ordered = request.args.get('time_ordered', '0').lower() in ('1', 'true', 'yes')
+    case_id = request.args.get('case_id')
+
+    def loader():
+        df = get_data(limit=None)
+        if case_id is not None and not df.empty:
+            df = df[df['case_id'].astype(str) == case_id]
+        return df
+
+    graph = aml_engine.transaction_graph(version=get_dataset_version(case_id), loader=loader)
+    trails = aml_engine.find_money_trail(
+        None, account, max_depth=max_depth, max_fanout=max_fanout if max_fanout > 0 else None,
+        time_ordered=time_ordered, max_paths=max_paths, graph=graph
+    )
     
     return jsonify({
         'account': account,
         'trails': trails,
-        'trail_count': len(trails)
+        'trail_count': len(trails),
+        'truncated': len(trails) >= max_paths,
+        'rows_analyzed': graph.num_edges
     })
 
-@protected_api_route('/api/filter', methods=['POST'])
-def filter_transactions():
-    """Enhanced filtering with multiple criteria"""
-    data = request.get_json()
-    df = get_data()
-    case_id = data.get('case_id')
-    ip = data.get('ip')
-    phone = data.get('phone')
-    email = data.get('email')
-    account = data.get('account')
-    min_amount = data.get('min_amount')
-    max_amount = data.get('max_amount')
-    date_from = data.get('date_from')
-    date_to = data.get('date_to')
-    
-    # Use DataFrame filtering instead of SQLAlchemy
+@protected_api_route('/api/cache-stats')
+def cache_stats():
+    """Hit/miss counters and memory use of the transaction cache"""
+    return jsonify(transaction_cache.stats())
+
+# -------------------------
+# Transaction Filtering
+# -------------------------
+app.config['FILTER_PAGE_SIZE'] = int(os.environ.get('FILTER_PAGE_SIZE', 1000))
+app.config['FILTER_MAX_RESULTS'] = int(os.environ.get('FILTER_MAX_RESULTS', 5000))
+FILTER_STREAM_FORMATS = ('ndjson', 'json')
+
+def apply_transaction_filters(df, filters):
+    """Apply /api/filter predicates to a transaction frame"""
+    case_id = filters.get('case_id')
+    ip = filters.get('ip')
+    phone = filters.get('phone')
+    email = filters.get('email')
+    account = filters.get('account')
+    min_amount = filters.get('min_amount')
+    max_amount = filters.get('max_amount')
+    time_range = parse_time_range(filters.get('date_from'), filters.get('date_to'))
+
     if case_id:
         df = df[df['case_id'] == case_id]
     if ip:
@@ -687,17 +2595,233 @@ def filter_transactions():
         df = df[df['amount'] >= float(min_amount)]
     if max_amount:
         df = df[df['amount'] <= float(max_amount)]
-    if date_from:
-        df = df[df['date'] >= date_from]
-    if date_to:
-        df = df[df['date'] <= date_to]
-    
-    results = df.to_dict(orient='records')
-    return jsonify(results)
+    if time_range is not None:
+        df = df[timestamp_mask(transaction_timestamps(df), time_range).to_numpy()]
+    return df
+
+def build_filter_query(filters, columns=None, after_id=0, limit=None):
+    """Parameterized SELECT over the Transaction table for /api/filter predicates, in id order"""
+    table = Transaction.__table__
+    names = columns or ['id'] + TRANSACTION_COLUMNS
+    missing = [name for name in names if name not in table.c]
+    if missing:
+        raise ValueError(f"Unknown columns: {', '.join(missing)}")
+    query = db.select(*[table.c[name] for name in names])
+    conditions = [table.c.id > after_id] if after_id else []
+    for name in ('case_id', 'ip', 'phone', 'email'):
+        if filters.get(name):
+            conditions.append(table.c[name] == str(filters[name]))
+    account = filters.get('account')
+    if account:
+        conditions.append(db.or_(table.c.from_account == account, table.c.to_account == account))
+    # Exact integer-cent comparisons, falling back to amount for rows not yet backfilled. Pages come
+    # in id order, so the plan walks the primary key and checks these per row until the page is full
+    for key, bound in (('min_amount', operator.ge), ('max_amount', operator.le)):
+        if filters.get(key):
+            cents = int(round(float(filters[key]) * 100))
+            conditions.append(db.or_(
+                bound(table.c.amount_cents, cents),
+                db.and_(table.c.amount_cents.is_(None), bound(table.c.amount, cents / 100))
+            ))
+    time_range = parse_time_range(filters.get('date_from'), filters.get('date_to'))
+    conditions.extend(transaction_time_conditions(table, time_range))
+    query = query.where(*conditions).order_by(table.c.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query, names
+
+def sql_records(names, rows):
+    """Result rows as dicts with datetimes as ISO strings, matching frame_to_records"""
+    return [
+        {name: value.isoformat(timespec='seconds') if isinstance(value, datetime) else value for name, value in zip(names, row)}
+        for row in rows
+    ]
+
+def explain_query(query):
+    """Query plan lines from the database for a SELECT, to confirm a filter is served by an index"""
+    dialect = db.engine.dialect
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    sql = str(query.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + sql).fetchall()
+    plan = [' '.join(str(value) for value in row) for row in rows]
+    return {
+        'sql': sql,
+        'plan': plan,
+        'uses_index': any('INDEX' in line.upper() or 'PRIMARY KEY' in line.upper() for line in plan)
+    }
+
+def parse_filter_columns(value):
+    """Column projection from a list or a comma separated string; None keeps every column"""
+    if not value:
+        return None
+    columns = value.split(',') if isinstance(value, str) else list(value)
+    columns = [str(col).strip() for col in columns if str(col).strip()]
+    return ['id'] + [col for col in columns if col != 'id']
+
+def json_safe_records(df):
+    """frame_to_records with missing values as null so every line is valid JSON"""
+    df = iso_datetime_columns(df)
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+def iter_frame_filter_pages(filters, after_id=0, limit=None, columns=None):
+    """DataFrame fallback of iter_filtered_pages for uploaded-file sessions"""
+    remaining = limit
+    last_id = after_id
+    has_more = False
+    case_id = filters.get('case_id')
+    for chunk in iter_dataset_chunks(case_id=str(case_id) if case_id else None, after_id=after_id):
+        # case_id is already applied by the reader
+        chunk = apply_transaction_filters(chunk, {**filters, 'case_id': None})
+        if chunk.empty:
+            continue
+        if remaining == 0:
+            has_more = True
+            break
+        if len(chunk) > remaining:
+            has_more = True
+            chunk = chunk.iloc[:remaining]
+        if columns is not None:
+            missing = [col for col in columns if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"Unknown columns: {', '.join(missing)}")
+            chunk = chunk[columns]
+        remaining -= len(chunk)
+        last_id = int(chunk['id'].iloc[-1])
+        yield json_safe_records(chunk), last_id
+        if has_more:
+            break
+    yield None, {'next_after_id': last_id if has_more else None, 'has_more': has_more}
+
+def iter_sql_filter_pages(filters, after_id=0, limit=None, columns=None):
+    """Database path of iter_filtered_pages: one indexed query, fetched in READ_CHUNK_SIZE batches"""
+    query, names = build_filter_query(filters, columns=columns, after_id=after_id, limit=limit + 1)
+    chunk_size = app.config['READ_CHUNK_SIZE']
+    remaining = limit
+    last_id = after_id
+    has_more = False
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            if len(rows) > remaining:
+                has_more = True
+                rows = rows[:remaining]
+            remaining -= len(rows)
+            if rows:
+                last_id = rows[-1][0]
+                yield sql_records(names, rows), last_id
+            if has_more:
+                break
+    yield None, {'next_after_id': last_id if has_more else None, 'has_more': has_more}
+
+def iter_filtered_pages(filters, after_id=0, limit=None, columns=None):
+    """Yield (records, cursor) for matching rows in id order, then a final (None, cursor).
+
+    Database rows come from one parameterized query; uploaded files are read chunk by chunk
+    and filtered in pandas. Either way at most `limit` rows plus one look-ahead match are read,
+    so memory is bounded by the chunk size rather than the result size.
+    """
+    limit = limit or app.config['FILTER_PAGE_SIZE']
+    path = session.get('uploaded_data_file')
+    if path and os.path.exists(path):
+        return iter_frame_filter_pages(filters, after_id=after_id, limit=limit, columns=columns)
+    return iter_sql_filter_pages(filters, after_id=after_id, limit=limit, columns=columns)
+
+def stream_filter_response(filters, after_id, limit, columns, fmt):
+    """Chunked HTTP response for one page of /api/filter results"""
+    pages = iter_filtered_pages(filters, after_id=after_id, limit=limit, columns=columns)
+    # Pull the first page before sending headers so bad column names still get a 400
+    first = next(pages)
+
+    def generate():
+        count = 0
+        opened = False
+        for records, cursor in itertools.chain([first], pages):
+            if records is None:
+                if fmt == 'ndjson':
+                    yield json.dumps({'cursor': cursor}) + '\n'
+                else:
+                    if not opened:
+                        yield '{"rows": ['
+                    yield '], ' + json.dumps({'count': count, **cursor})[1:]
+                return
+            if fmt == 'ndjson':
+                yield ''.join(json.dumps(record, default=str) + '\n' for record in records)
+            else:
+                body = ', '.join(json.dumps(record, default=str) for record in records)
+                yield ('{"rows": [' if not opened else ', ') + body
+                opened = True
+            count += len(records)
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+@protected_api_route('/api/filter', methods=['POST'])
+def filter_transactions():
+    """Enhanced filtering with multiple criteria.
+
+    Without paging parameters up to FILTER_MAX_RESULTS matches are returned as one JSON array.
+    With `stream` (ndjson|json), `limit`, `after_id` or `columns` the whole dataset is paged
+    through by id cursor and streamed as it is read. `explain` returns the database query plan.
+    Database rows are filtered in SQL; uploaded files fall back to pandas.
+    """
+    data = request.get_json(silent=True) or {}
+    options = {**request.args.to_dict(), **data}
+    fmt = options.get('stream')
+    paged = fmt or any(options.get(key) not in (None, '') for key in ('limit', 'after_id', 'columns'))
+    uploaded = session.get('uploaded_data_file')
+    from_file = bool(uploaded and os.path.exists(uploaded))
+    if str(options.get('explain', '')).lower() in ('1', 'true', 'yes'):
+        if from_file:
+            return jsonify({'error': 'Query plans are only available for the database.'}), 400
+        try:
+            query, _ = build_filter_query(data, limit=app.config['FILTER_MAX_RESULTS'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(explain_query(query))
+    if not paged:
+        try:
+            if from_file:
+                df = apply_transaction_filters(get_data(limit=None), data).head(app.config['FILTER_MAX_RESULTS'])
+                results = frame_to_records(df)
+                return jsonify(results)
+            query, names = build_filter_query(data, limit=app.config['FILTER_MAX_RESULTS'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        with db.engine.connect() as conn:
+            results = sql_records(names, conn.execute(query))
+        return jsonify(results)
+
+    fmt = fmt or ('ndjson' if 'application/x-ndjson' in request.headers.get('Accept', '') else 'json')
+    if fmt not in FILTER_STREAM_FORMATS:
+        return jsonify({'error': f"Unknown stream format {fmt}; use one of {', '.join(FILTER_STREAM_FORMATS)}."}), 400
+    try:
+        limit = int(options.get('limit') or app.config['FILTER_PAGE_SIZE'])
+        after_id = int(options.get('after_id') or 0)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limit and after_id must be integers.'}), 400
+    if limit < 1 or after_id < 0:
+        return jsonify({'error': 'limit must be positive and after_id non-negative.'}), 400
+    try:
+        return stream_filter_response(data, after_id, limit, parse_filter_columns(options.get('columns')), fmt)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 @protected_api_route('/api/cases')
 def get_cases():
     """Get all unique cases"""
+    if use_full_dataset():
+        cases = set()
+        rows = 0
+        for chunk in iter_dataset_chunks(columns=['case_id']):
+            cases.update(chunk['case_id'].dropna().astype(object).unique())
+            rows += len(chunk)
+        response = jsonify(sorted(cases, key=str))
+        response.headers['X-Rows-Analyzed'] = str(rows)
+        return response
     df = get_data()
     cases = df['case_id'].unique().tolist()
     return jsonify(cases)
@@ -706,7 +2830,10 @@ def get_cases():
 def get_statistics():
     """Get overall statistics with memory optimization"""
     try:
-        # Use limited data for memory efficiency
+        if use_full_dataset():
+            return full_statistics(request.args.get('case_id'), request_time_range())
+
+        # Quick sample of the first rows only
         df = get_data(limit=5000)  # Increased limit for better stats
         
         if df.empty:
@@ -719,7 +2846,7 @@ def get_statistics():
                 'unique_ips': 0,
                 'unique_phones': 0,
                 'unique_emails': 0,
-                'note': 'Limited data for memory optimization'
+                'rows_analyzed': 0
             })
         
         # Calculate stats efficiently
@@ -732,7 +2859,8 @@ def get_statistics():
             'unique_ips': df['ip'].nunique() if 'ip' in df.columns else 0,
             'unique_phones': df['phone'].nunique() if 'phone' in df.columns else 0,
             'unique_emails': df['email'].nunique() if 'email' in df.columns else 0,
-            'note': f'Showing {len(df)} transactions (limited for memory optimization)'
+            'rows_analyzed': len(df),
+            'note': 'Sampled statistics - request without full=0 to analyze every row'
         }
         
         return jsonify(stats)
@@ -750,8 +2878,751 @@ def get_statistics():
             'error': str(e)
         })
 
+# -------------------------
+# Transaction Feature Matrix
+# -------------------------
+# Per-transaction anomaly features; counts are looked up in the dataset's AccountFeatures
+TRANSACTION_FEATURES = [
+    'log_amount',         # sign * log1p(|amount|)
+    'hour',               # hour of day with minutes as a fraction, noon when unknown
+    'sender_velocity',    # sender's transactions per active day
+    'sender_fan_out',     # distinct recipients of the sender
+    'receiver_fan_in',    # distinct senders paying the recipient
+    'ip_reuse',           # sending accounts seen with the transaction's ip/phone/email
+    'phone_reuse',
+    'email_reuse',
+]
+
+def transaction_feature_lookups(features):
+    """Per-account and per-identity counts behind TRANSACTION_FEATURES, kept in features.derived"""
+    if 'transaction_lookups' not in features.derived:
+        table = features.table
+        active_days = features.daily.groupby(level=0).size() if len(features.daily) else pd.Series(dtype='int64')
+        velocity = (table['txn_count'] / active_days.reindex(table.index).clip(lower=1)).fillna(0)
+        fan_in = features.edges.groupby(level=1).size() if len(features.edges) else pd.Series(dtype='int64')
+        features.derived['transaction_lookups'] = {
+            'sender_velocity': velocity,
+            'sender_fan_out': table['unique_recipients'],
+            'receiver_fan_in': fan_in,
+            **{f'{col}_reuse': counts for col, counts in features.identity_accounts.items()}
+        }
+    return features.derived['transaction_lookups']
+
+def lookup_counts(counts, keys):
+    """counts[key] for each key as float32, 0 for keys never seen and for blank identities"""
+    values = np.zeros(len(keys), dtype='float32')
+    if len(counts):
+        keys = pd.Series(keys).astype(object).where(lambda s: s.notna() & (s != ''), None).to_numpy()
+        positions = pd.Index(counts.index).get_indexer(keys)
+        found = positions >= 0
+        values[found] = counts.to_numpy(dtype='float32')[positions[found]]
+    return values
+
+def transaction_feature_matrix(chunk, features=None, lookups=None):
+    """float32 matrix of TRANSACTION_FEATURES for the rows of one chunk; rows without an amount are NaN.
+
+    Counts come from `features` (AccountFeatures) or from ready `lookups` keyed like
+    transaction_feature_lookups returns them.
+    """
+    lookups = lookups if lookups is not None else transaction_feature_lookups(features)
+    amount = pd.to_numeric(chunk['amount'], errors='coerce').to_numpy(dtype='float64')
+    timestamps = transaction_timestamps(chunk)
+    hour = (timestamps.dt.hour + timestamps.dt.minute / 60.0).fillna(12.0).to_numpy()
+    matrix = np.empty((len(chunk), len(TRANSACTION_FEATURES)), dtype='float32')
+    matrix[:, 0] = np.sign(amount) * np.log1p(np.abs(amount))
+    matrix[:, 1] = hour
+    keys = {
+        'sender_velocity': chunk['from_account'], 'sender_fan_out': chunk['from_account'],
+        'receiver_fan_in': chunk['to_account'],
+        'ip_reuse': chunk['ip'], 'phone_reuse': chunk['phone'], 'email_reuse': chunk['email']
+    }
+    for position, name in enumerate(TRANSACTION_FEATURES[2:], start=2):
+        matrix[:, position] = lookup_counts(lookups[name], keys[name].to_numpy())
+    matrix[np.isnan(amount)] = np.nan
+    return matrix
+
+def with_transaction_features(chunk, matrix):
+    """The chunk with one float column per engineered feature"""
+    return chunk.assign(**{name: matrix[:, i].astype('float64') for i, name in enumerate(TRANSACTION_FEATURES)})
+
+def transaction_features_path(dataset):
+    """Feature matrix cached next to an uploaded dataset"""
+    return os.path.splitext(dataset)[0] + '.features.npy'
+
+def write_transaction_features(dataset, features, chunk_size=None, on_block=None):
+    """Stream an uploaded dataset into its .features.npy matrix and return the path.
+
+    `on_block(matrix)` sees each block as it is written, e.g. to sample training rows.
+    """
+    chunk_size = chunk_size or app.config['READ_CHUNK_SIZE']
+    rows = features.derived.get('source_rows')
+    if rows is None:
+        rows = sum(len(frame) for _, frame in iter_upload_frames(dataset, chunk_size, columns=['amount']))
+    path = transaction_features_path(dataset)
+    matrix = np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype='float32', shape=(rows, len(TRANSACTION_FEATURES)))
+    try:
+        for first_row, frame in iter_upload_frames(dataset, chunk_size, columns=ACCOUNT_FEATURE_SOURCE_COLUMNS):
+            block = transaction_feature_matrix(frame, features)
+            matrix[first_row:first_row + len(block)] = block
+            if on_block is not None:
+                on_block(block)
+        matrix.flush()
+    finally:
+        del matrix
+    # Renamed into place so no reader maps a half-written matrix
+    os.replace(path + '.tmp', path)
+    return path
+
+def get_transaction_features(case_id=None, time_range=None):
+    """TRANSACTION_FEATURES for every row of the active dataset, in iter_dataset_chunks order.
+
+    An unfiltered uploaded dataset reads the memory-mapped matrix saved next to it (writing it
+    first if needed); other views are built from their AccountFeatures and cached with them.
+    """
+    features = get_account_features(case_id, time_range)
+    if 'transaction_matrix' in features.derived:
+        return features.derived['transaction_matrix']
+    path = session.get('uploaded_data_file')
+    if path and os.path.exists(path) and case_id is None and time_range is None:
+        cached = transaction_features_path(path)
+        if not os.path.exists(cached) or os.path.getmtime(cached) < os.path.getmtime(path):
+            write_transaction_features(path, features)
+        matrix = np.load(cached, mmap_mode='r')
+    else:
+        blocks = [
+            transaction_feature_matrix(chunk, features)
+            for chunk in iter_dataset_chunks(case_id=case_id, time_range=time_range, columns=ACCOUNT_FEATURE_SOURCE_COLUMNS)
+        ]
+        matrix = np.concatenate(blocks) if blocks else np.empty((0, len(TRANSACTION_FEATURES)), dtype='float32')
+    features.derived['transaction_matrix'] = matrix
+    return matrix
+
+def iter_featured_chunks(case_id=None, time_range=None):
+    """Active dataset chunks with the engineered feature columns attached"""
+    matrix = get_transaction_features(case_id, time_range)
+    offset = 0
+    for chunk in iter_dataset_chunks(case_id=case_id, time_range=time_range):
+        yield with_transaction_features(chunk, np.asarray(matrix[offset:offset + len(chunk)]))
+        offset += len(chunk)
+
+# -------------------------
+# Account Clustering
+# -------------------------
+app.config['CLUSTER_EPS'] = float(os.environ.get('CLUSTER_EPS', 0.5))
+app.config['CLUSTER_MIN_SAMPLES'] = int(os.environ.get('CLUSTER_MIN_SAMPLES', 5))
+# Rows per ball-tree radius query, and the neighbour pairs allowed before giving up on an eps
+app.config['CLUSTER_QUERY_CHUNK'] = int(os.environ.get('CLUSTER_QUERY_CHUNK', 2000))
+app.config['CLUSTER_MAX_PAIRS'] = int(os.environ.get('CLUSTER_MAX_PAIRS', 20000000))
+
+# Behaviour of a sending account: amount profile, activity, timing and identities shared with others
+ACCOUNT_CLUSTER_FEATURES = [
+    'log_txn_count', 'log_avg_amount', 'log_max_amount', 'log_max_daily_amount', 'unique_recipients',
+    'unique_ips', 'unique_phones', 'unique_emails', 'hour_sin', 'hour_cos',
+    'mean_ip_reuse', 'mean_phone_reuse', 'mean_email_reuse'
+]
+
+def signed_log1p(values):
+    values = np.asarray(values, dtype='float64')
+    return np.sign(values) * np.log1p(np.abs(values))
+
+def account_cluster_features(features, chunks, matrix):
+    """One row of ACCOUNT_CLUSTER_FEATURES per sending account of `features`.
+
+    `chunks` and `matrix` are the dataset's rows and their TRANSACTION_FEATURES in the same order;
+    hours are averaged on the clock face so 23:00 and 01:00 are close.
+    """
+    table = features.table
+    hour, ip, phone, email = (TRANSACTION_FEATURES.index(name) for name in ['hour', 'ip_reuse', 'phone_reuse', 'email_reuse'])
+    sums, offset = None, 0
+    for chunk in chunks:
+        block = np.asarray(matrix[offset:offset + len(chunk)], dtype='float64')
+        offset += len(chunk)
+        valid = ~np.isnan(block).any(axis=1)
+        angle = block[valid, hour] * (2 * np.pi / 24)
+        rows = pd.DataFrame({
+            'hour_sin': np.sin(angle), 'hour_cos': np.cos(angle),
+            'mean_ip_reuse': block[valid, ip], 'mean_phone_reuse': block[valid, phone], 'mean_email_reuse': block[valid, email],
+            'rows': 1.0
+        }, index=chunk['from_account'].astype(object).to_numpy()[valid])
+        part = rows.groupby(level=0).sum()
+        sums = part if sums is None else sums.add(part, fill_value=0)
+
+    frame = pd.DataFrame({
+        'log_txn_count': np.log1p(table['txn_count'].astype('float64')),
+        'log_avg_amount': signed_log1p(table['avg_amount']),
+        'log_max_amount': signed_log1p(table['max_amount']),
+        'log_max_daily_amount': signed_log1p(table['max_daily_amount']),
+        'unique_recipients': table['unique_recipients'].astype('float64'),
+        'unique_ips': table['unique_ips'].astype('float64'),
+        'unique_phones': table['unique_phones'].astype('float64'),
+        'unique_emails': table['unique_emails'].astype('float64')
+    }, index=table.index)
+    if sums is not None:
+        means = sums.drop(columns='rows').div(sums['rows'], axis=0).reindex(table.index)
+        frame = frame.join(means)
+    return frame.reindex(columns=ACCOUNT_CLUSTER_FEATURES).fillna(0.0)
+
+def radius_neighbor_graph(X, eps, chunk_size=None, max_pairs=None):
+    """Sparse distance graph of all pairs within `eps`, from ball-tree radius queries a chunk of rows at a time.
+
+    Memory grows with the number of neighbour pairs rather than the n x n distance matrix. Self
+    pairs and exact duplicates are kept as explicit zeros, as DBSCAN's precomputed mode expects.
+    """
+    chunk_size = chunk_size or app.config['CLUSTER_QUERY_CHUNK']
+    max_pairs = max_pairs or app.config['CLUSTER_MAX_PAIRS']
+    tree = BallTree(X)
+    indices, distances, counts = [], [], []
+    pairs = 0
+    for start in range(0, len(X), chunk_size):
+        ind, dist = tree.query_radius(X[start:start + chunk_size], r=eps, return_distance=True, sort_results=True)
+        lengths = np.fromiter((len(row) for row in ind), dtype=np.int64, count=len(ind))
+        pairs += int(lengths.sum())
+        if pairs > max_pairs:
+            raise ValueError(f'More than {max_pairs} neighbour pairs within eps={eps}; use a smaller eps')
+        indices.append(np.concatenate(ind))
+        distances.append(np.concatenate(dist))
+        counts.append(lengths)
+    if not counts:
+        return sparse.csr_matrix((0, 0))
+    indptr = np.concatenate([[0], np.cumsum(np.concatenate(counts))])
+    return sparse.csr_matrix((np.concatenate(distances), np.concatenate(indices), indptr), shape=(len(X), len(X)))
+
+def cluster_accounts(account_frame, eps, min_samples):
+    """DBSCAN labels (-1 for noise) over standardized account features and the neighbour pair count"""
+    if account_frame.empty:
+        return np.empty(0, dtype=int), 0
+    X = StandardScaler().fit_transform(account_frame[ACCOUNT_CLUSTER_FEATURES].to_numpy(dtype='float64'))
+    graph = radius_neighbor_graph(X, eps)
+    labels = DBSCAN(eps=eps, min_samples=min_samples, metric='precomputed').fit_predict(graph)
+    return labels, graph.nnz
+
+def summarize_clusters(table, labels):
+    """Per-cluster profile, members by total amount and the identity values members share, largest first"""
+    clustered = table[labels >= 0].assign(cluster=labels[labels >= 0])
+    if clustered.empty:
+        return []
+    profile = clustered.groupby('cluster').agg(
+        size=('txn_count', 'size'),
+        transactions=('txn_count', 'sum'),
+        total_amount=('total_amount', 'sum'),
+        avg_amount=('avg_amount', 'mean'),
+        avg_recipients=('unique_recipients', 'mean')
+    )
+    shared = {}
+    for col in ['ip', 'phone', 'email']:
+        values = clustered[clustered[col].notna() & (clustered[col].astype(str) != '')]
+        counts = values.groupby(['cluster', values[col].astype(str)]).size()
+        counts = counts[counts > 1].sort_values(ascending=False)
+        shared[col] = counts[~counts.index.get_level_values(0).duplicated()]
+    ordered = clustered.sort_values('total_amount', ascending=False)
+    members = ordered.groupby('cluster').apply(lambda group: [str(account) for account in group.index])
+
+    clusters = []
+    for label, row in profile.sort_values(['size', 'total_amount'], ascending=False).iterrows():
+        identities = {}
+        for col, counts in shared.items():
+            top = counts[counts.index.get_level_values(0) == label]
+            if len(top):
+                identities[col] = {'value': top.index[0][1], 'accounts': int(top.iloc[0])}
+        clusters.append({
+            'cluster': int(label),
+            'size': int(row['size']),
+            'transactions': int(row['transactions']),
+            'total_amount': float(row['total_amount']),
+            'avg_amount': float(row['avg_amount']),
+            'avg_recipients': float(row['avg_recipients']),
+            'shared_identities': identities,
+            'members': members[label]
+        })
+    return clusters
+
+@protected_api_route('/api/clusters')
+def account_clusters():
+    """DBSCAN clusters of sending accounts that behave alike - candidate mule rings.
+
+    Parameters: eps, min_samples, min_txns (accounts with fewer transactions are left out),
+    max_members per cluster, case_id and the date_from/date_to window.
+    """
+    try:
+        eps = request.args.get('eps', app.config['CLUSTER_EPS'], type=float)
+        min_samples = request.args.get('min_samples', app.config['CLUSTER_MIN_SAMPLES'], type=int)
+        min_txns = max(1, request.args.get('min_txns', 1, type=int))
+        max_members = max(1, request.args.get('max_members', 50, type=int))
+        if eps <= 0 or min_samples < 1:
+            return jsonify({'error': 'eps must be positive and min_samples at least 1'}), 400
+        case_id = request.args.get('case_id') or None
+        time_range = request_time_range()
+        features = get_account_features(case_id, time_range)
+        key = ('clusters', eps, min_samples, min_txns)
+        if key not in features.derived:
+            if 'cluster_features' not in features.derived:
+                matrix = get_transaction_features(case_id, time_range)
+                chunks = iter_dataset_chunks(case_id=case_id, time_range=time_range, columns=['from_account'])
+                features.derived['cluster_features'] = account_cluster_features(features, chunks, matrix)
+            table = features.table[features.table['txn_count'] >= min_txns]
+            started = time.perf_counter()
+            labels, pairs = cluster_accounts(features.derived['cluster_features'].loc[table.index], eps, min_samples)
+            features.derived[key] = {
+                'clusters': summarize_clusters(table, labels),
+                'accounts': len(table),
+                'noise_accounts': int((labels == -1).sum()),
+                'neighbor_pairs': pairs,
+                'seconds': time.perf_counter() - started
+            }
+        result = features.derived[key]
+        clusters = [dict(cluster, members=cluster['members'][:max_members]) for cluster in result['clusters']]
+        return jsonify(dict(result, clusters=clusters, eps=eps, min_samples=min_samples, features=ACCOUNT_CLUSTER_FEATURES))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+# -------------------------
+# Anomaly Model Registry
+# -------------------------
+app.config['MODEL_DIR'] = os.environ.get('MODEL_DIR', os.path.join('instance', 'models'))
+app.config['MODEL_CACHE_SIZE'] = int(os.environ.get('MODEL_CACHE_SIZE', 4))
+app.config['SCORE_MAX_ROWS'] = int(os.environ.get('SCORE_MAX_ROWS', 10000))
+# Threads for building trees and scoring row blocks; frames up to one block are scored inline
+app.config['ANOMALY_WORKERS'] = int(os.environ.get('ANOMALY_WORKERS', os.cpu_count() or 1))
+app.config['ANOMALY_SCORE_BLOCK'] = int(os.environ.get('ANOMALY_SCORE_BLOCK', 10000))
+
+ISOLATION_FOREST_PARAMS = {'n_estimators': 100, 'contamination': 'auto', 'random_state': 42}
+
+class DataFingerprint:
+    """Order-sensitive hash of a dataset's feature columns, fed one chunk at a time"""
+
+    def __init__(self):
+        self.digest = hashlib.sha256()
+        self.rows = 0
+
+    def add(self, frame):
+        self.digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+        self.rows += len(frame)
+
+    def hexdigest(self, features, params):
+        """Fingerprint of the data together with the features and parameters a model is trained with"""
+        digest = self.digest.copy()
+        digest.update(json.dumps({'features': list(features), 'params': params, 'rows': self.rows}, sort_keys=True).encode())
+        return digest.hexdigest()
+
+class ModelRegistry:
+    """Trained anomaly models on disk, as <model_id>.joblib plus <model_id>.json metadata.
+
+    The model id comes from the training fingerprint, so training again on the same data with the
+    same features and parameters finds the saved model instead of fitting a new one. Loaded
+    models are kept in a small LRU so repeated scoring does not unpickle them each time.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def path(self, model_id, suffix):
+        if not re.fullmatch(r'[A-Za-z0-9_]+', str(model_id)):
+            raise KeyError(model_id)
+        return os.path.join(self.directory or app.config['MODEL_DIR'], f'{model_id}.{suffix}')
+
+    @staticmethod
+    def model_id(fingerprint):
+        return f'iforest_{fingerprint[:16]}'
+
+    def metadata(self, model_id):
+        try:
+            with open(self.path(model_id, 'json')) as f:
+                return json.load(f)
+        except (KeyError, OSError, ValueError):
+            return None
+
+    def find(self, fingerprint):
+        """Metadata of the model trained with this fingerprint, if it was saved"""
+        meta = self.metadata(self.model_id(fingerprint))
+        return meta if meta is not None and meta['fingerprint'] == fingerprint else None
+
+    def list(self):
+        directory = self.directory or app.config['MODEL_DIR']
+        if not os.path.isdir(directory):
+            return []
+        names = sorted(name[:-len('.json')] for name in os.listdir(directory) if name.endswith('.json'))
+        metas = [meta for meta in (self.metadata(name) for name in names) if meta is not None]
+        return sorted(metas, key=lambda meta: meta['version'])
+
+    def save(self, model, features, fingerprint, params, training_rows, sample_rows):
+        """Write a model and its metadata; files are renamed into place so readers never see half a model"""
+        import sklearn
+        model_id = self.model_id(fingerprint)
+        os.makedirs(self.directory or app.config['MODEL_DIR'], exist_ok=True)
+        with self.lock:
+            meta = {
+                'model_id': model_id,
+                'version': max([m['version'] for m in self.list()], default=0) + 1,
+                'kind': 'isolation_forest',
+                'features': list(features),
+                'fingerprint': fingerprint,
+                'params': params,
+                'training_rows': training_rows,
+                'sample_rows': sample_rows,
+                'sklearn_version': sklearn.__version__,
+                'created_at': datetime.utcnow().isoformat(timespec='seconds')
+            }
+            target = self.path(model_id, 'joblib')
+            joblib.dump(model, target + '.tmp')
+            os.replace(target + '.tmp', target)
+            # Metadata goes last, so a model is only listed once its file is complete
+            target = self.path(model_id, 'json')
+            with open(target + '.tmp', 'w') as f:
+                json.dump(meta, f, indent=2)
+            os.replace(target + '.tmp', target)
+            self.cache[model_id] = (model, meta)
+            self.cache.move_to_end(model_id)
+            self._evict()
+        return meta
+
+    def load(self, model_id):
+        """(model, metadata) for a saved model, KeyError if there is none"""
+        with self.lock:
+            if model_id in self.cache:
+                self.cache.move_to_end(model_id)
+                return self.cache[model_id]
+        meta = self.metadata(model_id)
+        if meta is None:
+            raise KeyError(model_id)
+        model = joblib.load(self.path(model_id, 'joblib'))
+        with self.lock:
+            self.cache[model_id] = (model, meta)
+            self._evict()
+        return model, meta
+
+    def _evict(self):
+        while len(self.cache) > app.config['MODEL_CACHE_SIZE']:
+            self.cache.popitem(last=False)
+
+model_registry = ModelRegistry()
+
+def fit_isolation_forest(X):
+    """IsolationForest with trees built on ANOMALY_WORKERS threads"""
+    model = IsolationForest(**ISOLATION_FOREST_PARAMS, n_jobs=app.config['ANOMALY_WORKERS'])
+    return model.fit(X)
+
+def decision_scores(model, X):
+    """decision_function over row blocks on ANOMALY_WORKERS threads - tree traversal releases the GIL"""
+    workers = app.config['ANOMALY_WORKERS']
+    if workers <= 1 or len(X) <= app.config['ANOMALY_SCORE_BLOCK']:
+        return model.decision_function(X)
+    size = max(app.config['ANOMALY_SCORE_BLOCK'], -(-len(X) // workers))
+    blocks = joblib.Parallel(n_jobs=workers, prefer='threads')(
+        joblib.delayed(model.decision_function)(X.iloc[start:start + size]) for start in range(0, len(X), size)
+    )
+    return np.concatenate(blocks)
+
+def score_frame(model, features, frame):
+    """Rows of `frame` with every feature present, plus anomaly_score (higher is stranger) and is_anomaly"""
+    X = frame[features].apply(pd.to_numeric, errors='coerce').dropna()
+    scored = frame.loc[X.index].copy()
+    if len(X):
+        # One scoring pass: predict() is just decision_function() < 0
+        decision = decision_scores(model, X)
+        scored['anomaly_score'] = -decision
+        scored['is_anomaly'] = decision < 0
+    else:
+        scored['anomaly_score'] = pd.Series(dtype='float64')
+        scored['is_anomaly'] = pd.Series(dtype='bool')
+    return scored
+
+def keep_top_anomalies(top, scored, limit=10):
+    """Merge the anomalies of one scored chunk into the running top `limit`"""
+    candidates = scored[scored['is_anomaly']]
+    top = candidates if top is None else pd.concat([top, candidates])
+    return top.sort_values('anomaly_score', ascending=False).head(limit)
+
+def public_model(meta):
+    return {key: meta[key] for key in ('model_id', 'version', 'features', 'training_rows', 'sample_rows', 'created_at')}
+
+@protected_api_route('/api/models')
+def list_models():
+    return jsonify([public_model(meta) for meta in model_registry.list()])
+
+@protected_api_route('/api/models/<model_id>/score', methods=['POST'])
+def score_with_model(model_id):
+    """Score transactions with a saved model, without refitting.
+
+    {"transactions": [...]} scores those rows, mapped like an upload (optional "profile"); their
+    engineered features look accounts and identities up in the active dataset. Without
+    transactions the active dataset is streamed through the model (optional "case_id") and its
+    top "limit" anomalies are returned.
+    """
+    try:
+        model, meta = model_registry.load(model_id)
+    except KeyError:
+        return jsonify({'error': 'Model not found'}), 404
+    data = request.get_json(silent=True) or {}
+    features = meta['features']
+    engineered = set(features) <= set(TRANSACTION_FEATURES)
+    try:
+        if data.get('transactions') is not None:
+            records = data['transactions']
+            if not isinstance(records, list) or not records:
+                return jsonify({'error': 'transactions must be a non-empty list'}), 400
+            if len(records) > app.config['SCORE_MAX_ROWS']:
+                return jsonify({'error': f"At most {app.config['SCORE_MAX_ROWS']} transactions per request"}), 400
+            frame = SchemaMapper(data.get('profile')).map(pd.DataFrame(records))
+            missing = [col for col in (['amount'] if engineered else features) if col not in frame.columns]
+            if missing:
+                return jsonify({'error': f'Transactions are missing model features {missing}'}), 400
+            frame = fill_transaction_defaults(frame)
+            if engineered:
+                frame = with_transaction_features(frame, transaction_feature_matrix(frame, get_account_features()))
+            scored = score_frame(model, features, frame)
+            return jsonify({
+                'model': public_model(meta),
+                'scored': len(scored),
+                'skipped': len(frame) - len(scored),
+                'transactions': json_safe_records(scored)
+            })
+
+        limit = max(1, int(data.get('limit', 10)))
+        top, rows = None, 0
+        case_id = data.get('case_id') or None
+        for chunk in iter_featured_chunks(case_id) if engineered else iter_dataset_chunks(case_id=case_id):
+            missing = [col for col in features if col not in chunk.columns]
+            if missing:
+                return jsonify({'error': f'The active dataset is missing model features {missing}'}), 400
+            top = keep_top_anomalies(top, score_frame(model, features, chunk), limit)
+            rows += len(chunk)
+        return jsonify({
+            'model': public_model(meta),
+            'scored': rows,
+            'anomalies': json_safe_records(top) if top is not None else []
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+# -------------------------
+# Background Jobs
+# -------------------------
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_HISTORY_SIZE'] = int(os.environ.get('JOB_HISTORY_SIZE', 100))
+
+class JobQueue:
+    """Local worker pool for slow work (upload parsing, model training) with pollable status.
+
+    Jobs run in threads of the process that accepted them, but their status and result are kept in
+    the BackgroundJob table, so any gunicorn worker can answer /api/jobs polls. Status writes use
+    their own connection and never commit the job function's session.
+    """
+
+    PUBLIC_FIELDS = ['id', 'kind', 'status', 'progress', 'message', 'error', 'created_at', 'started_at', 'finished_at']
+
+    def __init__(self):
+        self.executor = None
+        self.ready_engines = set()
+        self.lock = threading.Lock()
+
+    def _executor(self):
+        # Created on first use so JOB_WORKERS can be changed after import and idle processes start no threads
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='job')
+            return self.executor
+
+    def _table(self):
+        """The job table, created on first use since web workers do not run create_all"""
+        table = BackgroundJob.__table__
+        engine = db.engine
+        with self.lock:
+            if str(engine.url) not in self.ready_engines:
+                table.create(engine, checkfirst=True)
+                self.ready_engines.add(str(engine.url))
+        return table
+
+    def submit(self, kind, owner, fn, *args):
+        """Queue fn(progress, *args) and return the job id; fn runs inside an app context"""
+        job_id = uuid.uuid4().hex
+        table = self._table()
+        with db.engine.begin() as conn:
+            conn.execute(table.insert().values(
+                id=job_id, kind=kind, owner=owner, status='queued', progress=0.0, message='Queued',
+                created_at=time.time()
+            ))
+            self._prune(conn, table)
+        self._executor().submit(self._run, job_id, fn, args)
+        return job_id
+
+    def _run(self, job_id, fn, args):
+        with app.app_context():
+            self.update(job_id, status='running', message='Running', started_at=time.time())
+
+            def progress(fraction, message):
+                self.update(job_id, progress=round(float(fraction), 3), message=message)
+
+            try:
+                result = fn(progress, *args)
+                self.update(job_id, status='done', progress=1.0, message='Done', result=app.json.dumps(result),
+                            finished_at=time.time())
+            except Exception as e:
+                db.session.rollback()
+                print(f"Job {job_id} failed: {e}")
+                self.update(job_id, status='failed', message='Failed', error=str(e), finished_at=time.time())
+
+    def update(self, job_id, **fields):
+        table = self._table()
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.id == job_id).values(**fields))
+
+    def get(self, job_id, owner):
+        """The job as a dict, or None if it does not exist or belongs to someone else"""
+        table = self._table()
+        with db.engine.connect() as conn:
+            row = conn.execute(table.select().where(table.c.id == job_id, table.c.owner == owner)).first()
+        return self._job(row) if row is not None else None
+
+    def list(self, owner):
+        table = self._table()
+        with db.engine.connect() as conn:
+            rows = conn.execute(table.select().where(table.c.owner == owner).order_by(table.c.created_at)).all()
+        return [self._job(row) for row in rows]
+
+    @staticmethod
+    def _job(row):
+        job = dict(row._mapping)
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    @staticmethod
+    def _prune(conn, table):
+        """Forget the oldest finished jobs beyond JOB_HISTORY_SIZE"""
+        total = conn.execute(db.select(db.func.count()).select_from(table)).scalar()
+        excess = total - app.config['JOB_HISTORY_SIZE']
+        if excess > 0:
+            oldest = conn.execute(
+                db.select(table.c.id).where(table.c.status.in_(['done', 'failed']))
+                .order_by(table.c.created_at).limit(excess)
+            ).scalars().all()
+            conn.execute(table.delete().where(table.c.id.in_(oldest)))
+
+    @classmethod
+    def public(cls, job):
+        return {field: job[field] for field in cls.PUBLIC_FIELDS}
+
+job_queue = JobQueue()
+
+def job_owner():
+    """Per-browser token so users only see their own jobs"""
+    if 'job_owner' not in session:
+        session['job_owner'] = uuid.uuid4().hex
+    return session['job_owner']
+
+app.config['UPLOAD_TRAIN_SAMPLE'] = int(os.environ.get('UPLOAD_TRAIN_SAMPLE', 100000))
+
+class RowReservoir:
+    """Uniform sample of up to `size` rows from a stream of 2-D arrays, in arrival order while it fits"""
+
+    def __init__(self, size, seed=42):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.rows = None
+        self.seen = 0
+
+    def add(self, values):
+        if self.rows is None:
+            self.rows = np.empty((self.size, values.shape[1]))
+        fill = min(self.seen, self.size)
+        free = min(self.size - fill, len(values))
+        self.rows[fill:fill + free] = values[:free]
+        rest = values[free:]
+        if len(rest):
+            positions = self.seen + free + np.arange(1, len(rest) + 1)
+            accepted = self.rng.random(len(rest)) < self.size / positions
+            slots = self.rng.integers(0, self.size, int(accepted.sum()))
+            self.rows[slots] = rest[accepted]
+        self.seen += len(values)
+
+    def sample(self):
+        return self.rows[:min(self.seen, self.size)] if self.rows is not None else np.empty((0, 0))
+
+def process_upload(progress, filepath, filename, profile=None):
+    """Upload job: stream the file into the dataset store, fit IsolationForest on a row sample, score every row.
+
+    The model trains on TRANSACTION_FEATURES, whose matrix is saved next to the dataset for later
+    requests. Memory stays at one UPLOAD_CHUNK_SIZE chunk, the per-account aggregates and the
+    UPLOAD_TRAIN_SAMPLE training sample. Data already trained on (same fingerprint) is scored with
+    the saved model instead of a new fit.
+    """
+    chunk_size = app.config['UPLOAD_CHUNK_SIZE']
+    writer = UploadWriter()
+    try:
+        progress(0.05, 'Reading file')
+        mapper = SchemaMapper(profile)
+        aggregator = StreamingAccountAggregator()
+        try:
+            next_txn_id = 1
+            for chunk in iter_source_chunks(filepath, chunk_size):
+                frame = prepare_upload_chunk(chunk, mapper, start_txn_id=next_txn_id)
+                next_txn_id += len(frame)
+                chunk = writer.write(frame)
+                aggregator.update(chunk)
+                progress(0.1, f'Parsed {writer.rows} rows')
+            dataset = writer.close()
+        except Exception as e:
+            raise ValueError(f'Failed to read file: {str(e)}')
+
+        progress(0.2, 'Building transaction features')
+        reservoir = RowReservoir(app.config['UPLOAD_TRAIN_SAMPLE'])
+        fingerprint = DataFingerprint()
+
+        def sample_block(block):
+            fingerprint.add(pd.DataFrame(block))
+            reservoir.add(block[~np.isnan(block).any(axis=1)])
+
+        features_path = write_transaction_features(dataset, aggregator.features(), chunk_size, on_block=sample_block)
+        X = reservoir.sample()
+        if len(X) < 10:
+            raise ValueError('Not enough data for anomaly detection.')
+        feature_cols = TRANSACTION_FEATURES
+        params = dict(ISOLATION_FOREST_PARAMS, train_sample=app.config['UPLOAD_TRAIN_SAMPLE'])
+        key = fingerprint.hexdigest(feature_cols, params)
+        saved = model_registry.find(key)
+        model = None
+        if saved is not None:
+            try:
+                model, meta = model_registry.load(saved['model_id'])
+                progress(0.3, f"Reusing saved model {meta['model_id']}")
+            except Exception as e:
+                print(f"Could not load model {saved['model_id']}, training again: {e}")
+        reused = model is not None
+        if not reused:
+            progress(0.3, f"Training IsolationForest on {len(X)} of {reservoir.seen} rows ({app.config['ANOMALY_WORKERS']} workers)")
+            model = fit_isolation_forest(pd.DataFrame(X, columns=feature_cols))
+            meta = model_registry.save(model, feature_cols, key, params, reservoir.seen, len(X))
+
+        top_anomalies = None
+        scored = 0
+        matrix = np.load(features_path, mmap_mode='r')
+        for first_row, chunk in iter_upload_frames(dataset, chunk_size):
+            chunk = with_transaction_features(chunk, np.asarray(matrix[first_row:first_row + len(chunk)]))
+            top_anomalies = keep_top_anomalies(top_anomalies, score_frame(model, feature_cols, chunk))
+            scored += len(chunk)
+            progress(0.4 + 0.55 * scored / max(writer.rows, 1), f'Scored {scored} of {writer.rows} rows')
+        action = 'scored with the saved model' if reused else 'model trained'
+        return {
+            'message': f'File {filename} uploaded and {action}! Top anomalies below.',
+            'model': dict(public_model(meta), reused=reused),
+            'anomalies': json_safe_records(top_anomalies) if top_anomalies is not None else [],
+            'schema': dict(mapper.report, features=feature_cols),
+            'dataset': dataset
+        }
+    except Exception:
+        writer.abort()
+        for path in (transaction_features_path(writer.path), transaction_features_path(writer.path) + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    """Save the upload and queue it for parsing and training; poll /api/jobs/<job_id> for progress"""
     if 'file' not in request.files:
         return jsonify({'error': 'No file uploaded'}), 400
     file = request.files['file']
@@ -760,50 +3631,326 @@ def upload_file():
     filename = file.filename
     if not isinstance(filename, str):
         return jsonify({'error': 'Invalid filename'}), 400
-    filepath = os.path.join('instance', filename)
+    if not filename.lower().endswith(('.csv', '.xlsx')):
+        return jsonify({'error': 'Unsupported file type'}), 400
+    profile = request.form.get('profile') or None
+    if profile is not None and profile not in load_schema_profiles():
+        return jsonify({'error': f"Unknown schema profile '{profile}'"}), 400
+    # Unique name so concurrent uploads of the same file do not overwrite each other
+    filepath = os.path.join('instance', f"incoming_{uuid.uuid4().hex}_{secure_filename(filename)}")
     file.save(filepath)
+    job_id = job_queue.submit('upload', job_owner(), process_upload, filepath, filename, profile)
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('job_status', job_id=job_id),
+        'result_url': url_for('job_result', job_id=job_id)
+    }), 202
+
+@protected_api_route('/api/schema-profiles')
+def schema_profiles():
+    """Mapping profiles an upload can name in its 'profile' form field"""
+    return jsonify({
+        name: {'columns': spec['columns'], 'dtypes': spec['dtypes'], 'statement': bool(spec.get('statement'))}
+        for name, spec in load_schema_profiles().items()
+    })
+
+@protected_api_route('/api/jobs')
+def list_jobs():
+    """Jobs started from this browser session, oldest first"""
+    return jsonify([JobQueue.public(job) for job in job_queue.list(job_owner())])
+
+@protected_api_route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id, job_owner())
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(JobQueue.public(job))
+
+@protected_api_route('/api/jobs/<job_id>/result')
+def job_result(job_id):
+    """Result of a finished job; a finished upload also becomes this session's active dataset"""
+    job = job_queue.get(job_id, job_owner())
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error'], 'status': 'failed'}), 400
+    if job['status'] != 'done':
+        return jsonify({'error': 'Job has not finished', 'status': job['status'], 'progress': job['progress']}), 409
+    result = dict(job['result'])
+    if job['kind'] == 'upload':
+        session['uploaded_data_file'] = result.pop('dataset')
+    return jsonify(result)
+
+# -------------------------
+# Online Anomaly Scoring
+# -------------------------
+app.config['ONLINE_SCORING_BATCH_SIZE'] = int(os.environ.get('ONLINE_SCORING_BATCH_SIZE', 5000))
+# IN-lists are split so they stay under SQLite's bound-parameter limit
+ONLINE_LOOKUP_BATCH = 300
+
+# AccountStats distinct count fed by each AccountLink kind
+ACCOUNT_LINK_COUNTERS = {
+    'recipient': 'unique_recipients', 'sender': 'unique_senders', 'day': 'active_days',
+    'ip': 'unique_ips', 'phone': 'unique_phones', 'email': 'unique_emails'
+}
+ACCOUNT_STATS_COLUMNS = [col.name for col in AccountStats.__table__.columns if col.name != 'account']
+
+online_scoring_lock = threading.Lock()
+
+def in_batches(values, size=ONLINE_LOOKUP_BATCH):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def usable_transactions(chunk):
+    """Rows the account statistics count - the same rows StreamingAccountAggregator keeps"""
+    return chunk.dropna(subset=['from_account', 'to_account', 'amount', 'date'], how='any')
+
+def account_stats_delta(chunk):
+    """AccountStats columns for one chunk on its own, one row per sending or receiving account.
+
+    Distinct counts are left at zero; update_account_stats fills them from the links that are new.
+    """
+    chunk = usable_transactions(chunk)
+    source = chunk['from_account'].astype(str).to_numpy()
+    target = chunk['to_account'].astype(str).to_numpy()
+    amount = chunk['amount'].astype('float64').to_numpy()
+    timestamps = transaction_timestamps(chunk).to_numpy()
+    seen = pd.Series(np.concatenate([timestamps, timestamps]), index=np.concatenate([source, target]))
+    delta = seen.groupby(level=0).agg(['min', 'max']).set_axis(['first_seen', 'last_seen'], axis=1)
+    sent = pd.Series(amount, index=source).groupby(level=0).agg(['count', 'sum', 'max'])
+    received = pd.Series(amount, index=target).groupby(level=0).agg(['count', 'sum'])
+    delta = delta.join(sent.set_axis(['txn_count', 'total_amount', 'max_amount'], axis=1))
+    delta = delta.join(received.set_axis(['received_count', 'received_amount'], axis=1))
+    for col in ['txn_count', 'total_amount', 'received_count', 'received_amount'] + list(ACCOUNT_LINK_COUNTERS.values()):
+        delta[col] = delta[col].fillna(0) if col in delta.columns else 0
+    delta.index.name = 'account'
+    return delta[ACCOUNT_STATS_COLUMNS]
+
+def combine_account_stats(current, delta):
+    """Stored stats plus a chunk's delta: counts and sums add up, extremes are kept"""
+    if current is None or current.empty:
+        return delta
+    how = {col: 'sum' for col in ACCOUNT_STATS_COLUMNS}
+    how.update(max_amount='max', first_seen='min', last_seen='max')
+    current = current.astype({'first_seen': 'datetime64[ns]', 'last_seen': 'datetime64[ns]'})
+    return pd.concat([current[ACCOUNT_STATS_COLUMNS], delta]).groupby(level=0).agg(how)
+
+def chunk_account_links(chunk):
+    """Distinct (account, kind, value) facts in one chunk"""
+    chunk = usable_transactions(chunk)
+    source = chunk['from_account'].astype(str).to_numpy()
+    target = chunk['to_account'].astype(str).to_numpy()
+    pairs = {'recipient': (source, target), 'sender': (target, source), 'day': (source, transaction_days(chunk))}
+    for col in ['ip', 'phone', 'email']:
+        pairs[col] = (source, chunk[col].astype(object).to_numpy())
+    links = pd.concat([
+        pd.DataFrame({'account': accounts, 'kind': kind, 'value': values}) for kind, (accounts, values) in pairs.items()
+    ], ignore_index=True).dropna()
+    links['value'] = links['value'].astype(str).str.slice(0, 100)
+    return links.drop_duplicates(ignore_index=True)
+
+def store_new_links(links):
+    """Insert the links not stored yet and return them"""
+    table = AccountLink.__table__
+    key = db.tuple_(table.c.account, table.c.kind, table.c.value)
+    known = []
+    for batch in in_batches(links.itertuples(index=False, name=None)):
+        known.extend(db.session.execute(db.select(table.c.account, table.c.kind, table.c.value).where(key.in_(batch))).all())
+    if known:
+        merged = links.merge(pd.DataFrame(known, columns=list(links.columns)), how='left', indicator=True)
+        links = links[(merged['_merge'] == 'left_only').to_numpy()]
+    if len(links):
+        db.session.execute(table.insert(), links.to_dict(orient='records'))
+    return links
+
+def load_account_stats(accounts):
+    table = AccountStats.__table__
+    rows = []
+    for batch in in_batches(accounts):
+        rows.extend(db.session.execute(db.select(table).where(table.c.account.in_(batch))).all())
+    return pd.DataFrame(rows, columns=[col.name for col in table.columns]).set_index('account')
+
+def update_account_stats(chunk):
+    """Fold one chunk into AccountStats/AccountLink and return the new stats of every account it touches"""
+    delta = account_stats_delta(chunk)
+    if delta.empty:
+        return delta
+    new_links = store_new_links(chunk_account_links(chunk))
+    if len(new_links):
+        counts = new_links.groupby(['account', 'kind']).size().unstack(fill_value=0)
+        for kind, column in ACCOUNT_LINK_COUNTERS.items():
+            if kind in counts.columns:
+                delta[column] = counts[kind].reindex(delta.index, fill_value=0).to_numpy()
+    current = load_account_stats(delta.index)
+    stats = combine_account_stats(current, delta)
+
+    records = stats.reset_index().astype(object)
+    records = records.where(records.notna(), None).to_dict(orient='records')
+    stored = set(current.index)
+    updates = [record for record in records if record['account'] in stored]
+    inserts = [record for record in records if record['account'] not in stored]
+    if updates:
+        db.session.execute(db.update(AccountStats), updates)
+    if inserts:
+        db.session.execute(db.insert(AccountStats), inserts)
+    return stats
+
+def online_feature_lookups(stats, chunk):
+    """transaction_feature_lookups equivalents read from the running stats instead of a full pass"""
+    lookups = {
+        'sender_velocity': stats['txn_count'] / stats['active_days'].clip(lower=1),
+        'sender_fan_out': stats['unique_recipients'],
+        'receiver_fan_in': stats['unique_senders'],
+    }
+    table = AccountLink.__table__
+    for col in ['ip', 'phone', 'email']:
+        values = [value for value in pd.unique(chunk[col].astype(object).dropna()) if value != '']
+        counts = {}
+        for batch in in_batches(values):
+            counts.update(db.session.execute(
+                db.select(table.c.value, db.func.count()).where(table.c.kind == col, table.c.value.in_(batch)).group_by(table.c.value)
+            ).all())
+        lookups[f'{col}_reuse'] = pd.Series(counts, dtype='float64')
+    return lookups
+
+def online_scoring_model(model_id=None):
+    """(model, metadata) to score with: the one asked for, else the newest saved model"""
+    if model_id is None:
+        saved = model_registry.list()
+        if not saved:
+            raise ValueError('No saved model yet - upload a dataset to train one')
+        model_id = saved[-1]['model_id']
     try:
-        if filename.lower().endswith('.csv'):
-            df = pd.read_csv(filepath)
-        elif filename.lower().endswith('.xlsx'):
-            df = pd.read_excel(filepath)
-        else:
-            return jsonify({'error': 'Unsupported file type'}), 400
-        # Ensure all required columns exist
-        required_cols = [
-            'transaction_id', 'date', 'from_account', 'to_account', 'amount', 'transaction_type',
-            'ip', 'phone', 'email', 'case_id', 'time'
-        ]
-        for col in required_cols:
-            if col not in df.columns:
-                if col == 'case_id':
-                    df[col] = 'UPLOADED'
-                elif col == 'time':
-                    df[col] = '12:00:00'
-                else:
-                    df[col] = ''
-    except Exception as e:
-        return jsonify({'error': f'Failed to read file: {str(e)}'}), 400
-    numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-    if not numeric_cols:
-        return jsonify({'error': 'No numeric columns found for anomaly detection.'}), 400
-    X = df[numeric_cols].dropna()
-    if len(X) < 10:
-        return jsonify({'error': 'Not enough data for anomaly detection.'}), 400
-    model = IsolationForest(n_estimators=100, contamination='auto', random_state=42)
-    model.fit(X)
-    scores = model.decision_function(X)
-    anomalies = model.predict(X)
-    df_anom = df.loc[X.index].copy()
-    df_anom['anomaly_score'] = -scores
-    df_anom['is_anomaly'] = (anomalies == -1)
-    top_anomalies = df_anom[df_anom['is_anomaly']].sort_values('anomaly_score', ascending=False).head(10)
-    # Save uploaded data as temp CSV and store filename in session
-    temp_filename = os.path.join('instance', f"uploaded_{uuid.uuid4().hex}_{int(time.time())}.csv")
-    df.to_csv(temp_filename, index=False)
-    session['uploaded_data_file'] = temp_filename
-    result = top_anomalies.to_dict(orient='records')
-    return jsonify({'message': f'File {filename} uploaded and model trained! Top anomalies below.', 'anomalies': result})
+        return model_registry.load(model_id)
+    except KeyError:
+        raise ValueError(f"Model '{model_id}' not found")
+
+def read_transaction_batch(after_id, size):
+    """The next `size` transactions after `after_id`, with the read connection released before any write"""
+    chunks = iter_transaction_chunks(after_id=after_id, chunk_size=size)
+    try:
+        return next(chunks, None)
+    finally:
+        chunks.close()
+
+def score_new_transactions(model_id=None, batch_size=None, progress=None):
+    """Score transactions added since the last run and fold them into the running account statistics.
+
+    Each batch commits together with the checkpoint, so an interrupted run resumes after the last
+    committed batch without counting any transaction twice. Features use the statistics as they
+    stand once the batch is added, i.e. everything known up to that transaction's batch.
+    """
+    batch_size = batch_size or app.config['ONLINE_SCORING_BATCH_SIZE']
+    if not online_scoring_lock.acquire(blocking=False):
+        raise ValueError('Online scoring is already running')
+    try:
+        model, meta = online_scoring_model(model_id)
+        checkpoint = db.session.get(ScoringCheckpoint, 'transactions')
+        if checkpoint is None:
+            checkpoint = ScoringCheckpoint(name='transactions', last_transaction_id=0, rows_scored=0)
+            db.session.add(checkpoint)
+            db.session.commit()
+        pending = db.session.query(db.func.count(Transaction.id)).filter(Transaction.id > checkpoint.last_transaction_id).scalar()
+        started = time.perf_counter()
+        read = scored = anomalies = 0
+        while True:
+            chunk = read_transaction_batch(checkpoint.last_transaction_id, batch_size)
+            if chunk is None:
+                break
+            try:
+                stats = update_account_stats(chunk)
+                matrix = transaction_feature_matrix(chunk, lookups=online_feature_lookups(stats, chunk))
+                result = score_frame(model, meta['features'], with_transaction_features(chunk, matrix))
+                if len(result):
+                    now = datetime.utcnow()
+                    db.session.execute(TransactionScore.__table__.insert(), [
+                        {'transaction_id': int(txn_id), 'model_id': meta['model_id'], 'anomaly_score': float(score),
+                         'is_anomaly': bool(flag), 'scored_at': now}
+                        for txn_id, score, flag in zip(result['id'], result['anomaly_score'], result['is_anomaly'])
+                    ])
+                checkpoint.last_transaction_id = int(chunk['id'].iloc[-1])
+                checkpoint.rows_scored += len(result)
+                checkpoint.model_id = meta['model_id']
+                checkpoint.updated_at = datetime.utcnow()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            read += len(chunk)
+            scored += len(result)
+            anomalies += int(result['is_anomaly'].sum())
+            if progress is not None:
+                progress(read / max(pending, 1), f'Scored {read} of {pending} new transactions')
+        elapsed = time.perf_counter() - started
+        print(f"Online scoring: {read} new transactions, {scored} scored, {anomalies} anomalies in {elapsed:.2f}s")
+        return {
+            'model_id': meta['model_id'],
+            'transactions': read,
+            'scored': scored,
+            'anomalies': anomalies,
+            'last_transaction_id': checkpoint.last_transaction_id,
+            'seconds': elapsed
+        }
+    finally:
+        online_scoring_lock.release()
+
+def reset_online_scoring():
+    """Forget all scores and running statistics so the next run starts from the first transaction"""
+    for model in (TransactionScore, AccountLink, AccountStats, ScoringCheckpoint):
+        db.session.query(model).delete()
+    db.session.commit()
+
+def run_online_scoring(progress, model_id=None):
+    """Job wrapper for score_new_transactions"""
+    return score_new_transactions(model_id=model_id, progress=progress)
+
+@protected_api_route('/api/online-scoring')
+def online_scoring_status():
+    """Checkpoint, backlog and the highest-scoring anomalies found by online scoring"""
+    limit = max(1, request.args.get('limit', 20, type=int))
+    checkpoint = db.session.get(ScoringCheckpoint, 'transactions')
+    last_id = checkpoint.last_transaction_id if checkpoint else 0
+    pending = db.session.query(db.func.count(Transaction.id)).filter(Transaction.id > last_id).scalar()
+    table, scores = Transaction.__table__, TransactionScore.__table__
+    names = ['id'] + TRANSACTION_COLUMNS + ['timestamp', 'anomaly_score', 'model_id']
+    query = (
+        db.select(*[table.c[name] for name in names[:-2]], scores.c.anomaly_score, scores.c.model_id)
+        .join(scores, scores.c.transaction_id == table.c.id)
+        .where(scores.c.is_anomaly.is_(True))
+        .order_by(scores.c.anomaly_score.desc())
+        .limit(limit)
+    )
+    return jsonify({
+        'last_transaction_id': last_id,
+        'rows_scored': checkpoint.rows_scored if checkpoint else 0,
+        'model_id': checkpoint.model_id if checkpoint else None,
+        'updated_at': checkpoint.updated_at.isoformat(timespec='seconds') if checkpoint else None,
+        'pending': pending,
+        'anomalies': sql_records(names, db.session.execute(query).all())
+    })
+
+@protected_api_route('/api/online-scoring/run', methods=['POST'])
+def start_online_scoring():
+    """Queue a run over the transactions added since the last one"""
+    data = request.get_json(silent=True) or {}
+    job_id = job_queue.submit('online_scoring', job_owner(), run_online_scoring, data.get('model_id'))
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('job_status', job_id=job_id),
+        'result_url': url_for('job_result', job_id=job_id)
+    }), 202
+
+@protected_api_route('/api/account-stats/<account>')
+def account_stats(account):
+    """Running statistics of one account as of the last online scoring run"""
+    table = AccountStats.__table__
+    row = db.session.execute(db.select(table).where(table.c.account == account)).first()
+    if row is None:
+        return jsonify({'error': 'Account not found'}), 404
+    return jsonify(sql_records([col.name for col in table.columns], [row])[0])
 
 # -------------------------
 # HTML Template for Enhanced UI
@@ -1506,7 +4653,7 @@ HTML_TEMPLATE = '''
 
         async function loadSpiderMap() {
             try {
-                const response = await axios.get('/api/spider-map');
+                const response = await axios.get('/api/spider-map', { params: { layout: 'force' } });
                 const graphData = response.data;
                 
                 // Check if we have valid data
@@ -1604,6 +4751,16 @@ HTML_TEMPLATE = '''
                                 'background-color': '#3498db'
                             }
                         },
+                        {
+                            selector: 'node[node_type = "aggregate"]',
+                            style: {
+                                'label': 'data(label)',
+                                'shape': 'round-rectangle',
+                                'background-color': '#7f8c8d',
+                                'width': 'mapData(member_count, 1, 50, 30, 70)',
+                                'height': 30
+                            }
+                        },
                         {
                             selector: 'edge',
                             style: {
@@ -1616,9 +4773,22 @@ HTML_TEMPLATE = '''
                                 'font-size': '8px',
                                 'text-rotation': 'autorotate'
                             }
+                        },
+                        {
+                            selector: 'edge[?aggregate]',
+                            style: {
+                                'line-style': 'dashed',
+                                'line-color': '#7f8c8d',
+                                'target-arrow-color': '#7f8c8d'
+                            }
                         }
                     ],
-                    layout: {
+                    // Positions come precomputed from the server; fall back to cose if they are missing
+                    layout: graphData.layout === 'preset' ? {
+                        name: 'preset',
+                        fit: true,
+                        padding: 50
+                    } : {
                         name: 'cose',
                         animate: true,
                         animationDuration: 1000,
@@ -1802,7 +4972,15 @@ HTML_TEMPLATE = '''
           formData.append('file', document.getElementById('fileInput').files[0]);
           document.getElementById('uploadStatus').innerText = 'Uploading...';
           try {
-            const res = await axios.post('/upload', formData, {headers: {'Content-Type': 'multipart/form-data'}});
+            const queued = await axios.post('/upload', formData, {headers: {'Content-Type': 'multipart/form-data'}});
+            // Parsing and training run as a background job - poll until it finishes
+            let job = queued.data;
+            while (job.status === 'queued' || job.status === 'running') {
+              await new Promise(resolve => setTimeout(resolve, 1000));
+              job = (await axios.get(queued.data.status_url)).data;
+              document.getElementById('uploadStatus').innerText = `${job.message} (${Math.round(job.progress * 100)}%)`;
+            }
+            const res = await axios.get(queued.data.result_url);
             let msg = res.data.message;
             if (res.data.anomalies && res.data.anomalies.length > 0) {
               msg += '<br><b>Top Anomalies:</b><br>';
@@ -2593,11 +5771,17 @@ def get_started():
 def logout():
     # Remove temp uploaded file if it exists
     uploaded_file = session.pop('uploaded_data_file', None)
-    if uploaded_file and os.path.exists(uploaded_file):
-        try:
-            os.remove(uploaded_file)
-        except Exception:
-            pass
+    if uploaded_file:
+        transaction_cache.invalidate(('file', uploaded_file))
+        aml_engine.forget_file(uploaded_file)
+        # The .features.npy matrix written next to the upload goes with it
+        features_file = transaction_features_path(uploaded_file)
+        for path in (uploaded_file, features_file, features_file + '.tmp'):
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except Exception:
+                    pass
     return redirect(url_for('get_started'))
 
 # -------------------------
@@ -2606,6 +5790,8 @@ def logout():
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        ensure_transaction_schema()
+        backfill_transaction_columns()
     
     # Production vs Development configuration
     debug_mode = os.environ.get('FLASK_DEBUG', '0') == '1'
@@ -2620,9 +5806,62 @@ def initialize_database():
     try:
         with app.app_context():
             db.create_all()
+            ensure_transaction_schema()
+            backfill_transaction_columns()
             print("Database tables initialized")
             return True
     except Exception as e:
         print(f"Database initialization error: {e}")
         return False
 
+# Offline data ingest - run with: flask --app app ingest ../archive/bank.xlsx
+@app.cli.command('ingest')
+@click.argument('paths', nargs=-1)
+@click.option('--batch-size', type=int, default=None, help='Rows per chunk and commit')
+@click.option('--restart', is_flag=True, help='Ignore saved checkpoints and load from the first row')
+@click.option('--profile', default=None, help='Schema mapping profile, detected from the header when omitted')
+def ingest_command(paths, batch_size, restart, profile):
+    """Load bank workbooks or transaction CSVs into the database"""
+    if not initialize_database():
+        return
+    for path in paths or ['../archive/bank.xlsx']:
+        if not os.path.exists(path):
+            print(f"Source file not found at {path}, skipping")
+            continue
+        with app.app_context():
+            try:
+                ingest_source(path, batch_size=batch_size, restart=restart, profile=profile)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error ingesting {path}: {e}")
+
+
+# Schema upgrade - run with: flask --app app migrate-schema
+@app.cli.command('migrate-schema')
+@click.option('--batch-size', type=int, default=None, help='Rows backfilled per batch and commit')
+def migrate_schema_command(batch_size):
+    """Add the timestamp/amount_cents columns and indexes, then backfill existing rows"""
+    with app.app_context():
+        db.create_all()
+        ensure_transaction_schema()
+        updated = backfill_transaction_columns(batch_size=batch_size)
+        print(f"Schema up to date, {updated} transactions backfilled")
+
+
+# Online scoring - run with: flask --app app score-new
+@app.cli.command('score-new')
+@click.option('--model', 'model_id', default=None, help='Saved model id, the newest one when omitted')
+@click.option('--batch-size', type=int, default=None, help='Transactions scored per batch and commit')
+@click.option('--restart', is_flag=True, help='Drop all scores and running account statistics first')
+def score_new_command(model_id, batch_size, restart):
+    """Score transactions added since the last run and update the running account statistics"""
+    if not initialize_database():
+        return
+    with app.app_context():
+        try:
+            if restart:
+                reset_online_scoring()
+            score_new_transactions(model_id=model_id, batch_size=batch_size)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error scoring new transactions: {e}")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark transaction graph construction: row-by-row iterrows vs. the array-based builder
+"""
+
+import argparse
+import time
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from app import build_transaction_graph
+
+
+def synthetic_transactions(n_edges, n_accounts, seed=42):
+    """Random transfers between n_accounts accounts"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'case_id': 'BENCH',
+        'transaction_id': np.char.add('T', np.arange(n_edges).astype(str)).astype(object),
+        'from_account': np.char.add('ACC', rng.integers(0, n_accounts, n_edges).astype(str)).astype(object),
+        'to_account': np.char.add('ACC', rng.integers(0, n_accounts, n_edges).astype(str)).astype(object),
+        'amount': rng.gamma(2.0, 5000.0, n_edges).round(2),
+        'date': '2023-01-01',
+        'time': '12:00:00',
+        'ip': '192.168.1.1',
+        'phone': '+1234567890',
+        'email': 'user@example.com'
+    })
+
+
+def iterrows_graph(df):
+    """The original per-row construction, kept here as the baseline"""
+    G = nx.DiGraph()
+    for _, row in df.iterrows():
+        G.add_node(row['from_account'], account_type='source', ip=row['ip'], phone=row['phone'], email=row['email'])
+        G.add_node(row['to_account'], account_type='destination', ip=row['ip'], phone=row['phone'], email=row['email'])
+        G.add_edge(row['from_account'], row['to_account'], weight=row['amount'], date=row['date'],
+                   time=row['time'], transaction_id=row['transaction_id'])
+    return G
+
+
+def timed(builder, df):
+    started = time.perf_counter()
+    G = builder(df)
+    return time.perf_counter() - started, G.number_of_edges()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--baseline-max', type=int, default=100_000,
+                        help='Skip the slow iterrows baseline above this many edges')
+    args = parser.parse_args()
+
+    print(f"{'edges':>10} {'iterrows':>10} {'multi':>10} {'aggregated':>11}  graph edges (multi / aggregated)")
+    for size in args.sizes:
+        df = synthetic_transactions(size, n_accounts=max(size // 10, 10))
+        baseline = f"{timed(iterrows_graph, df)[0]:.2f}s" if size <= args.baseline_max else 'skipped'
+        multi_time, multi_edges = timed(lambda frame: build_transaction_graph(frame, multi=True), df)
+        agg_time, agg_edges = timed(lambda frame: build_transaction_graph(frame, multi=False), df)
+        print(f"{size:>10} {baseline:>10} {multi_time:>9.2f}s {agg_time:>10.2f}s  {multi_edges} / {agg_edges}")
+
+
+if __name__ == '__main__':
+    main()
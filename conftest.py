@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Shared pytest fixtures
+"""
+
+import pytest
+import sqlalchemy as sa
+
+from app import UploadWriter, app, db
+
+
+@pytest.fixture
+def database(tmp_path):
+    """An app context whose session writes to an empty SQLite file instead of DATABASE_URL"""
+    with app.app_context():
+        engines = db.engines
+        saved = engines[None]
+        engines[None] = sa.create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+        try:
+            db.create_all()
+            yield db
+        finally:
+            db.session.remove()
+            engines[None].dispose()
+            engines[None] = saved
+
+
+@pytest.fixture
+def write_upload_frame():
+    """Persist an in-memory DataFrame through UploadWriter, as an upload would, and return its path"""
+    def write(df):
+        writer = UploadWriter()
+        writer.write(df)
+        return writer.close()
+    return write
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests for DBSCAN account clustering over the ball-tree neighbour graph
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import DBSCAN
+
+from app import build_account_features, radius_neighbor_graph, summarize_clusters
+
+
+def test_sparse_graph_gives_the_same_labels_as_dense_dbscan():
+    rng = np.random.default_rng(3)
+    X = np.vstack([rng.normal(0, 1, (600, 4)), rng.normal(4, 0.1, (50, 4)), np.zeros((5, 4))])
+    for eps, min_samples in [(0.4, 5), (1.0, 12)]:
+        graph = radius_neighbor_graph(X, eps, chunk_size=128)
+        labels = DBSCAN(eps=eps, min_samples=min_samples, metric='precomputed').fit_predict(graph)
+        assert np.array_equal(labels, DBSCAN(eps=eps, min_samples=min_samples).fit_predict(X))
+
+    with pytest.raises(ValueError):
+        radius_neighbor_graph(X, 100.0, max_pairs=1000)
+
+
+def test_summary_reports_members_and_shared_identities():
+    df = pd.DataFrame({
+        'case_id': 'C1',
+        'transaction_id': [f'T{i}' for i in range(5)],
+        'from_account': ['A', 'B', 'C', 'D', 'E'],
+        'to_account': 'X',
+        'amount': [10.0, 30.0, 20.0, 5.0, 7.0],
+        'date': '2024-01-01', 'time': '10:00',
+        'ip': ['9.9.9.9', '9.9.9.9', '1.1.1.1', '2.2.2.2', '3.3.3.3'],
+        'phone': '', 'email': ''
+    })
+    table = build_account_features(df).table
+    labels = pd.Series({'A': 0, 'B': 0, 'C': 0, 'D': -1, 'E': 1}).reindex(table.index).to_numpy()
+    clusters = summarize_clusters(table, labels)
+
+    assert [cluster['size'] for cluster in clusters] == [3, 1]
+    first = clusters[0]
+    assert first['members'] == ['B', 'C', 'A'] and first['total_amount'] == 60.0
+    assert first['shared_identities'] == {'ip': {'value': '9.9.9.9', 'accounts': 2}}
+    assert clusters[1]['shared_identities'] == {}
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for full-dataset analysis versus the quick sample
+"""
+
+import pandas as pd
+import pytest
+
+from app import app
+
+
+@pytest.fixture
+def large_upload(tmp_path):
+    """Client on a 5000-row upload whose only busy, high-value sender appears in the last rows"""
+    rows = 5000
+    df = pd.DataFrame({
+        'case_id': 'C1',
+        'transaction_id': [f'T{i}' for i in range(rows)],
+        'from_account': [f'A{i % 1000}' for i in range(rows)],
+        'to_account': [f'B{i % 7}' for i in range(rows)],
+        'amount': 10.0,
+        'date': '2024-01-01', 'time': '10:00',
+        'ip': '', 'phone': '', 'email': ''
+    })
+    df.loc[rows - 20:, 'from_account'] = 'LATE'
+    df.loc[rows - 20:, 'amount'] = 50000.0
+    path = tmp_path / 'upload.csv'
+    df.to_csv(path, index=False)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['uploaded_data_file'] = str(path)
+    saved = app.config['READ_CHUNK_SIZE']
+    app.config['READ_CHUNK_SIZE'] = 700
+    yield client, rows
+    app.config['READ_CHUNK_SIZE'] = saved
+
+
+def test_full_mode_reads_every_chunk(large_upload):
+    client, rows = large_upload
+    response = client.get('/api/suspicious?full=1')
+    assert response.headers['X-Rows-Analyzed'] == str(rows)
+    assert 'LATE' in [entry['account'] for entry in response.get_json()]
+
+    layers = client.get('/api/layered-analysis?full=1').get_json()
+    assert layers['rows_analyzed'] == rows and 'LATE' in layers['layer1_high_frequency']
+    assert client.get('/api/statistics?full=1').get_json()['rows_analyzed'] == rows
+
+
+def test_sample_mode_reports_the_rows_it_saw(large_upload):
+    client, rows = large_upload
+    response = client.get('/api/suspicious?full=0')
+    assert int(response.headers['X-Rows-Analyzed']) < rows
+    assert 'LATE' not in [entry['account'] for entry in response.get_json()]
+    assert client.get('/api/layered-analysis?full=0').get_json()['rows_analyzed'] < rows
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for resumable chunked ingest into the Transaction table
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app import (
+    IngestCheckpoint, Transaction, TransactionCache, bulk_insert_transactions, ingest_source, prepare_bank_statement,
+    transaction_table_version
+)
+
+
+def source_csv(tmp_path, rows=10):
+    path = tmp_path / 'export.csv'
+    pd.DataFrame({
+        'From_Account': [f'A{i % 3}' for i in range(rows)],
+        'To_Account': [f'B{i % 2}' for i in range(rows)],
+        'Amount': [float(i + 1) for i in range(rows)],
+        'Date': '2024-01-01'
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def test_restart_replaces_the_earlier_load(tmp_path, database):
+    path = source_csv(tmp_path)
+    other = Transaction(case_id='C9', transaction_id='KEEP', from_account='X', to_account='Y', amount=1.0)
+    database.session.add(other)
+    database.session.commit()
+
+    assert ingest_source(path, batch_size=4)['rows'] == 10
+    assert ingest_source(path, batch_size=4)['rows'] == 0
+    cache = TransactionCache(10 ** 9)
+    cache.get_database_frame()
+    version = transaction_table_version()
+    assert ingest_source(path, batch_size=3, restart=True)['rows'] == 10
+    # Same ids and row count again, but a new version, so caches reload
+    assert transaction_table_version()[1:] == version[1:] and transaction_table_version() != version
+    cache.get_database_frame()
+    assert cache.stats()['misses'] == 2
+
+    assert Transaction.query.count() == 11
+    rows = Transaction.query.filter(Transaction.ingest_id.isnot(None)).order_by(Transaction.id).all()
+    assert [row.transaction_id for row in rows] == [f'TXN{i:06d}' for i in range(1, 11)]
+    checkpoint = IngestCheckpoint.query.one()
+    assert checkpoint.completed and checkpoint.rows_done == 10 and checkpoint.next_txn_id == 11
+    assert database.session.get(Transaction, other.id).transaction_id == 'KEEP'
+
+
+def test_statement_amounts_are_parsed_per_column():
+    statement = pd.DataFrame({
+        'Account No': ['111', '111', '222', '222', '333', '333'],
+        'TRANSACTION DETAILS': ['NEFT 123456789012 rent', 'cash', 'to 987654321', '', 'x', 'x'],
+        'VALUE DATE': ['2024-01-05', 'not a date', '2024-01-06', '2024-01-06', '2024-01-07', '2024-01-07'],
+        'DEPOSIT AMT': ['1,000.50', 'abc', None, '0', None, None],
+        'WITHDRAWAL AMT': ['20', ' 75 ', '300', None, 'n/a', None]
+    })
+    frame = prepare_bank_statement(statement, start_txn_id=41)
+
+    # Deposits win, then withdrawals; rows with neither are dropped
+    assert frame['amount'].tolist() == [1000.5, -75.0, -300.0]
+    assert frame['from_account'].tolist() == ['111', '111', '222']
+    assert frame['to_account'].tolist() == ['123456789012', 'UNKNOWN', '987654321']
+    assert frame['transaction_id'].tolist() == ['TXN000041', 'TXN000042', 'TXN000043']
+    assert frame['date'].tolist() == ['2024-01-05', 'not a date', '2024-01-06']
+
+
+def test_bulk_insert_batches_keep_every_row(database):
+    rows = 7
+    frame = pd.DataFrame({
+        'case_id': 'C1',
+        'transaction_id': ['T0', 'T1', 'T1', 'T3', 'T4', 'T5', 'T6'],
+        'from_account': 'A', 'to_account': 'B',
+        'amount': [1.0, 2.5, 2.5, np.nan, 4.0, 5.0, 6.0],
+        'date': ['2024-01-01', '2024-01-02', '2024-01-02', '2024-01-03', 'bad', '', '2024-01-07'],
+        'time': '10:00', 'ip': '', 'phone': '', 'email': '', 'transaction_type': 'transfer'
+    })
+    report = bulk_insert_transactions(frame, batch_size=3)
+    assert report['rows'] == rows
+
+    stored = Transaction.query.order_by(Transaction.id).all()
+    # Duplicate source rows are kept, not merged
+    assert [row.transaction_id for row in stored] == frame['transaction_id'].tolist()
+    assert [row.amount_cents for row in stored] == [100, 250, 250, None, 400, 500, 600]
+    assert stored[0].timestamp == datetime(2024, 1, 1, 10, 0)
+    assert stored[4].timestamp is None and stored[5].timestamp is None
+    assert stored[4].date == 'bad'
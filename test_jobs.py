@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for the background job queue
+"""
+
+import time
+
+from app import JobQueue, app
+
+
+def wait_for(queue, job_id, owner, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id, owner)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError('job did not finish')
+
+
+def test_job_reports_progress_and_result(database):
+    queue = JobQueue()
+    seen = []
+
+    def work(progress, value):
+        progress(0.5, 'halfway')
+        seen.append(queue.list('me')[0]['message'])
+        return value * 2
+
+    job_id = queue.submit('test', 'me', work, 21)
+    job = wait_for(queue, job_id, 'me')
+    assert job['status'] == 'done' and job['result'] == 42 and job['progress'] == 1.0
+    assert seen == ['halfway']
+    assert queue.get(job_id, 'someone else') is None
+    assert set(JobQueue.public(job)) == set(JobQueue.PUBLIC_FIELDS)
+
+
+def test_failed_job_keeps_error(database):
+    queue = JobQueue()
+
+    def work(progress):
+        raise ValueError('bad input')
+
+    job = wait_for(queue, queue.submit('test', 'me', work), 'me')
+    assert job['status'] == 'failed' and job['error'] == 'bad input'
+
+
+def test_other_worker_processes_see_status_and_result(database):
+    accepted, polled = JobQueue(), JobQueue()
+    job_id = accepted.submit('test', 'me', lambda progress: {'rows': 3, 'dataset': 'instance/x.csv'})
+    job = wait_for(polled, job_id, 'me')
+    assert job['result'] == {'rows': 3, 'dataset': 'instance/x.csv'}
+    assert [job['id'] for job in polled.list('me')] == [job_id]
+
+
+def test_history_keeps_unfinished_jobs(database):
+    queue = JobQueue()
+    saved = app.config['JOB_HISTORY_SIZE']
+    app.config['JOB_HISTORY_SIZE'] = 2
+    try:
+        slow = queue.submit('test', 'me', lambda progress: time.sleep(0.5))
+        quick = [wait_for(queue, queue.submit('test', 'me', lambda progress: None), 'me')['id'] for _ in range(3)]
+        assert [job['id'] for job in queue.list('me')] == [slow, quick[-1]]
+        wait_for(queue, slow, 'me')
+    finally:
+        app.config['JOB_HISTORY_SIZE'] = saved
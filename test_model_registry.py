@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for saved anomaly models and the score-only endpoint
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from app import DataFingerprint, ModelRegistry, app, fit_isolation_forest, model_registry, score_frame
+
+
+def fitted_model(features=('amount',)):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(100, 10, (200, len(features))), columns=list(features))
+    return IsolationForest(n_estimators=10, random_state=0).fit(X)
+
+
+def fingerprint_of(frames):
+    fingerprint = DataFingerprint()
+    for frame in frames:
+        fingerprint.add(frame)
+    return fingerprint.hexdigest(['amount'], {'n_estimators': 10})
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    saved = app.config['MODEL_DIR']
+    app.config['MODEL_DIR'] = str(tmp_path)
+    model_registry.cache.clear()
+    yield tmp_path
+    app.config['MODEL_DIR'] = saved
+    model_registry.cache.clear()
+
+
+def test_fingerprint_depends_on_rows_not_chunking():
+    frame = pd.DataFrame({'amount': [1.0, 2.0, 3.0, np.nan]})
+    assert fingerprint_of([frame]) == fingerprint_of([frame.iloc[:1], frame.iloc[1:]])
+    assert fingerprint_of([frame]) != fingerprint_of([frame.iloc[::-1]])
+
+
+def test_saved_model_round_trip(model_dir):
+    registry = ModelRegistry(str(model_dir))
+    model = fitted_model()
+    key = fingerprint_of([pd.DataFrame({'amount': [1.0]})])
+    assert registry.find(key) is None
+    meta = registry.save(model, ['amount'], key, {'n_estimators': 10}, 200, 200)
+    assert meta['version'] == 1 and registry.find(key)['model_id'] == meta['model_id']
+
+    loaded, loaded_meta = ModelRegistry(str(model_dir)).load(meta['model_id'])
+    frame = pd.DataFrame({'amount': [100.0, 5000.0]})
+    assert np.allclose(score_frame(loaded, ['amount'], frame)['anomaly_score'], -model.decision_function(frame))
+    assert [m['model_id'] for m in registry.list()] == [meta['model_id']]
+    with pytest.raises(KeyError):
+        registry.load('../etc')
+
+
+def test_score_endpoint_uses_saved_model(model_dir):
+    meta = model_registry.save(fitted_model(), ['amount'], 'f' * 64, {}, 200, 200)
+    client = app.test_client()
+    response = client.post(f"/api/models/{meta['model_id']}/score", json={
+        'transactions': [{'From_Account': 'A', 'Amount': '5,000'}, {'From_Account': 'B', 'Amount': '100'}, {'Amount': 'n/a'}]
+    })
+    body = response.get_json()
+    assert response.status_code == 200 and body['scored'] == 2 and body['skipped'] == 1
+    first, second = body['transactions']
+    assert first['from_account'] == 'A' and first['is_anomaly'] and first['anomaly_score'] > second['anomaly_score']
+
+    assert client.post('/api/models/missing/score', json={'transactions': [{'amount': 1}]}).status_code == 404
+    assert client.post(f"/api/models/{meta['model_id']}/score", json={'transactions': [{'ip': 'x'}]}).status_code == 400
+
+
+def reject_constant(name):
+    raise ValueError(f'{name} is not valid JSON')
+
+
+def test_score_response_is_valid_json_with_missing_values(model_dir):
+    meta = model_registry.save(fitted_model(), ['amount'], 'e' * 64, {}, 200, 200)
+    response = app.test_client().post(f"/api/models/{meta['model_id']}/score", json={
+        'transactions': [{'amount': 100, 'memo': 'rent'}, {'amount': 5000}]
+    })
+    assert response.status_code == 200
+    rows = json.loads(response.data, parse_constant=reject_constant)['transactions']
+    assert [row['memo'] for row in rows] == ['rent', None]
+
+
+def test_parallel_blocks_match_single_pass_scoring():
+    rng = np.random.default_rng(1)
+    X = pd.DataFrame({'amount': rng.lognormal(8, 1, 500), 'score': rng.normal(size=500)})
+    saved = app.config['ANOMALY_WORKERS'], app.config['ANOMALY_SCORE_BLOCK']
+    app.config['ANOMALY_WORKERS'], app.config['ANOMALY_SCORE_BLOCK'] = 3, 100
+    try:
+        model = fit_isolation_forest(X)
+        scored = score_frame(model, ['amount', 'score'], X)
+    finally:
+        app.config['ANOMALY_WORKERS'], app.config['ANOMALY_SCORE_BLOCK'] = saved
+    assert np.allclose(scored['anomaly_score'], -model.decision_function(X))
+    assert (scored['is_anomaly'] == (model.predict(X) == -1)).all()
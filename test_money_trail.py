@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for money trail search and the /api/money-trail endpoint
+"""
+
+import pandas as pd
+
+from app import TransactionGraph, aml_engine, app
+
+TRANSFERS = [
+    ('T1', 'A', 'B', 100.0, '2024-01-01', '10:00'),
+    ('T2', 'A', 'C', 50.0, '2024-01-01', '11:00'),
+    ('T3', 'A', 'F', 10.0, '2024-01-02', '10:00'),
+    ('T4', 'B', 'D', 80.0, '2024-01-01', '09:00'),
+    ('T5', 'B', 'D', 70.0, '2024-01-03', '10:00'),
+    ('T6', 'C', 'D', 40.0, '2024-01-01', '08:00'),
+    ('T7', 'D', 'E', 60.0, '2024-01-04', '10:00'),
+    ('T8', 'D', 'A', 5.0, '2024-01-05', '10:00')
+]
+
+
+def transfers():
+    df = pd.DataFrame(TRANSFERS, columns=['transaction_id', 'from_account', 'to_account', 'amount', 'date', 'time'])
+    return df.assign(case_id='C1', ip='', phone='', email='')
+
+
+def paths(trails):
+    return {'>'.join(trail['path']) for trail in trails}
+
+
+def trails_from(start='A', **options):
+    return aml_engine.find_money_trail(None, start, graph=TransactionGraph.from_frame(transfers()), **options)
+
+
+def test_depth_limit_keeps_trails_ending_at_sinks():
+    assert paths(trails_from(max_depth=3)) == {'A>B>D>E', 'A>C>D>E', 'A>F'}
+    assert paths(trails_from(max_depth=2)) == {'A>B>D', 'A>C>D', 'A>F'}
+    # D>A closes a loop back to the start and is never followed
+    assert all(len(set(trail['path'])) == len(trail['path']) for trail in trails_from(max_depth=5))
+
+    trail = next(trail for trail in trails_from(max_depth=3) if trail['path'] == ['A', 'B', 'D', 'E'])
+    assert [hop['amount'] for hop in trail['hops']] == [100.0, 150.0, 60.0]
+    assert trail['hops'][1]['transfers'] == 2
+    assert trail['flow_amount'] == 60.0 and trail['total_amount'] == 310.0
+    assert trails_from('nobody') == []
+
+
+def test_fanout_follows_the_largest_flows():
+    assert paths(trails_from(max_depth=3, max_fanout=1)) == {'A>B>D>E'}
+    assert paths(trails_from(max_depth=3, max_fanout=2)) == {'A>B>D>E', 'A>C>D>E'}
+
+
+def test_time_ordered_trails_only_move_forward():
+    trails = trails_from(max_depth=3, time_ordered=True)
+    # C>D happened before the money reached C, so that trail stops at C
+    assert paths(trails) == {'A>B>D>E', 'A>C', 'A>F'}
+    trail = next(trail for trail in trails if trail['path'] == ['A', 'B', 'D', 'E'])
+    assert [hop['transaction_id'] for hop in trail['hops']] == ['T1', 'T5', 'T7']
+
+
+def test_endpoint_truncates_and_validates_max_paths(tmp_path):
+    path = tmp_path / 'upload.csv'
+    transfers().to_csv(path, index=False)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['uploaded_data_file'] = str(path)
+
+    body = client.get('/api/money-trail/A?max_depth=3').get_json()
+    assert body['trail_count'] == 3 and not body['truncated']
+    body = client.get('/api/money-trail/A?max_depth=3&max_paths=2').get_json()
+    assert body['trail_count'] == 2 and body['truncated']
+    for value in (0, -1):
+        response = client.get(f'/api/money-trail/A?max_paths={value}')
+        assert response.status_code == 400 and 'max_paths' in response.get_json()['error']
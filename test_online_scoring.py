@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for online scoring and the running account statistics it keeps
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import (
+    AccountStats, ScoringCheckpoint, TRANSACTION_FEATURES, TransactionScore, app, build_account_features,
+    bulk_insert_transactions, fit_isolation_forest, model_registry, reset_online_scoring, score_new_transactions
+)
+
+
+def transfers():
+    rng = np.random.default_rng(5)
+    rows = 60
+    return pd.DataFrame({
+        'case_id': 'C1',
+        'transaction_id': [f'T{i}' for i in range(rows)],
+        'from_account': rng.choice(['A', 'B', 'C', 'D'], rows),
+        'to_account': rng.choice(['B', 'C', 'X', 'Y', 'Z'], rows),
+        'amount': rng.integers(1, 1000, rows).astype(float),
+        'date': [f'2024-01-{1 + i % 9:02d}' for i in range(rows)],
+        'time': '10:00',
+        'ip': rng.choice(['1.1.1.1', '2.2.2.2', '', '3.3.3.3'], rows),
+        'phone': rng.choice(['555', '556'], rows),
+        'email': rng.choice(['a@x', 'b@x', 'c@x'], rows),
+        'transaction_type': 'transfer'
+    })
+
+
+@pytest.fixture
+def saved_model(tmp_path, database):
+    saved = app.config['MODEL_DIR']
+    app.config['MODEL_DIR'] = str(tmp_path / 'models')
+    model_registry.cache.clear()
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(200, len(TRANSACTION_FEATURES))), columns=TRANSACTION_FEATURES)
+    yield model_registry.save(fit_isolation_forest(X), TRANSACTION_FEATURES, 'e' * 64, {}, 200, 200)
+    app.config['MODEL_DIR'] = saved
+    model_registry.cache.clear()
+
+
+def stored_stats():
+    rows = AccountStats.query.all()
+    columns = [col.name for col in AccountStats.__table__.columns]
+    return pd.DataFrame([[getattr(row, col) for col in columns] for row in rows], columns=columns).set_index('account')
+
+
+def test_batches_resume_without_counting_twice(saved_model, database):
+    df = transfers()
+    bulk_insert_transactions(df.iloc[:40])
+    first = score_new_transactions(batch_size=7)
+    assert first['transactions'] == 40 and first['model_id'] == saved_model['model_id']
+    assert score_new_transactions(batch_size=7)['transactions'] == 0
+
+    bulk_insert_transactions(df.iloc[40:])
+    assert score_new_transactions(batch_size=11)['transactions'] == 20
+    assert score_new_transactions(batch_size=11)['transactions'] == 0
+
+    scored = [row.transaction_id for row in TransactionScore.query.all()]
+    assert sorted(scored) == list(range(1, len(df) + 1))
+    checkpoint = database.session.get(ScoringCheckpoint, 'transactions')
+    assert checkpoint.rows_scored == len(df) and checkpoint.last_transaction_id == len(df)
+
+    stats = stored_stats()
+    table = build_account_features(df).table
+    senders = stats.loc[table.index]
+    for col in ['txn_count', 'total_amount', 'max_amount', 'unique_recipients', 'unique_ips', 'unique_phones', 'unique_emails']:
+        assert np.allclose(senders[col].astype(float), table[col].astype(float)), col
+
+    assert stats.loc['X', 'txn_count'] == 0
+    assert stats.loc['X', 'received_count'] == (df['to_account'] == 'X').sum()
+    assert stats.loc['X', 'unique_senders'] == df.loc[df['to_account'] == 'X', 'from_account'].nunique()
+    assert stats.loc['A', 'active_days'] == df.loc[df['from_account'] == 'A', 'date'].nunique()
+    assert stats.loc['A', 'last_seen'] == pd.Timestamp(df.loc[df['from_account'] == 'A', 'date'].max() + ' 10:00')
+
+
+def test_batch_size_does_not_change_the_statistics(saved_model, database):
+    df = transfers()
+    bulk_insert_transactions(df)
+    score_new_transactions(batch_size=60)
+    whole = stored_stats().sort_index()
+
+    reset_online_scoring()
+    assert AccountStats.query.count() == 0
+    score_new_transactions(batch_size=13)
+    assert stored_stats().sort_index().equals(whole)
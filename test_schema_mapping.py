@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for mapping uploaded and ingested exports onto the transaction columns
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import (
+    SchemaMapper, app, coerce_amount_column, prepare_transaction_chunk, prepare_upload_chunk, process_upload,
+    read_upload_frame
+)
+
+
+def test_aliases_are_case_insensitive_and_values_are_coerced():
+    raw = pd.DataFrame({
+        'Case_ID': ['C1', 'C1'], 'Sender': ['A1', 'A2'], 'Beneficiary A/C': ['B1', 'B2'],
+        'Txn Amount': ['$ 1,200.50', '(75.00)'], 'Timestamp': ['2024-03-05 10:11:12', '2024-03-06 08:00:00'],
+        'Mobile No': [9305183167.0, np.nan], 'ID': [1, 2]
+    })
+    mapper = SchemaMapper()
+    frame = prepare_upload_chunk(raw, mapper)
+
+    assert mapper.report['profile'] == 'standard'
+    assert mapper.report['columns']['Sender'] == 'from_account'
+    assert mapper.report['columns']['ID'] == 'source_id'
+    assert 'ip' in mapper.report['defaulted'] and 'case_id' not in mapper.report['defaulted']
+    assert frame['to_account'].tolist() == ['B1', 'B2']
+    assert frame['amount'].tolist() == [1200.5, -75.0]
+    assert frame['date'].tolist() == ['2024-03-05', '2024-03-06']
+    assert frame['time'].tolist() == ['10:11:12', '08:00:00']
+    assert frame['phone'].iloc[0] == '9305183167' and pd.isna(frame['phone'].iloc[1])
+
+
+def test_later_chunks_follow_the_first_header():
+    mapper = SchemaMapper()
+    first = pd.DataFrame({'Amount': [10], 'Value': [99], 'From Account': ['A']})
+    assert prepare_upload_chunk(first, mapper)['amount'].tolist() == [10.0]
+    assert mapper.report['dropped'] == ['Value']
+    later = prepare_upload_chunk(pd.DataFrame({'Amount': ['1,000'], 'Value': [5], 'From Account': [7]}), mapper)
+    assert later['amount'].tolist() == [1000.0] and later['from_account'].tolist() == ['7']
+
+
+def test_profile_file_is_detected_and_applied(tmp_path):
+    profiles = {
+        'eu_ledger': {
+            'columns': {'Debit A/C': 'from_account', 'Credit A/C': 'to_account', 'Betrag': 'amount', 'Buchungstag': 'date'},
+            'date_format': '%d.%m.%Y', 'decimal': ',', 'dtypes': {'Filiale': 'text', 'Gebuehr': 'float'}, 'case_id': 'EU1'
+        }
+    }
+    path = tmp_path / 'profiles.json'
+    path.write_text(json.dumps(profiles))
+    saved = app.config['SCHEMA_PROFILES_FILE']
+    app.config['SCHEMA_PROFILES_FILE'] = str(path)
+    try:
+        raw = pd.DataFrame({
+            'DEBIT A/C': ['A'], 'Credit A/C': ['B'], 'Betrag': ['1.234,50'], 'Buchungstag': ['05.03.2024'],
+            'Filiale': [12], 'Gebuehr': ['2']
+        })
+        mapper = SchemaMapper()
+        frame = prepare_upload_chunk(raw, mapper)
+        assert mapper.report['profile'] == 'eu_ledger'
+        assert frame['amount'].tolist() == [1234.5] and frame['date'].tolist() == ['2024-03-05']
+        assert frame['filiale'].tolist() == ['12'] and frame['gebuehr'].tolist() == [2.0]
+        assert frame['case_id'].tolist() == ['EU1']
+
+        with pytest.raises(ValueError):
+            SchemaMapper('no_such_profile')
+    finally:
+        app.config['SCHEMA_PROFILES_FILE'] = saved
+
+
+def test_statement_headers_are_matched_loosely():
+    statement = pd.DataFrame({
+        'account no': ['123'], 'Value Date': ['2024-01-01'], 'Transaction Details': ['to 1234567890'],
+        'Deposit Amt': ['1,000'], 'Withdrawal Amt': [None]
+    })
+    mapper = SchemaMapper()
+    frame = prepare_transaction_chunk(statement, start_txn_id=7, mapper=mapper)
+    assert mapper.report['profile'] == 'bank_statement'
+    assert frame[['transaction_id', 'from_account', 'to_account', 'amount']].iloc[0].tolist() == [
+        'TXN000007', '123', '1234567890', 1000.0
+    ]
+
+
+def test_amount_coercion():
+    amounts = coerce_amount_column(pd.Series(['1,500', 'INR 200', '-$20', 'n/a', None]))
+    assert amounts.iloc[:3].tolist() == [1500.0, 200.0, -20.0] and amounts.iloc[3:].isna().all()
+
+
+def test_statement_upload_numbers_transactions_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'instance').mkdir()
+    rows = 14
+    statement = pd.DataFrame({
+        'Account No': [f'10{i % 3}' for i in range(rows)],
+        'Value Date': [f'2024-01-{1 + i:02d}' for i in range(rows)],
+        'Transaction Details': [f'to 99887766{i:02d}' for i in range(rows)],
+        'Deposit Amt': [str(100 * (i + 1)) if i % 2 else None for i in range(rows)],
+        'Withdrawal Amt': [None if i % 2 else str(50 * (i + 1)) for i in range(rows)]
+    })
+    path = tmp_path / 'statement.csv'
+    statement.to_csv(path, index=False)
+    saved = app.config['UPLOAD_CHUNK_SIZE'], app.config['MODEL_DIR']
+    app.config['UPLOAD_CHUNK_SIZE'], app.config['MODEL_DIR'] = 4, str(tmp_path / 'models')
+    try:
+        with app.app_context():
+            result = process_upload(lambda fraction, message: None, str(path), 'statement.csv')
+    finally:
+        app.config['UPLOAD_CHUNK_SIZE'], app.config['MODEL_DIR'] = saved
+    frame = read_upload_frame(result['dataset'])
+    assert frame['transaction_id'].tolist() == [f'TXN{i:06d}' for i in range(1, rows + 1)]
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for upgrading a transaction table created before the typed timestamp/amount_cents columns
+"""
+
+from app import Transaction, backfill_transaction_columns, build_filter_query, ensure_transaction_schema
+
+LEGACY_ROWS = [
+    (1, '2024-01-01', '10:00', 50.0),
+    (2, '2024-01-02', '09:30', 150.0),
+    (3, '2024-01-02', '23:59:59', 99.99),
+    (4, '2024-01-03', '00:00', 300.0),
+    (5, '01/02/2024', '12:00', 500.0),
+    (6, 'bad', '', 700.0)
+]
+
+
+def create_legacy_table(database):
+    with database.engine.begin() as conn:
+        conn.exec_driver_sql('DROP TABLE "transaction"')
+        conn.exec_driver_sql(
+            'CREATE TABLE "transaction" (id INTEGER PRIMARY KEY, case_id VARCHAR(50), transaction_id VARCHAR(50), '
+            'from_account VARCHAR(50), to_account VARCHAR(50), amount FLOAT, date VARCHAR(20), time VARCHAR(10), '
+            'ip VARCHAR(20), phone VARCHAR(20), email VARCHAR(100), transaction_type VARCHAR(20))'
+        )
+        conn.exec_driver_sql('CREATE INDEX ix_transaction_amount ON "transaction" (amount)')
+        conn.exec_driver_sql('CREATE INDEX ix_transaction_case_id ON "transaction" (case_id)')
+        for row_id, date, time_, amount in LEGACY_ROWS:
+            conn.exec_driver_sql(
+                'INSERT INTO "transaction" (id, case_id, transaction_id, from_account, to_account, amount, date, time) '
+                "VALUES (?, 'C1', ?, 'A', 'B', ?, ?, ?)", (row_id, f'T{row_id}', amount, date, time_)
+            )
+
+
+def matching_ids(database, filters):
+    query, _ = build_filter_query(filters, columns=['id'])
+    with database.engine.connect() as conn:
+        return [row[0] for row in conn.execute(query)]
+
+
+def test_filters_see_legacy_rows_before_and_after_the_backfill(database):
+    create_legacy_table(database)
+    ensure_transaction_schema()
+    indexes = {index['name'] for index in database.inspect(database.engine).get_indexes('transaction')}
+    assert {'ix_transaction_amount', 'ix_transaction_case_id'}.isdisjoint(indexes)
+    assert 'ix_transaction_from_timestamp' in indexes
+
+    # Not backfilled yet: typed columns are null and the filters fall back to amount and date/time text
+    assert Transaction.query.filter(Transaction.timestamp.isnot(None)).count() == 0
+    assert matching_ids(database, {'min_amount': '100', 'max_amount': '500'}) == [2, 4, 5]
+    assert matching_ids(database, {'date_from': '2024-01-02', 'date_to': '2024-01-02'}) == [2, 3]
+    assert matching_ids(database, {'date_from': '2024-01-02 09:30'}) == [2, 3, 4]
+
+    assert backfill_transaction_columns(batch_size=4) == len(LEGACY_ROWS)
+    assert matching_ids(database, {'min_amount': '100', 'max_amount': '500'}) == [2, 4, 5]
+    # Non-ISO dates only become filterable once parsed by the backfill
+    assert matching_ids(database, {'date_from': '2024-01-02', 'date_to': '2024-01-02'}) == [2, 3, 5]
+    assert matching_ids(database, {'date_from': '2024-01-02 09:30'}) == [2, 3, 4, 5]
+    assert database.session.get(Transaction, 6).timestamp is None
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for spider map level-of-detail selection and server-side layout
+"""
+
+import numpy as np
+import pandas as pd
+
+from app import TransactionGraph, collapse_map_leaves, map_layout_positions, select_map_view, spider_map_elements
+
+
+def toy_graph():
+    """A heavy A-B-C triangle, a light D->A transfer and three leaves paying into C"""
+    transfers = [
+        ('A', 'B', 50000), ('B', 'C', 45000), ('C', 'A', 40000),
+        ('D', 'A', 100),
+        ('L1', 'C', 300), ('L2', 'C', 200), ('L3', 'C', 100)
+    ]
+    df = pd.DataFrame(transfers, columns=['from_account', 'to_account', 'amount'])
+    df['date'] = '2024-01-01'
+    df['time'] = '10:00'
+    df['transaction_id'] = [f'T{i}' for i in range(len(df))]
+    df['ip'] = df['phone'] = df['email'] = ''
+    graph = TransactionGraph.from_frame(df)
+    return graph, graph.node_metrics(), df
+
+
+def names(graph, mask):
+    return sorted(str(account) for account in graph.accounts[mask])
+
+
+def test_max_nodes_keeps_highest_flow_accounts():
+    graph, metrics, df = toy_graph()
+    keep, active, scope = select_map_view(graph, metrics, max_nodes=3)
+    assert names(graph, keep) == ['A', 'B', 'C']
+    assert scope.all()
+
+
+def test_min_amount_and_core_prune_light_edges():
+    graph, metrics, df = toy_graph()
+    keep, active, scope = select_map_view(graph, metrics, min_amount=1000, max_nodes=100)
+    assert names(graph, scope) == ['A', 'B', 'C']
+    keep, active, scope = select_map_view(graph, metrics, min_core=2, max_nodes=100)
+    assert names(graph, keep) == ['A', 'B', 'C']
+
+
+def test_focus_radius_and_leaf_collapse():
+    graph, metrics, df = toy_graph()
+    keep, active, scope = select_map_view(graph, metrics, focus=graph.code('D'), radius=1, max_nodes=100)
+    assert names(graph, scope) == ['A', 'D']
+
+    keep, active, scope = select_map_view(graph, metrics, max_nodes=3)
+    nodes, edges, collapsed = collapse_map_leaves(graph, keep, active, scope)
+    assert collapsed == 4
+    by_id = {node['data']['id']: node['data'] for node in nodes}
+    assert by_id['C::senders']['member_count'] == 3
+    assert by_id['A::senders']['member_count'] == 1
+    weights = {edge['data']['target']: edge['data']['weight'] for edge in edges}
+    assert np.isclose(weights['C'], 600)
+
+
+def test_layout_positions_cover_every_node():
+    graph, metrics, df = toy_graph()
+    keep, active, scope = select_map_view(graph, metrics, max_nodes=3)
+    nodes, edges, _ = spider_map_elements(graph, df, keep, active)
+    aggregate_nodes, aggregate_edges, _ = collapse_map_leaves(graph, keep, active, scope)
+    nodes, edges = nodes + aggregate_nodes, edges + aggregate_edges
+
+    force = map_layout_positions(nodes, edges, 'force')
+    assert set(force) == {node['data']['id'] for node in nodes}
+    assert force == map_layout_positions(nodes, edges, 'force')
+
+    layers = map_layout_positions(nodes, edges, 'hierarchical')
+    # The senders aggregate feeds C, so it sits on a layer above the A-B-C cycle
+    assert layers['C::senders']['y'] < layers['C']['y']
+    assert layers['A']['y'] == layers['B']['y'] == layers['C']['y']
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared transaction frame cache and its database version
+"""
+
+import pandas as pd
+
+from app import Transaction, TransactionCache, bulk_insert_transactions, bump_transaction_generation
+
+
+def rows(start, count, amount=1.0):
+    return pd.DataFrame({
+        'case_id': 'C1',
+        'transaction_id': [f'T{i}' for i in range(start, start + count)],
+        'from_account': 'A', 'to_account': 'B',
+        'amount': amount, 'date': '2024-01-01', 'time': '10:00',
+        'ip': '', 'phone': '', 'email': '', 'transaction_type': 'transfer'
+    })
+
+
+def counters(cache):
+    stats = cache.stats()
+    return stats['hits'], stats['misses'], stats['refreshes']
+
+
+def test_hit_miss_and_append_refresh(database):
+    cache = TransactionCache(10 ** 9)
+    bulk_insert_transactions(rows(0, 5))
+    first = cache.get_database_frame()
+    assert len(first) == 5 and counters(cache) == (0, 1, 0)
+    assert cache.get_database_frame() is first and counters(cache) == (1, 1, 0)
+
+    bulk_insert_transactions(rows(5, 3))
+    frame = cache.get_database_frame()
+    assert frame['transaction_id'].astype(str).tolist() == [f'T{i}' for i in range(8)]
+    assert counters(cache) == (1, 1, 1)
+
+    cache.invalidate()
+    assert len(cache.get_database_frame()) == 8 and counters(cache) == (1, 2, 1)
+
+
+def test_deletes_force_a_full_reload(database):
+    cache = TransactionCache(10 ** 9)
+    bulk_insert_transactions(rows(0, 6))
+    cache.get_database_frame()
+
+    # Delete the newest rows and load replacements: SQLite reuses the ids, so count and max id match
+    database.session.query(Transaction).filter(Transaction.id > 3).delete()
+    bump_transaction_generation()
+    database.session.commit()
+    bulk_insert_transactions(rows(100, 3, amount=9.0))
+    frame = cache.get_database_frame()
+    assert frame['id'].tolist() == [1, 2, 3, 4, 5, 6]
+    assert frame['amount'].tolist() == [1.0] * 3 + [9.0] * 3
+    assert counters(cache) == (0, 2, 0)
+
+    # A delete that skipped the generation still shows in the count once new rows arrive
+    database.session.query(Transaction).filter(Transaction.id == 1).delete()
+    database.session.commit()
+    bulk_insert_transactions(rows(200, 2))
+    frame = cache.get_database_frame()
+    assert frame['id'].tolist() == [2, 3, 4, 5, 6, 7, 8]
+    assert counters(cache) == (0, 3, 0)
+
+
+def test_least_recently_used_source_is_evicted(database, tmp_path):
+    bulk_insert_transactions(rows(0, 50))
+    path = tmp_path / 'upload.csv'
+    rows(0, 50).to_csv(path, index=False)
+    cache = TransactionCache(1)
+    cache.get_database_frame()
+    cache.get_file_frame(str(path))
+    stats = cache.stats()
+    assert stats['entries'] == 1 and stats['evictions'] == 1
+    cache.invalidate(('file', str(path)))
+    assert cache.stats()['entries'] == 0
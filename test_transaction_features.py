@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for the engineered per-transaction feature matrix
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from flask import session
+
+from app import (
+    StreamingAccountAggregator, TRANSACTION_FEATURES, aml_engine, app, build_account_features,
+    get_transaction_features, pq, transaction_feature_matrix, transaction_features_path, write_transaction_features
+)
+
+
+def transfers():
+    return pd.DataFrame({
+        'case_id': 'C1',
+        'transaction_id': [f'T{i}' for i in range(6)],
+        'from_account': ['A', 'A', 'A', 'B', 'C', 'C'],
+        'to_account': ['X', 'Y', 'X', 'X', 'Y', 'Z'],
+        'amount': [100.0, -50.0, 1000.0, 10.0, np.nan, 20.0],
+        'date': ['2024-01-01', '2024-01-01', '2024-01-02', '2024-01-01', '2024-01-03', '2024-01-03'],
+        'time': ['10:30', '23:00', '00:15', 'bad', '08:00', '08:00'],
+        'ip': ['1.1.1.1', '1.1.1.1', '2.2.2.2', '1.1.1.1', '', '3.3.3.3'],
+        'phone': '', 'email': ['a@x', 'a@x', 'a@x', 'a@x', 'c@x', 'c@x']
+    })
+
+
+def test_matrix_matches_grouped_reference():
+    df = transfers()
+    matrix = transaction_feature_matrix(df, build_account_features(df))
+    assert matrix.dtype == np.float32 and matrix.shape == (6, len(TRANSACTION_FEATURES))
+    column = dict(zip(TRANSACTION_FEATURES, matrix.T))
+
+    assert np.allclose(column['log_amount'][:2], [np.log1p(100), -np.log1p(50)])
+    assert np.allclose(column['hour'][[0, 1, 2, 3]], [10.5, 23.0, 0.25, 12.0])
+    assert column['sender_velocity'][0] == 1.5 and column['sender_velocity'][3] == 1.0
+    assert list(column['sender_fan_out'][:4]) == [2, 2, 2, 1]
+    assert list(column['receiver_fan_in'][:4]) == [2, 1, 2, 2]
+    assert list(column['ip_reuse'][[0, 2, 5]]) == [2, 1, 1]
+    assert column['phone_reuse'][0] == 0
+    # No amount, no features
+    assert np.isnan(matrix[4]).all()
+
+
+def test_streamed_aggregates_give_the_same_matrix():
+    df = transfers()
+    streamed = StreamingAccountAggregator().consume([df.iloc[:3], df.iloc[3:]]).features()
+    expected = transaction_feature_matrix(df, build_account_features(df))
+    assert np.array_equal(transaction_feature_matrix(df, streamed), expected, equal_nan=True)
+
+
+@pytest.mark.skipif(pq is None, reason='pyarrow not installed')
+def test_matrix_is_saved_next_to_the_dataset(tmp_path, monkeypatch, write_upload_frame):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'instance').mkdir()
+    df = transfers()
+    dataset = write_upload_frame(df)
+    features = StreamingAccountAggregator().consume([df]).features()
+    seen = []
+    path = write_transaction_features(dataset, features, chunk_size=4, on_block=seen.append)
+    saved = np.load(path, mmap_mode='r')
+    assert path.endswith('.features.npy') and [len(block) for block in seen] == [4, 2]
+    assert np.array_equal(saved, transaction_feature_matrix(df, features), equal_nan=True)
+
+
+@pytest.mark.skipif(pq is None, reason='pyarrow not installed')
+def test_logout_removes_the_matrix_and_its_cache_entry(tmp_path, monkeypatch, write_upload_frame):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'instance').mkdir()
+    dataset = write_upload_frame(transfers())
+    with app.test_request_context():
+        session['uploaded_data_file'] = dataset
+        assert len(get_transaction_features()) == 6
+    assert os.path.exists(transaction_features_path(dataset))
+    assert any(version[:2] == ('file', dataset) for version in aml_engine.feature_cache)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['uploaded_data_file'] = dataset
+    assert client.get('/logout').status_code == 302
+    assert not os.path.exists(dataset) and not os.path.exists(transaction_features_path(dataset))
+    assert not any(version[:2] == ('file', dataset) for version in aml_engine.feature_cache)
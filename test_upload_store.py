@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for the columnar uploaded-dataset store
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import (
+    RowReservoir, UploadWriter, app, iter_upload_chunks, iter_upload_frames, parse_time_range, pq,
+    prepare_upload_chunk, read_upload_frame
+)
+
+pytestmark = pytest.mark.skipif(pq is None, reason='pyarrow not installed')
+
+
+def sample_upload(rows=40):
+    return pd.DataFrame({
+        'case_id': ['C1'] * (rows // 2) + ['C2'] * (rows - rows // 2),
+        'transaction_id': [f'T{i}' for i in range(rows)],
+        'from_account': [f'A{i % 5}' for i in range(rows)],
+        'to_account': [f'B{i % 7}' for i in range(rows)],
+        'amount': [float(i) for i in range(rows)],
+        'date': [f'2024-01-{1 + i // 2:02d}' for i in range(rows)],
+        'time': '10:00',
+        'ip': '', 'phone': '', 'email': ''
+    })
+
+
+@pytest.fixture
+def row_groups_of_ten(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'instance').mkdir()
+    saved = app.config['UPLOAD_ROW_GROUP_SIZE']
+    app.config['UPLOAD_ROW_GROUP_SIZE'] = 10
+    yield
+    app.config['UPLOAD_ROW_GROUP_SIZE'] = saved
+
+
+def test_parquet_round_trip_with_projection(row_groups_of_ten, write_upload_frame):
+    path = write_upload_frame(sample_upload())
+    assert path.endswith('.parquet')
+    frame = read_upload_frame(path, columns=['amount', 'missing'])
+    assert list(frame.columns) == ['amount']
+    assert frame['amount'].sum() == sum(range(40))
+    assert pq.ParquetFile(path).metadata.num_row_groups == 4
+
+
+def test_row_group_statistics_skip_groups(row_groups_of_ten, write_upload_frame):
+    path = write_upload_frame(sample_upload())
+    window = parse_time_range('2024-01-06', '2024-01-10')
+    assert len(list(iter_upload_frames(path, 100, time_range=window))) == 1
+    assert len(list(iter_upload_frames(path, 100, case_id='C2'))) == 2
+
+    chunks = list(iter_upload_chunks(path, 3, after_id=12, columns=['amount'], case_id='C1'))
+    rows = pd.concat(chunks)
+    assert rows['id'].tolist() == list(range(13, 21))
+    assert rows['amount'].tolist() == [float(i) for i in range(12, 20)]
+
+
+def test_writer_conforms_later_chunks_to_first(row_groups_of_ten):
+    writer = UploadWriter()
+    first = prepare_upload_chunk(pd.DataFrame({'Amount': [1.5] * 8, ' Phone ': [555] * 8, 'Score': [1] * 8}))
+    later = prepare_upload_chunk(pd.DataFrame({'amount': ['2,000.00'] * 8, 'phone': ['n/a'] * 8, 'extra': ['x'] * 8}))
+    writer.write(first)
+    writer.write(later)
+    path = writer.close()
+
+    parquet = pq.ParquetFile(path)
+    assert [parquet.metadata.row_group(i).num_rows for i in range(parquet.metadata.num_row_groups)] == [10, 6]
+    frame = read_upload_frame(path)
+    assert 'extra' not in frame.columns and writer.numeric == ['amount', 'score']
+    assert frame['amount'].tolist() == [1.5] * 8 + [2000.0] * 8
+    assert frame['phone'].tolist() == ['555'] * 8 + ['n/a'] * 8
+    assert frame['case_id'].eq('UPLOADED').all() and frame['score'].isna().sum() == 8
+
+
+def test_row_reservoir_is_bounded_and_keeps_order_when_small():
+    reservoir = RowReservoir(5)
+    reservoir.add(np.arange(6).reshape(3, 2))
+    assert reservoir.sample().tolist() == [[0, 1], [2, 3], [4, 5]]
+    for _ in range(10):
+        reservoir.add(np.ones((4, 2)))
+    assert reservoir.sample().shape == (5, 2) and reservoir.seen == 43